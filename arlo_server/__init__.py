@@ -10,8 +10,10 @@ from config import (
     FLASK_ENV,
     DEVELOPMENT_ENVS,
     HTTP_ORIGIN,
+    DISTRIBUTIONS_BACKEND,
 )
 from arlo_server.models import db
+from audit_math import distributions
 
 if FLASK_ENV not in DEVELOPMENT_ENVS:
     # Restrict which hosts we trust when not in dev/test. This works by causing
@@ -36,6 +38,8 @@ T = Talisman(
 )
 app.secret_key = SESSION_SECRET
 
+distributions.set_backend(DISTRIBUTIONS_BACKEND)
+
 app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 db.app = app
@@ -54,6 +58,7 @@ import arlo_server.routes
 import arlo_server.election_settings
 import arlo_server.contests
 import arlo_server.jurisdictions
+import arlo_server.batch_tallies
 import arlo_server.sample_sizes
 import arlo_server.rounds
 import arlo_server.audit_boards
@@ -16,18 +16,21 @@ from arlo_server.models import (
     Election,
     Jurisdiction,
     SampledBallot,
-    SampledBallotDraw,
     BallotStatus,
     Batch,
     RoundContestResult,
-    BallotInterpretation,
 )
 from arlo_server.sample_sizes import cumulative_contest_results
+from arlo_server.risk_measurements import (
+    audited_votes_by_choice,
+    compute_contest_risk,
+    sequential_risk_measurement,
+    update_sequential_stopping,
+)
 from util.jsonschema import validate, JSONDict
 from util.binpacking import BalancedBucketList, Bucket
 from util.group_by import group_by
 from util.isoformat import isoformat
-from audit_math import bravo, sampler_contest
 
 WORDS = xp.generate_wordlist(wordfile=xp.locate_wordfile())
 
@@ -139,7 +142,10 @@ def round_status_by_audit_board(
     audited_ballots_by_audit_board = dict(
         SampledBallot.query.join(AuditBoard)
         .filter_by(jurisdiction_id=jurisdiction_id)
-        .filter(SampledBallot.status != BallotStatus.NOT_AUDITED)
+        # Ballots that weren't needed (see sequential stopping) weren't audited
+        .filter(
+            SampledBallot.status.in_([BallotStatus.AUDITED, BallotStatus.NOT_FOUND])
+        )
         .group_by(AuditBoard.id)
         .values(AuditBoard.id, func.count())
     )
@@ -186,13 +192,17 @@ def list_audit_boards(
     return jsonify({"auditBoards": json_audit_boards})
 
 
+# In sequential stopping mode, the targeted contest's risk is measured the same
+# way it was when deciding whether to stop, so that a round that stopped early
+# ends complete.
 def calculate_risk_measurements(election: Election, round: Round):
     for contest in election.contests:
-        risk, is_complete = bravo.compute_risk(
-            election.risk_limit / 100,
-            sampler_contest.from_db_contest(contest),
-            cumulative_contest_results(contest),
-        )
+        if election.sequential_stopping and contest.is_targeted:
+            risk, is_complete, _ = sequential_risk_measurement(election, round, contest)
+        else:
+            risk, is_complete = compute_contest_risk(
+                election, round, contest, cumulative_contest_results(contest)
+            )
 
         round_contest = next(
             rc for rc in round.round_contests if rc.contest_id == contest.id
@@ -202,13 +212,7 @@ def calculate_risk_measurements(election: Election, round: Round):
 
 
 def count_audited_votes(election: Election, round: Round):
-    vote_counts = dict(
-        BallotInterpretation.query.join(SampledBallot)
-        .join(SampledBallotDraw)
-        .filter_by(round_id=round.id)
-        .group_by(BallotInterpretation.contest_choice_id)
-        .values(BallotInterpretation.contest_choice_id, func.count())
-    )
+    vote_counts = audited_votes_by_choice(round)
 
     for contest in election.contests:
         for contest_choice in contest.choices:
@@ -302,6 +306,11 @@ def sign_off_audit_board(
     round: Round,
     audit_board: AuditBoard,
 ):
+    # Make sure any ballots marked as not needed still aren't, so that the
+    # round can't end without them unless it meets the risk limit.
+    if election.sequential_stopping:
+        update_sequential_stopping(election, round)
+
     validate_sign_off(request.get_json(), audit_board)
 
     audit_board.signed_off_at = datetime.utcnow()
@@ -13,6 +13,7 @@ from arlo_server.models import (
     Jurisdiction,
 )
 from arlo_server.auth import with_jurisdiction_access, with_election_access
+from arlo_server.batch_tallies import clear_batch_tallies_file
 from util.process_file import (
     process_file,
     serialize_file,
@@ -107,6 +108,9 @@ def clear_ballot_manifest_file(jurisdiction: Jurisdiction):
         File.query.filter_by(id=jurisdiction.manifest_file_id).delete()
     Batch.query.filter_by(jurisdiction=jurisdiction).delete()
 
+    # The batch tallies are for the batches in the old manifest
+    clear_batch_tallies_file(jurisdiction)
+
 
 @app.route(
     "/election/<election_id>/jurisdiction/<jurisdiction_id>/ballot-manifest",
@@ -1,5 +1,5 @@
 import io, csv
-from sqlalchemy import func, literal_column
+from sqlalchemy import func
 from sqlalchemy.orm import contains_eager
 from sqlalchemy.dialects.postgresql import aggregate_order_by
 from flask import jsonify, request
@@ -21,16 +21,29 @@ from arlo_server.models import (
     Contest,
     ContestChoice,
 )
+from arlo_server.risk_measurements import (
+    update_risk_measurements,
+    update_sequential_stopping,
+)
 from util.csv_download import csv_response, election_timestamp_name
+from audit_math.sampler import format_ticket_number
 from util.jsonschema import JSONDict, validate
 
 
 def ballot_retrieval_list(jurisdiction: Jurisdiction, round: Round) -> str:
-    previous_ballots = set(
+    previous_draws = (
         SampledBallotDraw.query.join(Round)
         .filter(Round.round_num < round.round_num)
         .join(SampledBallot)
-        .join(Batch)
+    )
+    # Online audits record which ballots were actually audited. Ballots left
+    # unaudited by sequential stopping (and sampled again) weren't.
+    if jurisdiction.election.online:
+        previous_draws = previous_draws.filter(
+            SampledBallot.status.in_([BallotStatus.AUDITED, BallotStatus.NOT_FOUND])
+        )
+    previous_ballots = set(
+        previous_draws.join(Batch)
         .filter_by(jurisdiction_id=jurisdiction.id)
         .values(Batch.name, SampledBallot.ballot_position)
     )
@@ -48,11 +61,10 @@ def ballot_retrieval_list(jurisdiction: Jurisdiction, round: Round) -> str:
             SampledBallot.ballot_position,
             Batch.storage_location,
             Batch.tabulator,
-            func.string_agg(
-                SampledBallotDraw.ticket_number,
+            func.array_agg(
                 aggregate_order_by(
-                    literal_column("','"), SampledBallotDraw.ticket_number
-                ),
+                    SampledBallotDraw.ticket_number, SampledBallotDraw.ticket_number
+                )
             ),
             AuditBoard.name,
         )
@@ -88,7 +100,7 @@ def ballot_retrieval_list(jurisdiction: Jurisdiction, round: Round) -> str:
                 position,
                 storage_location,
                 tabulator,
-                ticket_numbers,
+                ",".join(map(format_ticket_number, ticket_numbers)),
                 previously_audited,
                 audit_board_name,
             ]
@@ -215,7 +227,15 @@ BALLOT_INTERPRETATION_SCHEMA = {
 AUDIT_BALLOT_SCHEMA = {
     "type": "object",
     "properties": {
-        "status": {"type": "string", "enum": [status.value for status in BallotStatus]},
+        # Ballots are only marked as not needed by sequential stopping
+        "status": {
+            "type": "string",
+            "enum": [
+                status.value
+                for status in BallotStatus
+                if status != BallotStatus.NOT_NEEDED
+            ],
+        },
         "interpretations": {"type": "array", "items": BALLOT_INTERPRETATION_SCHEMA},
     },
     "additionalProperties": False,
@@ -271,9 +291,9 @@ def validate_audit_ballot(ballot_audit: JSONDict):
 )
 @with_audit_board_access
 def audit_ballot(
-    election: Election,  # pylint: disable=unused-argument
+    election: Election,
     jurisdiction: Jurisdiction,  # pylint: disable=unused-argument
-    round: Round,  # pylint: disable=unused-argument
+    round: Round,
     audit_board: AuditBoard,  # pylint: disable=unused-argument
     ballot_id: str,
 ):
@@ -281,11 +301,15 @@ def audit_ballot(
     ballot_audit = request.get_json()
     validate_audit_ballot(ballot_audit)
 
+    old_interpretations = list(ballot.interpretations)
     ballot.status = ballot_audit["status"]
     ballot.interpretations = [
         deserialize_interpretation(ballot.id, interpretation)
         for interpretation in ballot_audit["interpretations"]
     ]
+    update_risk_measurements(round, ballot, old_interpretations, ballot.interpretations)
+    if election.sequential_stopping:
+        update_sequential_stopping(election, round)
 
     db.session.commit()
 
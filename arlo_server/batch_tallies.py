@@ -0,0 +1,220 @@
+import locale, uuid
+from datetime import datetime
+from typing import List, Optional
+import numpy as np
+from sqlalchemy.orm.session import Session
+from flask import request, jsonify, Request
+from werkzeug.exceptions import BadRequest, NotFound
+
+from arlo_server import app
+from arlo_server.models import (
+    db,
+    Batch,
+    Contest,
+    Election,
+    File,
+    Jurisdiction,
+)
+from arlo_server.auth import with_jurisdiction_access, with_election_access
+from util.process_file import (
+    process_file,
+    serialize_file,
+    serialize_file_processing,
+)
+from util.csv_download import csv_response
+from util.csv_parse import (
+    decode_csv_file,
+    parse_csv,
+    CSVColumnType,
+    CSVParseError,
+    CSVValueType,
+)
+from audit_math.batch_tallies import BatchTallies
+
+BATCH_NAME = "Batch Name"
+
+
+# The batch tallies are the reported votes for each choice in the targeted
+# contest, in each batch of the jurisdiction's ballot manifest. For now, we
+# only support one targeted contest.
+def targeted_contest(jurisdiction: Jurisdiction) -> Optional[Contest]:
+    return next((c for c in jurisdiction.contests if c.is_targeted), None)
+
+
+# The batch tallies CSV has a column for the batch name, then one for each of
+# the contest's choices, in the same order as the choices are listed.
+def batch_tallies_columns(contest: Contest) -> List[CSVColumnType]:
+    return [CSVColumnType(BATCH_NAME, CSVValueType.TEXT, unique=True)] + [
+        CSVColumnType(choice.name, CSVValueType.NUMBER) for choice in contest.choices
+    ]
+
+
+# Parse the rows of the batch tallies CSV as they stream in, straight into the
+# columns of a BatchTallies (one entry per batch), keyed by the ids of the
+# contest and its choices, like the contest objects the audit math uses. The
+# number of ballots in each batch comes from the ballot manifest, and every
+# batch in the manifest must have a row, since MACRO needs the reported votes
+# of every batch that could be sampled.
+def process_batch_tallies_file(
+    session: Session, jurisdiction: Jurisdiction, file: File
+):
+    assert jurisdiction.batch_tallies_file_id == file.id
+
+    def process():
+        contest = targeted_contest(jurisdiction)
+        if contest is None:
+            raise CSVParseError("Jurisdiction is not in the targeted contest.")
+
+        manifest_num_ballots = dict(
+            Batch.query.filter_by(jurisdiction_id=jurisdiction.id).values(
+                Batch.name, Batch.num_ballots
+            )
+        )
+        tallies_csv = parse_csv(file.contents, batch_tallies_columns(contest))
+
+        batches = []
+        votes = []
+        ballots = []
+        for row in tallies_csv:
+            batch_name = row[BATCH_NAME]
+            if batch_name not in manifest_num_ballots:
+                raise CSVParseError(
+                    f"Invalid batch name: {batch_name}."
+                    " Batch names must match the ballot manifest."
+                )
+            batches.append(batch_name)
+            votes.extend(locale.atoi(row[choice.name]) for choice in contest.choices)
+            ballots.append(manifest_num_ballots[batch_name])
+
+        missing_batches = set(manifest_num_ballots) - set(batches)
+        if missing_batches:
+            raise CSVParseError(
+                f"Missing batch: {min(missing_batches)}."
+                " Every batch in the ballot manifest must have a row."
+            )
+
+        tallies = BatchTallies(
+            contest.id,
+            batches,
+            [choice.id for choice in contest.choices],
+            np.array(votes, dtype=np.int64).reshape(len(batches), len(contest.choices)),
+            np.array(ballots, dtype=np.int64),
+        )
+        jurisdiction.batch_tallies = tallies.dump()
+
+    process_file(session, file, process)
+
+
+# The batch tallies of every jurisdiction in a contest, combined into one
+# BatchTallies to pass to the MACRO functions (see audit_math.macro) or PPEB
+# sampling (see audit_math.sampler.draw_ppeb_sample). Batches are identified by
+# (jurisdiction name, batch name), as in
+# arlo_server.sample_sizes.contest_manifest. MACRO's sample sizes and samples
+# depend on the reported votes in every batch of the contest, so this is None
+# until every jurisdiction in the contest has had its tallies processed.
+def contest_batch_tallies(contest: Contest) -> Optional[BatchTallies]:
+    if not contest.jurisdictions or any(
+        jurisdiction.batch_tallies is None for jurisdiction in contest.jurisdictions
+    ):
+        return None
+    return BatchTallies.combine(
+        {
+            jurisdiction.name: BatchTallies.load(jurisdiction.batch_tallies)
+            for jurisdiction in contest.jurisdictions
+        }
+    )
+
+
+# Raises if invalid
+def validate_batch_tallies_upload(request: Request, jurisdiction: Jurisdiction):
+    if "batchTallies" not in request.files:
+        raise BadRequest("Missing required file parameter 'batchTallies'")
+
+    if jurisdiction.manifest_num_batches is None:
+        raise BadRequest("Must upload ballot manifest before uploading batch tallies.")
+
+    if targeted_contest(jurisdiction) is None:
+        raise BadRequest("Jurisdiction is not in the targeted contest.")
+
+
+# We save the batch tallies file, and bgcompute finds it and processes it in
+# the background.
+def save_batch_tallies_file(batch_tallies, jurisdiction: Jurisdiction):
+    batch_tallies_string = decode_csv_file(batch_tallies.read())
+    jurisdiction.batch_tallies_file = File(
+        id=str(uuid.uuid4()),
+        name=batch_tallies.filename,
+        contents=batch_tallies_string,
+        uploaded_at=datetime.utcnow(),
+    )
+
+
+def clear_batch_tallies_file(jurisdiction: Jurisdiction):
+    jurisdiction.batch_tallies = None
+
+    if jurisdiction.batch_tallies_file_id:
+        File.query.filter_by(id=jurisdiction.batch_tallies_file_id).delete()
+
+
+@app.route(
+    "/election/<election_id>/jurisdiction/<jurisdiction_id>/batch-tallies",
+    methods=["PUT"],
+)
+@with_jurisdiction_access
+def upload_batch_tallies(
+    election: Election, jurisdiction: Jurisdiction,  # pylint: disable=unused-argument
+):
+    validate_batch_tallies_upload(request, jurisdiction)
+    clear_batch_tallies_file(jurisdiction)
+    save_batch_tallies_file(request.files["batchTallies"], jurisdiction)
+    db.session.commit()
+    return jsonify(status="ok")
+
+
+@app.route(
+    "/election/<election_id>/jurisdiction/<jurisdiction_id>/batch-tallies",
+    methods=["GET"],
+)
+@with_jurisdiction_access
+def get_batch_tallies(
+    election: Election, jurisdiction: Jurisdiction  # pylint: disable=unused-argument
+):
+    if jurisdiction.batch_tallies_file:
+        return jsonify(
+            file=serialize_file(jurisdiction.batch_tallies_file),
+            processing=serialize_file_processing(jurisdiction.batch_tallies_file),
+        )
+    else:
+        return jsonify(file=None, processing=None)
+
+
+@app.route(
+    "/election/<election_id>/jurisdiction/<jurisdiction_id>/batch-tallies/csv",
+    methods=["GET"],
+)
+@with_election_access
+def download_batch_tallies_file(
+    election: Election, jurisdiction_id: str,  # pylint: disable=unused-argument
+):
+    jurisdiction = Jurisdiction.query.filter_by(
+        election_id=election.id, id=jurisdiction_id
+    ).first()
+    if not jurisdiction or not jurisdiction.batch_tallies_file:
+        return NotFound()
+
+    return csv_response(
+        jurisdiction.batch_tallies_file.contents, jurisdiction.batch_tallies_file.name
+    )
+
+
+@app.route(
+    "/election/<election_id>/jurisdiction/<jurisdiction_id>/batch-tallies",
+    methods=["DELETE"],
+)
+@with_jurisdiction_access
+def clear_batch_tallies(
+    election: Election, jurisdiction: Jurisdiction,  # pylint: disable=unused-argument
+):
+    clear_batch_tallies_file(jurisdiction)
+    db.session.commit()
+    return jsonify(status="ok")
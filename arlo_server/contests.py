@@ -19,6 +19,7 @@ from arlo_server.models import (
 )
 from arlo_server.rounds import get_current_round
 from util.jsonschema import validate, JSONDict
+from audit_math import sampler_contest
 
 
 CONTEST_CHOICE_SCHEMA = {
@@ -140,19 +141,26 @@ def round_status_by_contest(
         .group_by(Contest.id)
         .values(Contest.id, func.count())
     )
-    round_is_complete_by_contest = dict(
-        RoundContest.query.filter_by(round_id=round.id).values(
-            RoundContest.contest_id, RoundContest.is_complete
+    round_contests = {
+        contest_id: (is_complete, current_p_value)
+        for contest_id, is_complete, current_p_value in RoundContest.query.filter_by(
+            round_id=round.id
+        ).values(
+            RoundContest.contest_id,
+            RoundContest.is_complete,
+            RoundContest.current_p_value,
         )
-    )
+    }
 
     # isRiskLimitMet will be None until we have computed the risk measurement
     # for that contest, which happens once we're done auditing its sampled
     # ballots. Once the risk measurement is calculated, isRiskLimitMet will be
-    # a boolean.
+    # a boolean. currentPValue is the risk measurement given the ballots
+    # audited so far, which is updated as each ballot is audited.
     return {
         c.id: {
-            "isRiskLimitMet": round_is_complete_by_contest[c.id],
+            "isRiskLimitMet": round_contests[c.id][0],
+            "currentPValue": round_contests[c.id][1],
             "numBallotsSampled": sampled_ballot_count_by_contest.get(c.id, 0),
         }
         for c in contests
@@ -165,6 +173,7 @@ def create_or_update_all_contests(election: Election):
     json_contests = request.get_json()
     validate_contests(json_contests)
 
+    old_contest_ids = [c.id for c in election.contests]
     Contest.query.filter_by(election_id=election.id).delete()
 
     for json_contest in json_contests:
@@ -173,6 +182,11 @@ def create_or_update_all_contests(election: Election):
 
     db.session.commit()
 
+    # The new contests may reuse the old contests' ids, with different choices
+    sampler_contest.invalidate_db_contests(
+        old_contest_ids + [json_contest["id"] for json_contest in json_contests]
+    )
+
     return jsonify(status="ok")
 
 
@@ -1,8 +1,9 @@
 from flask import jsonify, request
+from werkzeug.exceptions import BadRequest, Conflict
 
 from arlo_server import app, db
 from arlo_server.auth import with_election_access
-from arlo_server.models import Election, USState
+from arlo_server.models import AuditMathType, Election, USState
 
 from util.jsonschema import validate
 
@@ -25,6 +26,11 @@ GET_ELECTION_SETTINGS_RESPONSE_SCHEMA = {
                 {"type": "null"},
             ]
         },
+        "sequentialStopping": {"type": "boolean"},
+        "auditMathType": {
+            "type": "string",
+            "enum": [audit_math_type.value for audit_math_type in AuditMathType],
+        },
     },
     "additionalProperties": False,
     "required": ["electionName", "online", "randomSeed", "riskLimit", "state"],
@@ -43,6 +49,8 @@ def get_election_settings(election: Election):
         "randomSeed": election.random_seed,
         "riskLimit": election.risk_limit,
         "state": election.state,
+        "sequentialStopping": election.sequential_stopping,
+        "auditMathType": election.audit_math_type,
     }
 
     validate(schema=GET_ELECTION_SETTINGS_RESPONSE_SCHEMA, instance=response_data)
@@ -56,11 +64,32 @@ def put_election_settings(election: Election):
     settings = request.get_json()
     validate(schema=PUT_ELECTION_SETTINGS_REQUEST_SCHEMA, instance=settings)
 
+    # Older clients don't send the audit math settings, so keep them as they
+    # are unless they're given.
+    audit_math_type = settings.get("auditMathType", election.audit_math_type)
+    sequential_stopping = settings.get(
+        "sequentialStopping", election.sequential_stopping
+    )
+    # Minerva's risk measurements are only valid at the end of each round
+    if audit_math_type == AuditMathType.MINERVA and sequential_stopping:
+        raise BadRequest("Sequential stopping is not supported with Minerva")
+    # The risk measurements of the rounds so far depend on the audit math
+    # settings, so they can't change once the audit has started.
+    if election.rounds and (
+        audit_math_type != election.audit_math_type
+        or sequential_stopping != election.sequential_stopping
+    ):
+        raise Conflict(
+            "Cannot change the audit math type or sequential stopping after the audit has started"
+        )
+
     election.election_name = settings["electionName"]
     election.online = settings["online"]
     election.random_seed = settings["randomSeed"]
     election.risk_limit = settings["riskLimit"]
     election.state = settings["state"]
+    election.sequential_stopping = sequential_stopping
+    election.audit_math_type = audit_math_type
 
     db.session.add(election)
     db.session.commit()
@@ -74,7 +74,10 @@ def round_status_by_jurisdiction(
     audited_ballot_count_by_jurisdiction = dict(
         SampledBallotDraw.query.filter_by(round_id=round.id)
         .join(SampledBallot)
-        .filter(SampledBallot.status != BallotStatus.NOT_AUDITED)
+        # Ballots that weren't needed (see sequential stopping) weren't audited
+        .filter(
+            SampledBallot.status.in_([BallotStatus.AUDITED, BallotStatus.NOT_FOUND])
+        )
         .join(Batch)
         .group_by(Batch.jurisdiction_id)
         .values(Batch.jurisdiction_id, func.count())
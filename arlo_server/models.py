@@ -29,6 +29,13 @@ class Organization(BaseModel):
     elections = relationship("Election", backref="organization", passive_deletes=True)
 
 
+class AuditMathType(str, Enum):
+    # See audit_math.bravo
+    BRAVO = "BRAVO"
+    # See audit_math.minerva
+    MINERVA = "MINERVA"
+
+
 # Election is a slight misnomer - this model represents an audit.
 class Election(BaseModel):
     id = db.Column(db.String(200), primary_key=True)
@@ -42,10 +49,27 @@ class Election(BaseModel):
     meeting_date = db.Column(db.Date)
     risk_limit = db.Column(db.Integer)
     random_seed = db.Column(db.String(100))
+    # Saved state of the ballot sampler after the last round's draws, so the
+    # next round can continue drawing where it left off (see
+    # audit_math.sampler.SamplerCursor)
+    sampler_state = db.Column(db.LargeBinary)
 
     # an election is "online" if every ballot is entered online, vs. offline in a tally sheet.
     online = db.Column(db.Boolean, nullable=False, default=False)
 
+    # In sequential stopping mode, we check the risk limit as each ballot is
+    # audited, and stop auditing once it's met (see
+    # arlo_server.risk_measurements.update_sequential_stopping).
+    sequential_stopping = db.Column(db.Boolean, nullable=False, default=False)
+
+    # The statistical test used to compute sample sizes and measure risk in
+    # our new multi-jurisdiction flow. Minerva needs fewer ballots per round,
+    # but is only valid at the end of each round, so it can't be combined
+    # with sequential stopping.
+    audit_math_type = db.Column(
+        db.Enum(AuditMathType), nullable=False, default=AuditMathType.BRAVO
+    )
+
     # False for our old single-jurisdiction flow,
     # True for our new multi-jurisdiction flow
     is_multi_jurisdiction = db.Column(db.Boolean, nullable=False)
@@ -91,7 +115,16 @@ class Jurisdiction(BaseModel):
     manifest_file_id = db.Column(
         db.String(200), db.ForeignKey("file.id", ondelete="set null")
     )
-    manifest_file = relationship("File")
+    manifest_file = relationship("File", foreign_keys=[manifest_file_id])
+
+    # The reported votes in each batch of the manifest, for batch comparison
+    # audits. We save the uploaded file, and the votes in the compact columnar
+    # form of audit_math.batch_tallies.BatchTallies once it's processed.
+    batch_tallies_file_id = db.Column(
+        db.String(200), db.ForeignKey("file.id", ondelete="set null")
+    )
+    batch_tallies_file = relationship("File", foreign_keys=[batch_tallies_file_id])
+    batch_tallies = db.Column(db.LargeBinary)
 
     batches = relationship("Batch", backref="jurisdiction", passive_deletes=True)
     audit_boards = relationship(
@@ -289,6 +322,9 @@ class BallotStatus(str, Enum):
     NOT_AUDITED = "NOT_AUDITED"
     AUDITED = "AUDITED"
     NOT_FOUND = "NOT_FOUND"
+    # The risk limit was met before this ballot was audited (in sequential
+    # stopping mode)
+    NOT_NEEDED = "NOT_NEEDED"
 
 
 # Represents a physical ballot. A ballot only gets interpreted by an audit
@@ -329,10 +365,16 @@ class SampledBallotDraw(BaseModel):
     round_id = db.Column(
         db.String(200), db.ForeignKey("round.id", ondelete="cascade"), nullable=False
     )
-    ticket_number = db.Column(db.String(200), nullable=False)
+    # The exact ticket number (see audit_math.sampler.ticket_number_value),
+    # formatted for display with audit_math.sampler.format_ticket_number.
+    # NUMERIC keeps every digit and sorts numerically, and takes less space
+    # than the ticket number as a string.
+    ticket_number = db.Column(db.Numeric, nullable=False)
 
     __table_args__ = (
         db.PrimaryKeyConstraint("ballot_id", "round_id", "ticket_number"),
+        # For listing a round's draws in ticket number order
+        db.Index("ix_sampled_ballot_draw_round_ticket", "round_id", "ticket_number"),
     )
 
 
@@ -383,6 +425,14 @@ class RoundContest(BaseModel):
     is_complete = db.Column(db.Boolean)
     sample_size = db.Column(db.Integer)
 
+    # The votes for each contest choice in the ballots audited so far this
+    # round, and the risk measurement they give (together with the results of
+    # previous rounds). Both are kept up to date as ballots are audited, so
+    # that we can report the risk during the round. See
+    # arlo_server/risk_measurements.py.
+    audited_votes = db.Column(db.JSON)
+    current_p_value = db.Column(db.Float)
+
 
 class RoundContestResult(BaseModel):
     round_id = db.Column(
@@ -420,6 +470,22 @@ class File(BaseModel):
     processing_error = db.Column(db.Text)
 
 
+# Prefixes of ticket sequences cached by audit_math.sample_cache, keyed by a
+# hash of the seed and manifest that determine them. Entries are replaced
+# when a longer prefix is drawn.
+class SampleCacheEntry(BaseModel):
+    id = db.Column(db.String(64), primary_key=True)
+    contents = db.Column(db.LargeBinary, nullable=False)
+    # The length of contents in bytes, so that eviction doesn't read them
+    size = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        # For evicting the least recently used entries (see
+        # arlo_server.sample_sizes.evict_sample_cache)
+        db.Index("ix_sample_cache_entry_updated_at_size", "updated_at", "size"),
+    )
+
+
 class ProcessingStatus(str, Enum):
     READY_TO_PROCESS = "READY_TO_PROCESS"
     PROCESSING = "PROCESSING"
@@ -18,6 +18,7 @@ from arlo_server.auth import with_election_access, with_jurisdiction_access
 from util.csv_download import csv_response, election_timestamp_name
 from util.isoformat import isoformat
 from util.group_by import group_by
+from audit_math.sampler import format_ticket_number
 
 
 def pretty_affiliation(affiliation: str) -> str:
@@ -46,7 +47,10 @@ def pretty_ticket_numbers(
     for round_num, draws in group_by(
         ballot.draws, key=lambda d: round_id_to_num[d.round_id]
     ).items():
-        ticket_numbers_str = ", ".join(sorted(d.ticket_number for d in draws))
+        ticket_numbers_str = ", ".join(
+            format_ticket_number(ticket_number)
+            for ticket_number in sorted(d.ticket_number for d in draws)
+        )
         ticket_numbers.append(f"Round {round_num}: {ticket_numbers_str}")
     return ", ".join(ticket_numbers)
 
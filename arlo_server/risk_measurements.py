@@ -0,0 +1,238 @@
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import func
+
+from arlo_server.models import (
+    AuditBoard,
+    AuditMathType,
+    Election,
+    Round,
+    RoundContest,
+    Contest,
+    SampledBallot,
+    SampledBallotDraw,
+    BallotInterpretation,
+    BallotStatus,
+)
+from arlo_server.sample_sizes import (
+    cumulative_contest_results,
+    previous_round_results,
+)
+from audit_math import bravo, minerva, sampler_contest
+
+
+# Count the votes for each contest choice in the ballots audited so far in a
+# round. Note that a ballot's votes count once for each time it was drawn in
+# the round.
+def audited_votes_by_choice(round: Round) -> Dict[str, int]:
+    return dict(
+        BallotInterpretation.query.join(SampledBallot)
+        .join(SampledBallotDraw)
+        .filter_by(round_id=round.id)
+        .group_by(BallotInterpretation.contest_choice_id)
+        .values(BallotInterpretation.contest_choice_id, func.count())
+    )
+
+
+# Measure the risk of a contest's cumulative audit results at the end of a
+# round with the election's audit math. Minerva also needs the results at the
+# end of each previous round.
+def compute_contest_risk(
+    election: Election, round: Round, contest: Contest, sample_results: Dict[str, int]
+) -> Tuple[Dict[Tuple[str, str], float], bool]:
+    if election.audit_math_type == AuditMathType.MINERVA:
+        return minerva.compute_risk(
+            election.risk_limit / 100,
+            sampler_contest.from_db_contest(contest),
+            sample_results,
+            previous_round_results(contest, round.round_num),
+        )
+    return bravo.compute_risk(
+        election.risk_limit / 100,
+        sampler_contest.from_db_contest(contest),
+        sample_results,
+    )
+
+
+# The risk measurement of a contest's results so far, including the votes
+# audited so far in the current round. Minerva's measurement isn't valid in
+# the middle of a round, so for Minerva this is the risk if the round ended
+# now. Rounds can be started before the risk limit is set, in which case
+# there's no risk to measure yet.
+def current_p_value(
+    round: Round, contest: Contest, audited_votes: Dict[str, int]
+) -> Optional[float]:
+    if not round.election.risk_limit:
+        return None
+    previous_results = cumulative_contest_results(contest)
+    risks, _ = compute_contest_risk(
+        round.election,
+        round,
+        contest,
+        {
+            choice.id: previous_results[choice.id] + audited_votes.get(choice.id, 0)
+            for choice in contest.choices
+        },
+    )
+    return max(risks.values())
+
+
+# Start tracking the risk measurement of each contest when a round starts.
+# Ballots drawn this round that were already audited in a previous round won't
+# be audited again, so we count their votes up front.
+def start_risk_measurements(round: Round):
+    audited_votes = audited_votes_by_choice(round)
+    for round_contest in round.round_contests:
+        contest = Contest.query.get(round_contest.contest_id)
+        round_contest.audited_votes = {
+            choice.id: audited_votes.get(choice.id, 0) for choice in contest.choices
+        }
+        round_contest.current_p_value = current_p_value(
+            round, contest, round_contest.audited_votes
+        )
+
+
+# Update the risk measurements with the change in a ballot's votes when an
+# audit board records (or changes) its interpretations. Only the contests
+# whose votes changed are updated.
+def update_risk_measurements(
+    round: Round,
+    ballot: SampledBallot,
+    old_interpretations: List[BallotInterpretation],
+    new_interpretations: List[BallotInterpretation],
+):
+    num_draws = SampledBallotDraw.query.filter_by(
+        ballot_id=ballot.id, round_id=round.id
+    ).count()
+
+    vote_changes: Dict[str, Counter] = defaultdict(Counter)
+    for interpretation in new_interpretations:
+        if interpretation.contest_choice_id:
+            vote_changes[interpretation.contest_id][
+                interpretation.contest_choice_id
+            ] += num_draws
+    for interpretation in old_interpretations:
+        if interpretation.contest_choice_id:
+            vote_changes[interpretation.contest_id][
+                interpretation.contest_choice_id
+            ] -= num_draws
+
+    for contest_id, choice_vote_changes in vote_changes.items():
+        if not any(choice_vote_changes.values()):
+            continue
+
+        # Lock the round contest, so that concurrent updates from other audit
+        # boards don't overwrite each other.
+        round_contest = (
+            RoundContest.query.filter_by(round_id=round.id, contest_id=contest_id)
+            .with_for_update()
+            .populate_existing()
+            .one_or_none()
+        )
+        # Rounds from before we tracked risk measurements as ballots were
+        # audited don't have audited votes to update.
+        if round_contest is None or round_contest.audited_votes is None:
+            continue
+
+        contest = Contest.query.get(contest_id)
+        audited_votes = dict(round_contest.audited_votes)
+        for choice_id, vote_change in choice_vote_changes.items():
+            audited_votes[choice_id] = audited_votes.get(choice_id, 0) + vote_change
+
+        round_contest.audited_votes = audited_votes
+        round_contest.current_p_value = current_p_value(round, contest, audited_votes)
+
+
+# In sequential stopping mode, we measure the risk of the targeted contest on
+# the longest run of this round's draws, in ticket number order, whose ballots
+# have all been audited, together with the previous rounds' results. BRAVO is a
+# sequential test, so we can stop at any point in the sample's (ticket number)
+# order. Ballots audited out of order, after that run, don't count yet. We use
+# this measurement both to decide whether to stop as ballots are audited and at
+# the end of the round, so that the two always agree. Returns the risk
+# measurement and the ids of the ballots after the run that haven't been
+# audited yet.
+def sequential_risk_measurement(
+    election: Election, round: Round, contest: Contest
+) -> Tuple[Dict[Tuple[str, str], float], bool, Set[str]]:
+    draws = (
+        SampledBallotDraw.query.filter_by(round_id=round.id)
+        .join(SampledBallot)
+        .order_by(SampledBallotDraw.ticket_number)
+        .values(SampledBallot.id, SampledBallot.status)
+    )
+    audited_draws: List[str] = []
+    unaudited_ballots: Set[str] = set()
+    for ballot_id, status in draws:
+        if status in [BallotStatus.NOT_AUDITED, BallotStatus.NOT_NEEDED]:
+            unaudited_ballots.add(ballot_id)
+        elif not unaudited_ballots:
+            audited_draws.append(ballot_id)
+
+    choice_by_ballot = (
+        dict(
+            BallotInterpretation.query.filter_by(contest_id=contest.id)
+            .filter(BallotInterpretation.ballot_id.in_(set(audited_draws)))
+            .values(
+                BallotInterpretation.ballot_id, BallotInterpretation.contest_choice_id
+            )
+        )
+        if audited_draws
+        else {}
+    )
+    # Each draw of a ballot counts its votes again
+    audited_votes = Counter(
+        choice_by_ballot[ballot_id]
+        for ballot_id in audited_draws
+        if choice_by_ballot.get(ballot_id)
+    )
+    # At the end of the round, the contest's results include this round's, so
+    # we only take the previous rounds' results.
+    previous_rounds = previous_round_results(contest, round.round_num)
+    previous_results = previous_rounds[-1] if previous_rounds else {}
+    risks, is_complete = bravo.compute_risk(
+        election.risk_limit / 100,
+        sampler_contest.from_db_contest(contest),
+        {
+            choice.id: previous_results.get(choice.id, 0) + audited_votes[choice.id]
+            for choice in contest.choices
+        },
+    )
+    return risks, is_complete, unaudited_ballots
+
+
+# In sequential stopping mode, check the risk limit as ballots are audited.
+# Once the targeted contest meets the risk limit, the ballots that haven't been
+# audited yet aren't needed. If changes to audited ballots mean that it no
+# longer meets the risk limit, they're needed again, and any audit boards that
+# signed off without auditing them have to audit them and sign off again.
+def update_sequential_stopping(election: Election, round: Round):
+    contest = next(c for c in election.contests if c.is_targeted)
+    _, is_complete, unaudited_ballots = sequential_risk_measurement(
+        election, round, contest
+    )
+    if not unaudited_ballots:
+        return
+
+    if is_complete:
+        SampledBallot.query.filter(
+            SampledBallot.id.in_(unaudited_ballots),
+            SampledBallot.status == BallotStatus.NOT_AUDITED,
+        ).update(
+            {SampledBallot.status: BallotStatus.NOT_NEEDED},
+            synchronize_session="fetch",
+        )
+        return
+
+    needed_ballots = SampledBallot.query.filter(
+        SampledBallot.id.in_(unaudited_ballots),
+        SampledBallot.status == BallotStatus.NOT_NEEDED,
+    )
+    audit_board_ids = {ballot.audit_board_id for ballot in needed_ballots}
+    needed_ballots.update(
+        {SampledBallot.status: BallotStatus.NOT_AUDITED}, synchronize_session="fetch"
+    )
+    if audit_board_ids:
+        AuditBoard.query.filter(AuditBoard.id.in_(audit_board_ids)).update(
+            {AuditBoard.signed_off_at: None}, synchronize_session="fetch"
+        )
@@ -16,8 +16,10 @@ from arlo_server.models import (
     Contest,
 )
 from arlo_server.auth import with_election_access, with_jurisdiction_access
-from arlo_server.sample_sizes import sample_size_options
+from arlo_server.sample_sizes import sample_size_options, contest_manifest
+from arlo_server.risk_measurements import start_risk_measurements
 from util.isoformat import isoformat
+from config import SAMPLER_PROCESSES
 from audit_math import sampler
 
 
@@ -84,27 +86,22 @@ def sample_ballots(election: Election, round: Round, sample_size: int):
         SampledBallotDraw.query.join(Round).filter_by(election_id=election.id).count()
     )
 
-    # Create the pool of ballots to sample (aka manifest) by combining the
-    # manifests from every jurisdiction in the contest's universe.
-    # Audits must be deterministic and repeatable for the same real world
-    # inputs. So the sampler expects the same input for the same real world
-    # data. Thus, we use the jurisdiction and batch names (deterministic real
-    # world ids) instead of the jurisdiction and batch ids (non-deterministic
-    # uuids that we generate for each audit).
-    manifest = {
-        (jurisdiction.name, batch.name): batch.num_ballots
-        for jurisdiction in targeted_contest.jurisdictions
-        for batch in jurisdiction.batches
-    }
+    manifest = contest_manifest(targeted_contest)
     batch_key_to_id = {
         (jurisdiction.name, batch.name): batch.id
         for jurisdiction in targeted_contest.jurisdictions
         for batch in jurisdiction.batches
     }
 
-    # Do the math! I.e. compute the actual sample
-    sample = sampler.draw_sample(
-        election.random_seed, manifest, sample_size, num_previously_sampled
+    # Do the math! I.e. compute the actual sample, picking up the sampler
+    # where the previous round left off.
+    sample, election.sampler_state = sampler.draw_sample_resumably(
+        election.random_seed,
+        manifest,
+        sample_size,
+        num_previously_sampled,
+        election.sampler_state,
+        processes=SAMPLER_PROCESSES or None,
     )
 
     # Record which ballots are sampled in the db.
@@ -128,6 +125,10 @@ def sample_ballots(election: Election, round: Round, sample_size: int):
             sampled_ballot = SampledBallot.query.filter_by(
                 batch_id=batch_id, ballot_position=ballot_position
             ).one()
+            # A ballot that wasn't needed in an earlier round (see sequential
+            # stopping) was never looked at, so it has to be audited now.
+            if sampled_ballot.status == BallotStatus.NOT_NEEDED:
+                sampled_ballot.status = BallotStatus.NOT_AUDITED
 
         sampled_ballot_draw = SampledBallotDraw(
             ballot_id=sampled_ballot.id, round_id=round.id, ticket_number=ticket_number,
@@ -181,6 +182,8 @@ def create_round(election: Election):
         db.session.add(round_contest)
 
     sample_ballots(election, round, sample_size)
+    db.session.flush()  # Ensure the sampled ballot draws are queryable
+    start_risk_measurements(round)
 
     db.session.commit()
 
@@ -1,4 +1,5 @@
 import datetime, csv, io, json, uuid, urllib.parse
+from decimal import Decimal
 from typing import Dict, List, Tuple
 
 from flask import jsonify, request, redirect, session
@@ -33,6 +34,7 @@ from arlo_server.ballot_manifest import (
 )
 from arlo_server.sample_sizes import cumulative_contest_results
 from audit_math import bravo, sampler_contest, sampler
+from audit_math.sampler import format_ticket_number
 from config import (
     SUPERADMIN_AUTH0_BASE_URL,
     SUPERADMIN_AUTH0_CLIENT_ID,
@@ -175,14 +177,18 @@ def sample_ballots(session: Session, election: Election, round: Round):
         manifest[batch.name] = batch.num_ballots
         batch_id_from_name[batch.name] = batch.id
 
-    sample = sampler.draw_sample(
-        election.random_seed, manifest, chosen_sample_size, num_sampled=num_sampled,
+    sample, election.sampler_state = sampler.draw_sample_resumably(
+        election.random_seed,
+        manifest,
+        chosen_sample_size,
+        num_sampled,
+        election.sampler_state,
     )
 
     audit_boards = jurisdiction.audit_boards
 
     batch_sizes: Dict[str, int] = {}
-    batches_to_ballots: Dict[str, List[Tuple[int, str, int]]] = {}
+    batches_to_ballots: Dict[str, List[Tuple[int, Decimal, int]]] = {}
     # Build batch - batch_size map
     for (ticket_number, (batch_name, ballot_position), sample_number) in sample:
         if batch_name in batch_sizes:
@@ -500,6 +506,7 @@ def audit_basic_update(election_id):
     election.online = info["online"]
 
     errors = []
+    old_contest_ids = [c.id for c in election.contests]
     Contest.query.filter_by(election_id=election.id).delete()
 
     for contest in info["contests"]:
@@ -545,6 +552,11 @@ def audit_basic_update(election_id):
 
     db.session.commit()
 
+    # The new contests may reuse the old contests' ids, with different choices
+    sampler_contest.invalidate_db_contests(
+        old_contest_ids + [contest["id"] for contest in info["contests"]]
+    )
+
     return jsonify(status="ok")
 
 
@@ -765,7 +777,7 @@ def ballot_list(election_id, jurisdiction_id, round_id):
     return jsonify(
         ballots=[
             {
-                "ticketNumber": ballot_draw.ticket_number,
+                "ticketNumber": format_ticket_number(ballot_draw.ticket_number),
                 "status": ballot.status,
                 "interpretations": [
                     serialize_interpretation(i) for i in ballot.interpretations
@@ -805,7 +817,7 @@ def ballot_list_by_audit_board(election_id, jurisdiction_id, audit_board_id, rou
     return jsonify(
         ballots=[
             {
-                "ticketNumber": ballot_draw.ticket_number,
+                "ticketNumber": format_ticket_number(ballot_draw.ticket_number),
                 "status": ballot.status,
                 "interpretations": [
                     serialize_interpretation(i) for i in ballot.interpretations
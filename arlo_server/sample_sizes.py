@@ -1,12 +1,25 @@
 from collections import defaultdict
-from typing import Dict
-from flask import jsonify
+from datetime import datetime as dt, timedelta
+import math
+from typing import Dict, List, Optional, Tuple
+from flask import jsonify, request
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert
 from werkzeug.exceptions import BadRequest
 
 from arlo_server import app
-from arlo_server.models import Election, Contest
+from arlo_server.models import (
+    db,
+    AuditMathType,
+    Election,
+    Contest,
+    Round,
+    RoundContestResult,
+    SampleCacheEntry,
+)
 from arlo_server.auth import with_election_access
-from audit_math import bravo, sampler_contest
+from audit_math import bravo, minerva, sampler_contest, sampler
+from audit_math.sample_cache import SampleCache, SampleStore
 
 
 # Sum the audit results for each contest choice from all rounds so far
@@ -17,7 +30,144 @@ def cumulative_contest_results(contest: Contest) -> Dict[str, int]:
     return results_by_choice
 
 
-def sample_size_options(election: Election, round_one=False) -> dict:
+# The cumulative audit results for each contest choice at the end of each
+# round before round_num, in round order. Minerva's risk measurements depend on
+# the sample at the end of each previous round, not just the cumulative sample.
+def previous_round_results(contest: Contest, round_num: int) -> List[Dict[str, int]]:
+    results = (
+        RoundContestResult.query.filter_by(contest_id=contest.id)
+        .join(Round)
+        .filter(Round.round_num < round_num)
+        .order_by(Round.round_num)
+        .values(
+            Round.round_num,
+            RoundContestResult.contest_choice_id,
+            RoundContestResult.result,
+        )
+    )
+    results_by_round: Dict[int, Dict[str, int]] = defaultdict(dict)
+    for result_round_num, choice_id, result in results:
+        results_by_round[result_round_num][choice_id] = result
+
+    cumulative_results: Dict[str, int] = defaultdict(int)
+    round_results = []
+    for _, results_by_choice in sorted(results_by_round.items()):
+        for choice_id, result in results_by_choice.items():
+            cumulative_results[choice_id] += result
+        round_results.append(dict(cumulative_results))
+    return round_results
+
+
+# The most space cached samples may take up in the database (each prefix
+# takes about 100 bytes per draw), and how long an unused one is kept.
+MAX_SAMPLE_CACHE_BYTES = 512 * 1024 * 1024
+MAX_SAMPLE_CACHE_AGE = timedelta(days=30)
+# Reading an entry only marks it as recently used if it was last marked at
+# least this long ago, so that most reads don't write.
+SAMPLE_CACHE_TOUCH_INTERVAL = timedelta(days=1)
+
+
+# Persists cached samples in the database. We read and write them on their own
+# connection, outside of the request's transaction, so that GET requests can
+# save samples too. Entries are evicted by evict_sample_cache (see bgcompute),
+# rather than on every write.
+class DbSampleStore(SampleStore):
+    def get(self, key: str) -> Optional[bytes]:
+        table = SampleCacheEntry.__table__
+        now = dt.utcnow()
+        with db.engine.begin() as connection:
+            entry = connection.execute(
+                sa.select([table.c.contents, table.c.updated_at]).where(
+                    table.c.id == key
+                )
+            ).first()
+            if entry is None:
+                return None
+            contents, updated_at = entry
+            if updated_at < now - SAMPLE_CACHE_TOUCH_INTERVAL:
+                connection.execute(
+                    table.update().where(table.c.id == key).values(updated_at=now)
+                )
+        return bytes(contents)
+
+    def put(self, key: str, contents: bytes) -> None:
+        table = SampleCacheEntry.__table__
+        now = dt.utcnow()
+        with db.engine.begin() as connection:
+            # Cached prefixes only ever get longer, so the new one replaces
+            # the old one
+            statement = insert(table).values(
+                id=key,
+                contents=contents,
+                size=len(contents),
+                created_at=now,
+                updated_at=now,
+            )
+            connection.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[table.c.id],
+                    set_=dict(contents=contents, size=len(contents), updated_at=now),
+                )
+            )
+
+
+# Evicts cached samples from the database least recently used first once they
+# take up more than MAX_SAMPLE_CACHE_BYTES, and once they go unused for
+# MAX_SAMPLE_CACHE_AGE (e.g. after a new manifest is uploaded, the old
+# manifest's prefix is never used again). Only reads the entries' sizes and
+# last use times, which are indexed.
+def evict_sample_cache() -> None:
+    table = SampleCacheEntry.__table__
+    with db.engine.begin() as connection:
+        connection.execute(
+            table.delete().where(
+                table.c.updated_at < dt.utcnow() - MAX_SAMPLE_CACHE_AGE
+            )
+        )
+
+        # The total size of each entry and every entry used more recently
+        total_sizes = sa.select(
+            [
+                table.c.id,
+                sa.func.sum(table.c.size)
+                .over(order_by=[table.c.updated_at.desc(), table.c.id])
+                .label("total_size"),
+            ]
+        ).alias("total_sizes")
+        connection.execute(
+            table.delete().where(
+                table.c.id.in_(
+                    sa.select([total_sizes.c.id]).where(
+                        total_sizes.c.total_size > MAX_SAMPLE_CACHE_BYTES
+                    )
+                )
+            )
+        )
+
+
+sample_cache = SampleCache(store=DbSampleStore())
+
+
+# Create the pool of ballots to sample (aka manifest) by combining the
+# manifests from every jurisdiction in the contest's universe.
+# Audits must be deterministic and repeatable for the same real world
+# inputs. So the sampler expects the same input for the same real world
+# data. Thus, we use the jurisdiction and batch names (deterministic real
+# world ids) instead of the jurisdiction and batch ids (non-deterministic
+# uuids that we generate for each audit).
+def contest_manifest(contest: Contest) -> Dict[Tuple[str, str], int]:
+    return {
+        (jurisdiction.name, batch.name): batch.num_ballots
+        for jurisdiction in contest.jurisdictions
+        for batch in jurisdiction.batches
+    }
+
+
+# The targeted contest and its cumulative audit results, to compute sample
+# sizes from. See sample_size_options for round_one.
+def sample_size_inputs(
+    election: Election, round_one=False
+) -> Tuple[Contest, Dict[str, int]]:
     if not election.contests:
         raise BadRequest("Cannot compute sample sizes until contests are set")
     if not election.risk_limit:
@@ -35,21 +185,141 @@ def sample_size_options(election: Election, round_one=False) -> dict:
         if round_one
         else cumulative_contest_results(contest)
     )
+    return contest, cumulative_results
 
-    sample_sizes: dict = bravo.get_sample_size(
-        election.risk_limit / 100,
-        sampler_contest.from_db_contest(contest),
-        cumulative_results,
-    )
+
+# The results at the end of each round before the last one, which the Minerva
+# sample sizes for the next round depend on (see sample_size_inputs for
+# round_one).
+def sample_size_previous_rounds(
+    election: Election, contest: Contest, round_one=False
+) -> List[Dict[str, int]]:
+    if round_one or not election.rounds:
+        return []
+    last_round_num = max(round.round_num for round in election.rounds)
+    return previous_round_results(contest, last_round_num)
+
+
+def sample_size_options(election: Election, round_one=False) -> dict:
+    contest, cumulative_results = sample_size_inputs(election, round_one)
+    sample_sizes: dict
+    if election.audit_math_type == AuditMathType.MINERVA:
+        sample_sizes = minerva.get_sample_size(
+            election.risk_limit / 100,
+            sampler_contest.from_db_contest(contest),
+            cumulative_results,
+            sample_size_previous_rounds(election, contest, round_one),
+        )
+    else:
+        sample_sizes = bravo.get_sample_size(
+            election.risk_limit / 100,
+            sampler_contest.from_db_contest(contest),
+            cumulative_results,
+        )
     return sample_sizes
 
 
+# The ballot retrieval workload of each sample size option for round one,
+# i.e. what starting round one with that sample size would draw from the
+# manifests uploaded so far.
+def sample_size_workloads(
+    election: Election, sample_sizes: dict
+) -> Dict[str, Optional[dict]]:
+    contest = next(c for c in election.contests if c.is_targeted)
+    manifest = contest_manifest(contest)
+    if not election.random_seed or sum(manifest.values()) == 0:
+        return {option: None for option in sample_sizes}
+
+    workloads = sampler.sample_workloads(
+        election.random_seed,
+        manifest,
+        {option: sample_sizes[option]["size"] for option in sample_sizes},
+        cache=sample_cache,
+    )
+    return {
+        option: {
+            **workload,
+            "numBallotsByJurisdiction": {
+                jurisdiction.id: workload["numBallotsByJurisdiction"].get(
+                    jurisdiction.name, 0
+                )
+                for jurisdiction in contest.jurisdictions
+            },
+        }
+        for option, workload in workloads.items()
+    }
+
+
+# Computing the workloads means drawing the largest option's sample, which
+# can take seconds for large manifests, so we only do it when asked to, with
+# ?workloads=true.
 @app.route("/election/<election_id>/sample-sizes", methods=["GET"])
 @with_election_access
 def get_sample_sizes(election: Election):
     sample_sizes = sample_size_options(election, round_one=True)
+    workloads = (
+        sample_size_workloads(election, sample_sizes)
+        if request.args.get("workloads") == "true"
+        else {option: None for option in sample_sizes}
+    )
 
     # Convert the results into a slightly more regular format
-    json_sizes = list(sample_sizes.values())
+    json_sizes = [
+        {**sample_size, "workload": workloads[option]}
+        for option, sample_size in sample_sizes.items()
+    ]
 
     return jsonify({"sampleSizes": json_sizes})
+
+
+MAX_CURVE_POINTS = 1000
+
+
+# Parses the grid of chances of completion for the sample size curve from the
+# query string, e.g. ?min=0.5&max=0.99&step=0.01 (the defaults).
+def curve_probabilities() -> List[float]:
+    try:
+        low = float(request.args.get("min", 0.5))
+        high = float(request.args.get("max", 0.99))
+        step = float(request.args.get("step", 0.01))
+    except ValueError:
+        raise BadRequest("min, max and step must be numbers")
+    if not 0 < low <= high < 1:
+        raise BadRequest("min and max must satisfy 0 < min <= max < 1")
+    if not step > 0 or (high - low) / step + 1 > MAX_CURVE_POINTS:
+        raise BadRequest(
+            f"step must be positive and give at most {MAX_CURVE_POINTS} points"
+        )
+
+    # Round away floating point error in the grid, so that e.g. 0.7 comes out
+    # as 0.7, not 0.7000000000000001
+    num_points = math.floor((high - low) / step + 1e-9) + 1
+    return [round(low + i * step, 10) for i in range(num_points)]
+
+
+# The round one sample size for each of a grid of chances of completing the
+# audit in one round, so the audit setup flow can offer a slider over them.
+# The sizes are null for contests that the slider doesn't apply to (i.e.
+# multi-winner contests).
+@app.route("/election/<election_id>/sample-sizes/curve", methods=["GET"])
+@with_election_access
+def get_sample_size_curve(election: Election):
+    probabilities = curve_probabilities()
+    contest, cumulative_results = sample_size_inputs(election, round_one=True)
+    get_curve = (
+        minerva.get_sample_size_curve
+        if election.audit_math_type == AuditMathType.MINERVA
+        else bravo.get_sample_size_curve
+    )
+    sizes = get_curve(
+        election.risk_limit / 100,
+        sampler_contest.from_db_contest(contest),
+        cumulative_results,
+        probabilities,
+    )
+    curve = (
+        None
+        if sizes is None
+        else [{"prob": prob, "size": size} for prob, size in zip(probabilities, sizes)]
+    )
+    return jsonify({"sampleSizeCurve": curve})
@@ -0,0 +1,139 @@
+"""
+A compact columnar store of the reported votes in each batch of a contest,
+for batch comparison audits.
+
+The MACRO functions (see macro.py) and <sampler.draw_ppeb_sample> take the
+reported results of every batch as nested dicts of batch -> contest ->
+candidate -> votes. For a county with tens of thousands of batches, building
+(and storing) those dicts is much of the work. Instead, BatchTallies keeps
+one contest's results as arrays indexed by batch: a batches x choices array
+of votes and an array of the number of ballots in each batch. It can be
+passed to the MACRO functions in place of the nested dicts, and serializes
+compactly, so each jurisdiction's tallies can be saved as they're uploaded
+and combined when they're needed.
+"""
+import io
+import json
+from typing import Any, Dict, List, Sequence
+import numpy as np
+
+
+def _batch_id(batch: Any) -> Any:
+    # JSON turns the tuple ids of combined tallies into lists
+    return (
+        tuple(_batch_id(part) for part in batch) if isinstance(batch, list) else batch
+    )
+
+
+class BatchTallies:
+    """
+    The reported votes for each choice in a contest, and the number of
+    ballots, in each batch.
+    """
+
+    def __init__(
+        self,
+        contest_name: str,
+        batches: Sequence[Any],
+        choices: Sequence[str],
+        votes: np.ndarray,
+        ballots: np.ndarray,
+    ):
+        """
+        Inputs:
+            contest_name - the name of the contest (as in its
+                           sampler_contest object)
+            batches      - the batch names (or other ids)
+            choices      - the names of the contest's choices (as in its
+                           sampler_contest object)
+            votes        - a batches x choices array of the reported votes for
+                           each choice in each batch
+            ballots      - an array of the number of ballots in each batch
+        """
+        assert votes.shape == (len(batches), len(choices)), "Wrong votes shape"
+        assert ballots.shape == (len(batches),), "Wrong ballots shape"
+
+        self.contest_name = contest_name
+        self.batches = list(batches)
+        self.choices = list(choices)
+        self.votes = votes.astype(np.int64)
+        self.ballots = ballots.astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.batches)
+
+    def choice_votes(self, choices: Sequence[str]) -> np.ndarray:
+        """
+        Returns the batches x choices array of votes for <choices>, in that
+        order. Choices without tallies have no votes.
+        """
+        choice_index = {choice: i for i, choice in enumerate(self.choices)}
+        votes = np.zeros((len(self.batches), len(choices)), dtype=np.int64)
+        for j, choice in enumerate(choices):
+            if choice in choice_index:
+                votes[:, j] = self.votes[:, choice_index[choice]]
+        return votes
+
+    def dump(self) -> bytes:
+        """
+        Serializes the tallies compactly, so they can be saved in the
+        database.
+        """
+        header = {
+            "contestName": self.contest_name,
+            "batches": self.batches,
+            "choices": self.choices,
+        }
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            header=np.array(json.dumps(header, separators=(",", ":"))),
+            votes=self.votes,
+            ballots=self.ballots,
+        )
+        return buffer.getvalue()
+
+    @staticmethod
+    def load(dumped: bytes) -> "BatchTallies":
+        """
+        Restores tallies saved with <dump>.
+        """
+        with np.load(io.BytesIO(dumped), allow_pickle=False) as arrays:
+            header = json.loads(str(arrays["header"]))
+            return BatchTallies(
+                header["contestName"],
+                [_batch_id(batch) for batch in header["batches"]],
+                header["choices"],
+                arrays["votes"],
+                arrays["ballots"],
+            )
+
+    @staticmethod
+    def combine(tallies: Dict[Any, "BatchTallies"]) -> "BatchTallies":
+        """
+        Combines the tallies of a contest from several sources (e.g.
+        jurisdictions) into one. Batch names are only unique within a source,
+        so each batch in the combined tallies is identified by a tuple of its
+        source's key and its name, e.g. (jurisdiction name, batch name).
+        """
+        assert tallies, "Must have tallies to combine"
+        contest_names = {source.contest_name for source in tallies.values()}
+        assert len(contest_names) == 1, "Can only combine tallies of one contest"
+
+        choices: List[str] = []
+        for source in tallies.values():
+            choices.extend(choice for choice in source.choices if choice not in choices)
+
+        return BatchTallies(
+            contest_names.pop(),
+            [
+                (key, batch)
+                for key, source in tallies.items()
+                for batch in source.batches
+            ],
+            choices,
+            np.concatenate(
+                [source.choice_votes(choices) for source in tallies.values()]
+            ),
+            np.concatenate([source.ballots for source in tallies.values()]),
+        )
@@ -7,9 +7,12 @@ Note that this library works for one contest at a time, as if each contest being
 targeted is being audited completely independently.
 """
 import math
-from typing import Dict, Tuple, Union, Optional
-from scipy import stats
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import numpy as np
 
+from . import distributions
 from .sampler_contest import Contest
 
 
@@ -61,12 +64,79 @@ def get_expected_sample_sizes(
         z_w = math.log(2 * s_w)
         z_l = math.log(2 - 2 * s_w)
 
-        T = min(get_test_statistics(contest.margins, sample_results).values())
+        _, _, log_T = get_log_test_statistics(contest.margins, sample_results)
 
-        weighted_alpha = math.log((1.0 / risk_limit) / T)
+        weighted_alpha = math.log(1.0 / risk_limit) - float(log_T.min())
         return math.ceil((weighted_alpha + (z_w / 2.0)) / (p_w * z_w + p_l * z_l))
 
 
+def xlogy(x, y) -> np.ndarray:
+    # x * log(y), taking 0 * log(y) to be 0 even if y is 0, like 0 ** 0 = 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(x == 0, 0.0, x * np.log(y))
+
+
+def get_log_test_statistics(
+    margins: Dict[str, Dict], sample_results: Dict[str, int]
+) -> Tuple[List[str], List[str], np.ndarray]:
+    """
+    Computes log(T*), the log of the test statistic from an existing sample,
+    for every (winner, loser) pair at once.
+
+    Working with logs avoids overflowing (or underflowing) floats for large
+    samples, and the pairwise products of likelihood ratios become sums,
+    which we accumulate as a winners x losers matrix rather than pair by
+    pair.
+
+    Inputs:
+        margins        - the margins for the contest being audited
+        sample_results - mapping of candidates to votes in the (cumulative)
+                         sample:
+                {
+                    candidate1: sampled_votes,
+                    candidate2: sampled_votes,
+                    ...
+                }
+
+    Outputs:
+        winners - the winners, in the order of the rows of log_T
+        losers  - the losers, in the order of the columns of log_T, or [""]
+                  if there are no losers
+        log_T   - matrix of log(T*) for each (winner, loser) pair based on
+                  sample_results
+    """
+    winners = list(margins["winners"])
+    losers = list(margins["losers"])
+
+    # Handle the no-losers case
+    if not losers:
+        return winners, [""], np.zeros((len(winners), 1))
+
+    swl = winner_loser_shares(margins, winners, losers)
+    winner_votes = np.array([sample_results.get(winner, 0) for winner in winners])
+    loser_votes = np.array([sample_results.get(loser, 0) for loser in losers])
+
+    # Each vote for winner w multiplies T by swl / 0.5, and each vote for
+    # loser l by (1 - swl) / 0.5. xlogy treats 0 * log(0) as 0, like 0 ** 0.
+    log_T = xlogy(winner_votes[:, np.newaxis], swl / 0.5) + xlogy(
+        loser_votes[np.newaxis, :], (1 - swl) / 0.5
+    )
+    return winners, losers, log_T
+
+
+def winner_loser_shares(
+    margins: Dict[str, Dict], winners: List[str], losers: List[str]
+) -> np.ndarray:
+    # The matrix of swl, the fraction of votes for each winner among the
+    # votes for it and each loser
+    return np.array(
+        [
+            [margins["winners"][winner]["swl"][loser] for loser in losers]
+            for winner in winners
+        ]
+    )
+
+
 def get_test_statistics(
     margins: Dict[str, Dict], sample_results: Dict[str, int]
 ) -> Dict[Tuple[str, str], float]:
@@ -87,30 +157,74 @@ def get_test_statistics(
         T - Mapping of (winner, loser) pairs to their test statistic based
             on sample_results
     """
-    winners = margins["winners"]
-    losers = margins["losers"]
+    winners, losers, log_T = get_log_test_statistics(margins, sample_results)
+    with np.errstate(over="ignore"):
+        T = np.exp(log_T)
+    return {
+        (winner, loser): float(T[i, j])
+        for i, winner in enumerate(winners)
+        for j, loser in enumerate(losers)
+    }
 
-    T = {}
 
-    # Setup pair-wise Ts:
-    for winner in winners:
-        for loser in losers:
-            T[(winner, loser)] = 1.0
+def estimate_sample_sizes(
+    p_completions: Union[float, np.ndarray],
+    p_w2: float,
+    plus: float,
+    minus: float,
+    threshold: float,
+) -> np.ndarray:
+    """
+    Approximates the BRAVO sample sizes for one or more chances of completion
+    in one round, using a normal approximation to the binomial. The estimates
+    are close, but may be too small; see <first_size_attaining_risk_limit>.
 
-    # Handle the no-losers case
-    if not losers:
-        for winner in winners:
-            T[(winner, "")] = 1.0
+    Inputs:
+        p_completions   - the desired chance(s) of completion in one round
+        p_w2, plus, minus, threshold - as in <bravo_sample_sizes>
 
-    for cand, votes in sample_results.items():
-        if cand in winners:
-            for loser in losers:
-                T[(cand, loser)] *= (winners[cand]["swl"][loser] / 0.5) ** votes
-        elif cand in losers:
-            for winner in winners:
-                T[(winner, cand)] *= ((1 - winners[winner]["swl"][cand]) / 0.5) ** votes
+    Outputs:
+        the estimated sample size for each chance of completion, as an
+        array the shape of <p_completions>
+    """
+    p_completions = np.asarray(p_completions, dtype=float)
 
-    return T
+    p_r2 = 1 - p_w2
+    z = -distributions.norm_ppf(p_completions)
+
+    # The basic equation is E_x = R_x where
+    # E_x: expected # of successes at the 1-p_completion quantile
+    # R_x: smallest x (given n) that attains the risk limit
+
+    # E_x = n * p_w2 + z * sqrt(n * p_w2 * p_r2)
+    # R_x = (threshold - minus * n) / (plus - minus)
+
+    # (Both sides are continuous approximations to discrete functions.)
+    # We set these equal, rewrite as a quadratic in n, and take the
+    # larger of the two zeros (roots).
+
+    # These parameters are useful in simplifying the quadratic.
+    d = p_w2 * p_r2
+    f = threshold / (plus - minus)
+    g = minus / (plus - minus) + p_w2
+
+    # The three coefficients of the quadratic:
+    q_a = g ** 2
+    q_b = -(z ** 2 * d + 2 * f * g)
+    q_c = f ** 2
+
+    # Apply the quadratic formula.
+    # We want the larger root for p_completion > 0.5, the
+    # smaller root for p_completion < 0.5; they are equal
+    # when p_completion = 0.
+    # max here handles cases where, due to rounding error,
+    # the base (content) of the radical is trivially
+    # negative for p_completion very close to 0.5.
+    radical = np.sqrt(np.maximum(0, q_b ** 2 - 4 * q_a * q_c))
+
+    roots = np.where(p_completions > 0.5, -q_b + radical, -q_b - radical)
+    sizes: np.ndarray = np.floor(roots / (2 * q_a)).astype(int)
+    return sizes
 
 
 def bravo_sample_sizes(
@@ -154,55 +268,15 @@ def bravo_sample_sizes(
     if threshold <= 0:
         return 0
 
-    z = -stats.norm.ppf(p_completion)
-
-    # The basic equation is E_x = R_x where
-    # E_x: expected # of successes at the 1-p_completion quantile
-    # R_x: smallest x (given n) that attains the risk limit
-
-    # E_x = n * p_w2 + z * sqrt(n * p_w2 * p_r2)
-    # R_x = (threshold - minus * n) / (plus - minus)
-
-    # (Both sides are continuous approximations to discrete functions.)
-    # We set these equal, rewrite as a quadratic in n, and take the
-    # larger of the two zeros (roots).
-
-    # These parameters are useful in simplifying the quadratic.
-    d = p_w2 * p_r2
-    f = threshold / (plus - minus)
-    g = minus / (plus - minus) + p_w2
-
-    # The three coefficients of the quadratic:
-    q_a = g ** 2
-    q_b = -(z ** 2 * d + 2 * f * g)
-    q_c = f ** 2
-
-    # Apply the quadratic formula.
-    # We want the larger root for p_completion > 0.5, the
-    # smaller root for p_completion < 0.5; they are equal
-    # when p_completion = 0.
-    # max here handles cases where, due to rounding error,
-    # the base (content) of the radical is trivially
-    # negative for p_completion very close to 0.5.
-    radical = math.sqrt(max(0, q_b ** 2 - 4 * q_a * q_c))
-
-    if p_completion > 0.5:
-        size = math.floor((-q_b + radical) / (2 * q_a))
-    else:
-        size = math.floor((-q_b - radical) / (2 * q_a))
+    size = int(estimate_sample_sizes(p_completion, p_w2, plus, minus, threshold))
 
     # This is a reasonable estimate, but is not guaranteed.
     # Get a guarantee. (Perhaps contrary to intuition, using
     # math.ceil instead of math.floor can lead to a
     # larger sample.)
-    searching = True
-    while searching:
-        x_c = stats.binom.ppf(1.0 - p_completion, size, p_w2)
-        test_stat = x_c * plus + (size - x_c) * minus
-        if test_stat > threshold:
-            searching = False
-        else:
-            size += 1
+    size = first_size_attaining_risk_limit(
+        size, p_completion, p_w2, plus, minus, threshold
+    )
 
     # The preceding fussiness notwithstanding, we use a simple
     # adjustment to account for "other" votes beyond p_w and p_r.
@@ -212,6 +286,199 @@ def bravo_sample_sizes(
     return size_adj
 
 
+def bravo_sample_size_curve(
+    risk_limit: float,
+    p_w: float,
+    p_r: float,
+    sample_w: int,
+    sample_r: int,
+    p_completions: Sequence[float],
+) -> np.ndarray:
+    """
+    Computes <bravo_sample_sizes> for a whole grid of chances of completion
+    in one round at once, e.g. to plot sample size against the chance of
+    completion. The estimates for every chance of completion, and the
+    search from each estimate, are vectorized (see <attain_risk_limit>).
+
+    Inputs:
+        risk_limit, p_w, p_r, sample_w, sample_r - as in <bravo_sample_sizes>
+        p_completions   - the desired chances of completion in one round
+
+    Outputs:
+        sample_sizes    - an array of the same sample sizes as
+                          <bravo_sample_sizes> returns for each chance of
+                          completion
+    """
+    # calculate the "two-way" share of p_w
+    p_wr = p_w + p_r
+    p_w2 = p_w / p_wr
+
+    sizes = two_way_sample_sizes(risk_limit, p_w2, sample_w, sample_r, p_completions)
+
+    # Account for "other" votes, as in <bravo_sample_sizes>
+    return np.ceil(sizes / p_wr).astype(int)
+
+
+def two_way_sample_sizes(
+    risk_limit: float,
+    p_w2: float,
+    sample_w: int,
+    sample_r: int,
+    p_completions: Sequence[float],
+) -> np.ndarray:
+    """
+    The sample sizes of <bravo_sample_size_curve>, counting only the votes for
+    the winner and runner-up, i.e. before the adjustment for "other" votes.
+
+    Inputs:
+        risk_limit, sample_w, sample_r - as in <bravo_sample_sizes>
+        p_w2            - the winner's share of the votes for the winner and
+                          runner-up
+        p_completions   - the desired chances of completion in one round
+
+    Outputs:
+        sample_sizes    - the number of votes for the winner or runner-up to
+                          sample for each chance of completion
+    """
+    probabilities = np.asarray(p_completions, dtype=float)
+    p_r2 = 1 - p_w2
+
+    # set up the basic BRAVO math
+    plus = math.log(p_w2 / 0.5)
+    minus = math.log(p_r2 / 0.5)
+    threshold = math.log(1 / risk_limit) - (sample_w * plus + sample_r * minus)
+
+    # crude condition trapping:
+    if threshold <= 0:
+        return np.zeros(len(probabilities), dtype=int)
+
+    sizes = estimate_sample_sizes(probabilities, p_w2, plus, minus, threshold)
+    return attain_risk_limit(sizes, probabilities, p_w2, plus, minus, threshold)
+
+
+def attain_risk_limit(
+    sizes: np.ndarray,
+    p_completions: np.ndarray,
+    p_w2: Union[float, np.ndarray],
+    plus: Union[float, np.ndarray],
+    minus: Union[float, np.ndarray],
+    threshold: Union[float, np.ndarray],
+) -> np.ndarray:
+    """
+    Vectorized <first_size_attaining_risk_limit>: turns each of an array of
+    estimated sample sizes into the smallest sample size, starting from the
+    estimate, that attains the risk limit.
+
+    The first SEARCH_SCAN_SIZE sample sizes from every estimate are checked
+    with one vectorized binom.ppf call. Only estimates that are off by more
+    than that fall back to <first_size_attaining_risk_limit>, one at a time.
+
+    Inputs:
+        sizes           - the estimated sample sizes
+        p_completions, p_w2, plus, minus, threshold - as in
+                          <first_size_attaining_risk_limit>, either one value
+                          for all of <sizes> or one value for each
+
+    Outputs:
+        sample_sizes    - the smallest sample sizes at least <sizes> that
+                          attain the risk limit
+    """
+    sizes, p_completions, p_w2, plus, minus, threshold = np.broadcast_arrays(
+        sizes, p_completions, p_w2, plus, minus, threshold
+    )
+
+    candidates = sizes[:, np.newaxis] + np.arange(SEARCH_SCAN_SIZE)
+    x_c = distributions.binom_ppf(
+        1.0 - p_completions[:, np.newaxis], candidates, p_w2[:, np.newaxis]
+    )
+    attaining = (
+        x_c * plus[:, np.newaxis] + (candidates - x_c) * minus[:, np.newaxis]
+        > threshold[:, np.newaxis]
+    )
+    found = attaining.any(axis=1)
+    attained: np.ndarray = np.where(
+        found, candidates[np.arange(len(sizes)), attaining.argmax(axis=1)], sizes
+    )
+    for i in np.nonzero(~found)[0]:
+        attained[i] = first_size_attaining_risk_limit(
+            int(sizes[i]) + SEARCH_SCAN_SIZE,
+            float(p_completions[i]),
+            float(p_w2[i]),
+            float(plus[i]),
+            float(minus[i]),
+            float(threshold[i]),
+        )
+    return attained
+
+
+# Blocks of at most this many sample sizes are checked with one vectorized
+# binom.ppf call, rather than split further.
+SEARCH_SCAN_SIZE = 16
+
+
+def first_size_attaining_risk_limit(
+    size: int,
+    p_completion: float,
+    p_w2: float,
+    plus: float,
+    minus: float,
+    threshold: float,
+) -> int:
+    """
+    Finds the smallest sample size, starting from <size>, at which the
+    1 - <p_completion> quantile of the number of winner votes in the sample
+    attains the risk limit. Assumes the winner leads (p_w2 > 0.5), so that
+    plus > 0 > minus.
+
+    The test statistic at the quantile is a sawtooth in the sample size: it
+    falls by -<minus> with each extra ballot, and jumps up by
+    <plus> - <minus> whenever the quantile steps up by one vote. So we can't
+    simply bisect on it. But since the quantile never decreases as the sample
+    size grows, the statistic at any sample size in [start, end] is at most
+    quantile(end) * (plus - minus) + start * minus, which lets us rule out
+    whole ranges of sample sizes with one binom.ppf call. We gallop over
+    doubling ranges until one can't be ruled out, then bisect it, ruling out
+    halves where we can and scanning small ranges with one vectorized
+    binom.ppf call. This finds the same sample size as checking one sample
+    size at a time, with logarithmically many binom.ppf calls.
+
+    Inputs:
+        size            - the sample size to start searching from
+        p_completion    - the desired chance of completion in one round
+        p_w2, plus, minus, threshold - as in <bravo_sample_sizes>
+
+    Outputs:
+        the smallest sample size at least <size> that attains the risk limit
+    """
+
+    def quantile(sizes):
+        return distributions.binom_ppf(1.0 - p_completion, sizes, p_w2)
+
+    def search(start: int, end: int) -> Optional[int]:
+        # The first sample size in [start, end] that attains the risk limit
+        if end - start < SEARCH_SCAN_SIZE:
+            sizes = np.arange(start, end + 1)
+            x_c = quantile(sizes)
+            test_stats = x_c * plus + (sizes - x_c) * minus
+            (attaining,) = np.nonzero(test_stats > threshold)
+            return int(sizes[attaining[0]]) if len(attaining) > 0 else None
+
+        if not quantile(end) * (plus - minus) + start * minus > threshold:
+            return None
+
+        mid = (start + end) // 2
+        first = search(start, mid)
+        return first if first is not None else search(mid + 1, end)
+
+    block_size = 1
+    while True:
+        first = search(size, size + block_size - 1)
+        if first is not None:
+            return first
+        size += block_size
+        block_size *= 2
+
+
 def expected_prob(
     risk_limit: float, p_w: float, p_r: float, sample_w: int, sample_r: int, asn: int
 ) -> float:
@@ -266,7 +533,115 @@ def expected_prob(
     z = (R_x - n * p_w2) / math.sqrt(n * p_w2 * p_r2)
 
     # Invert the PPF used to compute z from the sample prob
-    return round(float(stats.norm.cdf(-z)), 2)
+    return round(float(distributions.norm_cdf(-z)), 2)
+
+
+# First round sample sizes (see <first_round_sample_size_curve>) are kept for
+# at most this many (risk limit, two-way share, chance of completion) keys,
+# least recently used first out.
+MAX_CACHED_FIRST_ROUND_SIZES = 4096
+_first_round_sizes: "OrderedDict[Tuple[float, float, float], int]" = OrderedDict()
+_first_round_sizes_lock = threading.Lock()
+
+
+def first_round_sample_size_curve(
+    risk_limit: float, p_w: float, p_r: float, p_completions: Sequence[float]
+) -> np.ndarray:
+    """
+    <bravo_sample_size_curve> with nothing sampled yet, looked up in a table
+    of first round sample sizes.
+
+    Audit admins ask for the sample size options over and over while setting
+    up an audit, e.g. each time they change the risk limit. The table is
+    keyed by the risk limit, the winner's two-way share (which fixes the
+    two-way margin) and the chance of completion, and holds the exact sample
+    size for each key, before the adjustment for "other" votes. So a lookup
+    needs no binom.ppf calls at all, and gives exactly the sample sizes of
+    <bravo_sample_size_curve>. Keys that aren't in the table yet are
+    computed exactly, all in one vectorized call, and added to it.
+
+    Inputs:
+        risk_limit, p_w, p_r - as in <bravo_sample_sizes>
+        p_completions   - the desired chances of completion in one round
+
+    Outputs:
+        sample_sizes    - the same sample sizes as <bravo_sample_size_curve>
+                          for each chance of completion
+    """
+    p_wr = p_w + p_r
+    p_w2 = p_w / p_wr
+    keys = [(risk_limit, p_w2, float(p)) for p in p_completions]
+
+    with _first_round_sizes_lock:
+        sizes = [_first_round_sizes.get(key) for key in keys]
+        for key, size in zip(keys, sizes):
+            if size is not None:
+                _first_round_sizes.move_to_end(key)
+
+    missing = [i for i, size in enumerate(sizes) if size is None]
+    if missing:
+        computed = two_way_sample_sizes(
+            risk_limit, p_w2, 0, 0, [keys[i][2] for i in missing]
+        )
+        with _first_round_sizes_lock:
+            for i, size in zip(missing, computed):
+                sizes[i] = int(size)
+                _first_round_sizes[keys[i]] = int(size)
+            while len(_first_round_sizes) > MAX_CACHED_FIRST_ROUND_SIZES:
+                _first_round_sizes.popitem(last=False)
+
+    # Account for "other" votes, as in <bravo_sample_sizes>
+    return np.ceil(np.array(sizes) / p_wr).astype(int)
+
+
+def sample_size_curve(
+    risk_limit: float,
+    p_w: float,
+    p_r: float,
+    sample_w: int,
+    sample_r: int,
+    p_completions: Sequence[float],
+) -> np.ndarray:
+    """
+    <bravo_sample_size_curve>, looking the sample sizes up in the first round
+    table (see <first_round_sample_size_curve>) until votes for the winner or
+    runner-up have been sampled, and computing them exactly from then on.
+    """
+    if sample_w == 0 and sample_r == 0:
+        return first_round_sample_size_curve(risk_limit, p_w, p_r, p_completions)
+    return bravo_sample_size_curve(
+        risk_limit, p_w, p_r, sample_w, sample_r, p_completions
+    )
+
+
+def closest_pair(margins: Dict[str, Dict]) -> Tuple[str, float, str, float]:
+    """
+    Finds the winner with the smallest vote share and the loser with the
+    largest, i.e. the pair with the smallest margin.
+
+    Inputs:
+        margins - the margins for the contest being audited
+
+    Outputs:
+        (worse winner, their vote share, best loser, their vote share)
+    """
+    p_w = 10.0 ** 7
+    p_l = 0.0
+    best_loser = ""
+    worse_winner = ""
+
+    # Get smallest p_w - p_l
+    for winner in margins["winners"]:
+        if margins["winners"][winner]["p_w"] < p_w:
+            p_w = margins["winners"][winner]["p_w"]
+            worse_winner = winner
+
+    for loser in margins["losers"]:
+        if margins["losers"][loser]["p_l"] > p_l:
+            p_l = margins["losers"][loser]["p_l"]
+            best_loser = loser
+
+    return worse_winner, p_w, best_loser, p_l
 
 
 def get_sample_size(
@@ -310,29 +685,14 @@ def get_sample_size(
 
     asn = get_expected_sample_sizes(risk_limit, contest, sample_results)
 
-    p_w = 10.0 ** 7
-    p_l = 0.0
-    best_loser = ""
-    worse_winner = ""
-
     # For multi-winner, do nothing
     if contest.num_winners != 1:
         return {"asn": {"type": "ASN", "size": asn, "prob": None}}
 
-    margin = contest.margins
-    # Get smallest p_w - p_l
-    for winner in margin["winners"]:
-        if margin["winners"][winner]["p_w"] < p_w:
-            p_w = margin["winners"][winner]["p_w"]
-            worse_winner = winner
-
-    for loser in margin["losers"]:
-        if margin["losers"][loser]["p_l"] > p_l:
-            p_l = margin["losers"][loser]["p_l"]
-            best_loser = loser
+    worse_winner, p_w, best_loser, p_l = closest_pair(contest.margins)
 
     # If we're in a single-candidate race, set sample to 0
-    if not margin["losers"]:
+    if not contest.margins["losers"]:
         samples["asn"] = {"type": "ASN", "size": -1, "prob": -1.0}
         for quant in quants:
             samples[str(quant)] = {"type": None, "size": -1.0, "prob": quant}
@@ -373,13 +733,61 @@ def get_sample_size(
         "prob": expected_prob(risk_limit, p_w, p_l, sample_w, sample_l, asn),
     }
 
-    for quant in quants:
-        size = bravo_sample_sizes(risk_limit, p_w, p_l, sample_w, sample_l, quant)
-        samples[str(quant)] = {"type": None, "size": size, "prob": quant}
+    sizes = sample_size_curve(risk_limit, p_w, p_l, sample_w, sample_l, quants)
+    for quant, size in zip(quants, sizes):
+        samples[str(quant)] = {"type": None, "size": int(size), "prob": quant}
 
     return samples
 
 
+def get_sample_size_curve(
+    risk_limit: float,
+    contest: Contest,
+    sample_results: Dict[str, int],
+    p_completions: Sequence[float],
+) -> Optional[List[int]]:
+    """
+    Computes the sample size for each of a grid of chances that the sample
+    will confirm the election result, assuming no discrepancies, like the
+    quantile options of <get_sample_size>.
+
+    Inputs:
+        risk_limit     - the risk-limit for this audit
+        contest        - a sampler_contest object of the contest being audited
+        sample_results - mapping of candidates to votes in the (cumulative)
+                         sample, as in <get_sample_size>
+        p_completions  - the chances of confirming the result in one round
+
+    Outputs:
+        sample_sizes   - the sample size for each chance in <p_completions>,
+                         or None for multi-winner contests
+    """
+    assert risk_limit < 1, "The risk-limit must be less than one!"
+
+    if contest.num_winners != 1:
+        return None
+
+    worse_winner, p_w, best_loser, p_l = closest_pair(contest.margins)
+
+    # Single-candidate races, ties and landslides, as in get_sample_size
+    if not contest.margins["losers"]:
+        return [-1] * len(p_completions)
+    if p_w == p_l:
+        return [contest.ballots] * len(p_completions)
+    if p_w == 1.0:
+        return [1] * len(p_completions)
+
+    sizes = sample_size_curve(
+        risk_limit,
+        p_w,
+        p_l,
+        sample_results[worse_winner],
+        sample_results[best_loser],
+        p_completions,
+    )
+    return [int(size) for size in sizes]
+
+
 def compute_risk(
     risk_limit: float, contest: Contest, sample_results: Dict[str, int]
 ) -> Tuple[Dict[Tuple[str, str], float], bool]:
@@ -405,12 +813,16 @@ def compute_risk(
     """
     assert risk_limit < 1, "The risk-limit must be less than one!"
 
-    T = get_test_statistics(contest.margins, sample_results)
+    winners, losers, log_T = get_log_test_statistics(contest.margins, sample_results)
+
+    # The risk is 1 / T*
+    with np.errstate(over="ignore"):
+        risks = np.exp(-log_T)
 
-    measurements = {}
-    finished = True
-    for pair in T:
-        measurements[pair] = 1 / T[pair]
-        if measurements[pair] > risk_limit:
-            finished = False
+    measurements = {
+        (winner, loser): float(risks[i, j])
+        for i, winner in enumerate(winners)
+        for j, loser in enumerate(losers)
+    }
+    finished = bool((risks <= risk_limit).all())
     return measurements, finished
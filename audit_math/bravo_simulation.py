@@ -0,0 +1,255 @@
+"""
+Monte Carlo simulation of BRAVO ballot polling audits, as measured by
+`audit_math.bravo`.
+
+Simulates many audits at once with NumPy, assuming the reported results are
+correct: every trial draws the votes in each round's sample for all of the
+candidates at once, and checks the risk of every (winner, loser) pair like
+<bravo.compute_risk>. This gives empirical chances of completing an audit in
+one round, to check the normal approximations behind
+<bravo.bravo_sample_sizes> and <bravo.expected_prob>, and works for
+multi-winner contests, for which <bravo.get_sample_size> only gives the ASN.
+
+Trials are simulated in chunks, each with its own random stream spawned from
+the seed, so the results only depend on the seed and the number of trials,
+not on whether the chunks are spread over a pool of worker processes.
+"""
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+import numpy as np
+
+from . import bravo
+from .sampler_contest import Contest
+
+# Trials are simulated in chunks of at most this many. Each chunk holds a
+# trials x sample sizes x candidates array of vote counts, and is the unit of
+# work for worker processes.
+TRIALS_PER_CHUNK = 10_000
+
+
+def draw_votes(
+    rand: np.random.Generator,
+    contest: Contest,
+    sample_sizes: np.ndarray,
+    num_trials: int,
+) -> np.ndarray:
+    """
+    Draws the cumulative votes for each candidate in samples (with
+    replacement) of increasing sizes, assuming the reported results are
+    correct.
+
+    When voters can only vote for one candidate, each ballot votes for one
+    candidate or none, so each round's votes are one multinomial draw. When
+    they can vote for more, we draw each candidate's votes independently,
+    which ignores how votes for different candidates on the same ballot are
+    correlated.
+
+    Inputs:
+        rand            - the random number generator to draw with
+        contest         - the contest being audited
+        sample_sizes    - the cumulative sample size at the end of each
+                          round, in increasing order
+        num_trials      - the number of simulated audits
+
+    Outputs:
+        votes           - a num_trials x rounds x candidates array of the
+                          cumulative votes for each candidate in
+                          <contest.candidates>, in order
+    """
+    round_sizes = np.diff(sample_sizes, prepend=0)
+    shares = np.array(list(contest.candidates.values())) / contest.ballots
+
+    if contest.votes_allowed == 1:
+        # The last category is ballots without a vote for any candidate
+        pvals = np.append(shares, max(0.0, 1.0 - shares.sum()))
+        votes = rand.multinomial(
+            round_sizes, pvals, size=(num_trials, len(round_sizes))
+        )[..., :-1]
+    else:
+        votes = rand.binomial(
+            round_sizes[:, np.newaxis],
+            shares,
+            size=(num_trials, len(round_sizes), len(shares)),
+        )
+
+    cumulative_votes: np.ndarray = votes.cumsum(axis=1)
+    return cumulative_votes
+
+
+def audits_complete(
+    risk_limit: float, contest: Contest, votes: np.ndarray
+) -> np.ndarray:
+    """
+    Checks whether samples confirm the contest's outcome, i.e. whether
+    <bravo.compute_risk> would find them finished, for many samples at once.
+
+    Inputs:
+        risk_limit  - the risk-limit for this audit
+        contest     - the contest being audited
+        votes       - an array of votes for each candidate in
+                      <contest.candidates> (in the last dimension), as
+                      returned by <draw_votes>
+
+    Outputs:
+        complete    - a boolean array of the same shape as <votes>, less the
+                      last dimension
+    """
+    winners = list(contest.margins["winners"])
+    losers = list(contest.margins["losers"])
+
+    # Like bravo.compute_risk, contests without losers never finish
+    if not losers:
+        return np.zeros(votes.shape[:-1], dtype=bool)
+
+    candidates = list(contest.candidates)
+    winner_votes = votes[..., [candidates.index(winner) for winner in winners]]
+    loser_votes = votes[..., [candidates.index(loser) for loser in losers]]
+
+    # log(T*) for every (winner, loser) pair, as in
+    # bravo.get_log_test_statistics, with the pairs in the last two
+    # dimensions
+    swl = bravo.winner_loser_shares(contest.margins, winners, losers)
+    log_T = bravo.xlogy(winner_votes[..., np.newaxis], swl / 0.5) + bravo.xlogy(
+        loser_votes[..., np.newaxis, :], (1 - swl) / 0.5
+    )
+
+    with np.errstate(over="ignore"):
+        risks = np.exp(-log_T)
+    complete: np.ndarray = (risks <= risk_limit).all(axis=(-2, -1))
+    return complete
+
+
+def _simulate_chunk(
+    risk_limit: float,
+    contest: Contest,
+    sample_sizes: np.ndarray,
+    num_trials: int,
+    seed: np.random.SeedSequence,
+) -> np.ndarray:
+    rand = np.random.default_rng(seed)
+    votes = draw_votes(rand, contest, sample_sizes, num_trials)
+    return audits_complete(risk_limit, contest, votes)
+
+
+def simulate_audits(
+    risk_limit: float,
+    contest: Contest,
+    sample_sizes: Sequence[int],
+    num_trials: int,
+    seed: Optional[int] = None,
+    processes: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Simulates <num_trials> audits of <contest> that draw samples of
+    increasing sizes, and checks whether each sample would confirm the
+    outcome.
+
+    Inputs:
+        risk_limit      - the risk-limit for this audit
+        contest         - the contest being audited
+        sample_sizes    - the cumulative sample size at the end of each
+                          round, in increasing order
+        num_trials      - the number of simulated audits
+        seed            - the seed for the random number generator, or None
+                          for fresh, unpredictable randomness
+        processes       - if given, simulate chunks of trials in a pool of
+                          this many worker processes
+
+    Outputs:
+        complete        - a num_trials x len(<sample_sizes>) boolean array of
+                          whether the risk limit is met at each sample size
+    """
+    sizes = np.asarray(sample_sizes, dtype=np.int64)
+    assert (np.diff(sizes) >= 0).all(), "Sample sizes must be increasing"
+
+    chunk_trials = [
+        min(TRIALS_PER_CHUNK, num_trials - start)
+        for start in range(0, num_trials, TRIALS_PER_CHUNK)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_trials))
+    args = (
+        itertools.repeat(risk_limit),
+        itertools.repeat(contest),
+        itertools.repeat(sizes),
+        chunk_trials,
+        seeds,
+    )
+
+    if processes:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            chunks = list(executor.map(_simulate_chunk, *args))
+    else:
+        chunks = list(map(_simulate_chunk, *args))
+
+    if not chunks:
+        return np.zeros((0, len(sizes)), dtype=bool)
+    return np.concatenate(chunks)
+
+
+def completion_probabilities(
+    risk_limit: float,
+    contest: Contest,
+    sample_sizes: Sequence[int],
+    num_trials: int = 10_000,
+    seed: Optional[int] = None,
+    processes: Optional[int] = None,
+) -> List[float]:
+    """
+    Estimates the chance that an audit completes in one round, for each of
+    a grid of first round sample sizes, e.g. to compare with the chances of
+    completion that <bravo.get_sample_size> assigns its sample sizes.
+
+    Inputs:
+        risk_limit, contest, num_trials, seed, processes - as in
+                          <simulate_audits>
+        sample_sizes    - the first round sample sizes, in any order
+
+    Outputs:
+        probabilities   - the fraction of trials that completed in one round
+                          for each of <sample_sizes>
+    """
+    # A cumulative sample at each size is a sample of that size, so we can
+    # simulate all of the sizes with the same trials.
+    order = np.argsort(sample_sizes, kind="stable")
+    complete = simulate_audits(
+        risk_limit,
+        contest,
+        [sample_sizes[i] for i in order],
+        num_trials,
+        seed,
+        processes,
+    )
+    probabilities = np.empty(len(order))
+    probabilities[order] = complete.mean(axis=0)
+    return [float(probability) for probability in probabilities]
+
+
+def round_distribution(
+    risk_limit: float,
+    contest: Contest,
+    sample_sizes: Sequence[int],
+    num_trials: int = 10_000,
+    seed: Optional[int] = None,
+    processes: Optional[int] = None,
+) -> List[float]:
+    """
+    Estimates the distribution of the number of rounds an audit takes, given
+    the cumulative sample size of each round.
+
+    Inputs:
+        risk_limit, contest, sample_sizes, num_trials, seed, processes - as in
+                          <simulate_audits>
+
+    Outputs:
+        probabilities   - the fraction of trials that completed in each
+                          round, followed by the fraction that didn't
+                          complete in any of them
+    """
+    complete = simulate_audits(
+        risk_limit, contest, sample_sizes, num_trials, seed, processes
+    )
+    finished = complete.any(axis=1)
+    first_rounds = np.where(finished, complete.argmax(axis=1), len(sample_sizes))
+    counts = np.bincount(first_rounds, minlength=len(sample_sizes) + 1)
+    return [float(count) / max(num_trials, 1) for count in counts]
@@ -0,0 +1,359 @@
+"""
+The probability distribution functions used by the audit math: the normal
+distribution's quantile function and CDF, and the binomial distribution's
+quantile function.
+
+scipy.stats takes most of a second to import, which every process that
+imported the audit math used to pay on startup, even if it never computed a
+sample size. So these functions go through a backend that is only loaded when
+they are first called. There are two backends:
+
+    "scipy" - scipy.stats (the default), imported on first use
+    "numpy" - pure Python/NumPy implementations that don't need scipy at all,
+              which the tests validate against scipy
+
+Select one with <set_backend>. Like their scipy counterparts, the functions
+take scalars or NumPy arrays, and broadcast their arguments.
+"""
+import abc
+import math
+from typing import Dict, Optional, Tuple, Type
+import numpy as np
+
+
+class DistributionBackend(abc.ABC):
+    """
+    The distribution functions, as in scipy.stats.
+    """
+
+    @abc.abstractmethod
+    def norm_ppf(self, q):
+        pass
+
+    @abc.abstractmethod
+    def norm_cdf(self, x):
+        pass
+
+    @abc.abstractmethod
+    def binom_ppf(self, q, n, p):
+        pass
+
+
+class ScipyBackend(DistributionBackend):
+    """
+    Uses scipy.stats, which is imported the first time it's needed.
+    """
+
+    def __init__(self):
+        self._stats = None
+
+    @property
+    def stats(self):
+        if self._stats is None:
+            from scipy import stats  # pylint: disable=import-outside-toplevel
+
+            self._stats = stats
+        return self._stats
+
+    def norm_ppf(self, q):
+        return self.stats.norm.ppf(q)
+
+    def norm_cdf(self, x):
+        return self.stats.norm.cdf(x)
+
+    def binom_ppf(self, q, n, p):
+        return self.stats.binom.ppf(q, n, p)
+
+
+# Convergence parameters for the continued fraction in <betainc>
+BETAINC_EPSILON = 1e-15
+BETAINC_TINY = 1e-300
+
+
+def _polynomial(coefficients: Tuple[float, ...], x: float) -> float:
+    # Evaluates the polynomial with <coefficients> (highest degree first) at x
+    value = 0.0
+    for coefficient in coefficients:
+        value = value * x + coefficient
+    return value
+
+
+# The coefficients of the rational approximations in Wichura's algorithm
+# AS241 (PPND16), "The Percentage Points of the Normal Distribution", Applied
+# Statistics 37 (1988), for the central region and the two tail regions.
+NORM_PPF_CENTRAL = (
+    (
+        2509.0809287301226727,
+        33430.575583588128105,
+        67265.770927008700853,
+        45921.953931549871457,
+        13731.693765509461125,
+        1971.5909503065514427,
+        133.14166789178437745,
+        3.387132872796366608,
+    ),
+    (
+        5226.495278852854561,
+        28729.085735721942674,
+        39307.89580009271061,
+        21213.794301586595867,
+        5394.1960214247511077,
+        687.1870074920579083,
+        42.313330701600911252,
+        1.0,
+    ),
+)
+NORM_PPF_NEAR_TAIL = (
+    (
+        7.7454501427834140764e-4,
+        0.0227238449892691845833,
+        0.24178072517745061177,
+        1.27045825245236838258,
+        3.64784832476320460504,
+        5.7694972214606914055,
+        4.6303378461565452959,
+        1.42343711074968357734,
+    ),
+    (
+        1.05075007164441684324e-9,
+        5.475938084995344946e-4,
+        0.0151986665636164571966,
+        0.14810397642748007459,
+        0.68976733498510000455,
+        1.6763848301838038494,
+        2.05319162663775882187,
+        1.0,
+    ),
+)
+NORM_PPF_FAR_TAIL = (
+    (
+        2.01033439929228813265e-7,
+        2.71155556874348757815e-5,
+        0.0012426609473880784386,
+        0.026532189526576123093,
+        0.29656057182850489123,
+        1.7848265399172913358,
+        5.4637849111641143699,
+        6.6579046435011037772,
+    ),
+    (
+        2.04426310338993978564e-15,
+        1.4215117583164458887e-7,
+        1.8463183175100546818e-5,
+        7.868691311456132591e-4,
+        0.0148753612908506148525,
+        0.13692988092273580531,
+        0.59983220655588793769,
+        1.0,
+    ),
+)
+
+
+def _norm_ppf(q: float) -> float:
+    if q == 0:
+        return -math.inf
+    if q == 1:
+        return math.inf
+    if not 0 < q < 1:
+        return math.nan
+
+    # Wichura's algorithm AS241, accurate to about 1 part in 10^16 (the same
+    # algorithm as the standard library's statistics.NormalDist.inv_cdf,
+    # which needs Python 3.8)
+    centered = q - 0.5
+    if abs(centered) <= 0.425:
+        r = 0.180625 - centered * centered
+        numerator, denominator = NORM_PPF_CENTRAL
+        return centered * _polynomial(numerator, r) / _polynomial(denominator, r)
+
+    r = math.sqrt(-math.log(q if centered < 0 else 1 - q))
+    if r <= 5:
+        r -= 1.6
+        numerator, denominator = NORM_PPF_NEAR_TAIL
+    else:
+        r -= 5
+        numerator, denominator = NORM_PPF_FAR_TAIL
+    x = _polynomial(numerator, r) / _polynomial(denominator, r)
+    return -x if centered < 0 else x
+
+
+def _norm_cdf(x: float) -> float:
+    # erfc is more accurate than 1 + erf in the lower tail
+    return 0.5 * math.erfc(-x / math.sqrt(2))
+
+
+_vectorized_norm_ppf = np.vectorize(_norm_ppf, otypes=[float])
+_vectorized_norm_cdf = np.vectorize(_norm_cdf, otypes=[float])
+_lgamma = np.vectorize(math.lgamma, otypes=[float])
+
+
+def _fix_tiny(values: np.ndarray) -> np.ndarray:
+    return np.where(np.abs(values) < BETAINC_TINY, BETAINC_TINY, values)
+
+
+def _betacf(a: np.ndarray, b: np.ndarray, x: np.ndarray) -> np.ndarray:
+    # The continued fraction for the incomplete beta function, evaluated with
+    # the modified Lentz method, as in Numerical Recipes (section 6.4).
+    # Converges in O(sqrt(max(a, b))) iterations for x < (a + 1) / (a + b + 2).
+    max_iterations = (
+        int(10 * math.sqrt(max(np.max(a, initial=1), np.max(b, initial=1)))) + 100
+    )
+    qab = a + b
+    qap = a + 1
+    qam = a - 1
+    c = np.ones_like(x)
+    d = 1 / _fix_tiny(1 - qab * x / qap)
+    h = d
+    converged = np.zeros(x.shape, dtype=bool)
+    for m in range(1, max_iterations + 1):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1 / _fix_tiny(1 + aa * d)
+        c = _fix_tiny(1 + aa / c)
+        h = np.where(converged, h, h * d * c)
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1 / _fix_tiny(1 + aa * d)
+        c = _fix_tiny(1 + aa / c)
+        delta = d * c
+        h = np.where(converged, h, h * delta)
+        converged |= np.abs(delta - 1) < BETAINC_EPSILON
+        if converged.all():
+            return h
+    raise ArithmeticError(
+        "Incomplete beta function did not converge"
+    )  # pragma: no cover
+
+
+def betainc(a, b, x) -> np.ndarray:
+    """
+    The regularized incomplete beta function I_x(a, b), for a, b > 0 and
+    0 <= x <= 1, like scipy.special.betainc.
+    """
+    a, b, x = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float) for value in (a, b, x))
+    )
+    # The continued fraction converges quickly on one side of the mean; on
+    # the other side, use the symmetry I_x(a, b) = 1 - I_{1-x}(b, a).
+    flip = x > (a + 1) / (a + b + 2)
+    a, b, x = np.where(flip, b, a), np.where(flip, a, b), np.where(flip, 1 - x, x)
+
+    with np.errstate(divide="ignore"):
+        front = np.exp(
+            _lgamma(a + b) - _lgamma(a) - _lgamma(b) + a * np.log(x) + b * np.log1p(-x)
+        )
+    result = np.where(x == 0, 0.0, front * _betacf(a, b, x) / a)
+    return np.where(flip, 1 - result, result)
+
+
+def binom_cdf(k, n, p) -> np.ndarray:
+    """
+    The binomial distribution's CDF, for integer n >= 0 and 0 <= p <= 1.
+    """
+    k, n, p = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float) for value in (k, n, p))
+    )
+    k = np.floor(k)
+    inside = (k >= 0) & (k < n)
+    # P(X <= k) = I_{1-p}(n - k, k + 1), for 0 <= k < n
+    values = betainc(np.where(inside, n - k, 1), np.where(inside, k + 1, 1), 1 - p)
+    return np.where(k < 0, 0.0, np.where(k >= n, 1.0, values))
+
+
+def _binom_ppf(q, n, p) -> np.ndarray:
+    q, n, p = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float) for value in (q, n, p))
+    )
+    valid = (q >= 0) & (q <= 1) & (n >= 0) & (n == np.floor(n)) & (p >= 0) & (p <= 1)
+    interior = valid & (q > 0) & (q < 1)
+    q_ = np.where(interior, q, 0.5)
+    n_ = np.where(interior, n, 0)
+    p_ = np.where(interior, p, 0.5)
+
+    # Find the smallest k with P(X <= k) >= q by bisection, keeping
+    # P(X <= low) < q <= P(X <= high). Start from a bracket around the normal
+    # approximation, falling back to the whole support if it doesn't hold.
+    sd = np.sqrt(n_ * p_ * (1 - p_))
+    guess = n_ * p_ + _vectorized_norm_ppf(q_) * sd
+    low = np.clip(np.floor(guess - 8 * sd - 2), -1, n_)
+    high = np.clip(np.ceil(guess + 8 * sd + 2), -1, n_)
+    low = np.where(binom_cdf(low, n_, p_) < q_, low, -1)
+    high = np.where(binom_cdf(high, n_, p_) >= q_, high, n_)
+    while True:
+        searching = high - low > 1
+        if not searching.any():
+            break
+        mid = np.floor((low + high) / 2)
+        attained = binom_cdf(mid, n_, p_) >= q_
+        high = np.where(searching & attained, mid, high)
+        low = np.where(searching & ~attained, mid, low)
+
+    # As in scipy, the 0 quantile is just below the support, and the 1
+    # quantile is n
+    return np.where(valid, np.where(q == 0, -1.0, np.where(q == 1, n, high)), math.nan)
+
+
+class NumpyBackend(DistributionBackend):
+    """
+    Pure Python/NumPy implementations: the normal distribution from
+    Wichura's algorithm AS241 and math.erfc, and the binomial
+    quantile function by bisection on the binomial CDF, computed with the
+    regularized incomplete beta function.
+    """
+
+    def norm_ppf(self, q):
+        return _vectorized_norm_ppf(q)[()]
+
+    def norm_cdf(self, x):
+        return _vectorized_norm_cdf(x)[()]
+
+    def binom_ppf(self, q, n, p):
+        return _binom_ppf(q, n, p)[()]
+
+
+BACKENDS: Dict[str, Type[DistributionBackend]] = {
+    "scipy": ScipyBackend,
+    "numpy": NumpyBackend,
+}
+
+_backend: DistributionBackend = ScipyBackend()
+
+
+def set_backend(name: str) -> None:
+    """
+    Selects the backend for the distribution functions, by name (see
+    <BACKENDS>).
+    """
+    global _backend  # pylint: disable=global-statement
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown distributions backend: {name}"
+            f" (expected one of: {', '.join(BACKENDS)})"
+        )
+    _backend = BACKENDS[name]()
+
+
+def get_backend() -> DistributionBackend:
+    return _backend
+
+
+def norm_ppf(q):
+    """
+    The standard normal distribution's quantile function, like
+    scipy.stats.norm.ppf.
+    """
+    return _backend.norm_ppf(q)
+
+
+def norm_cdf(x):
+    """
+    The standard normal distribution's CDF, like scipy.stats.norm.cdf.
+    """
+    return _backend.norm_cdf(x)
+
+
+def binom_ppf(q, n, p):
+    """
+    The binomial distribution's quantile function, i.e. the smallest k such
+    that P(X <= k) >= q for X ~ Binomial(n, p), like scipy.stats.binom.ppf.
+    """
+    return _backend.binom_ppf(q, n, p)
@@ -1,19 +1,29 @@
 # pylint: disable=invalid-name
 """
-An implemenation of per-contest batch comparison audits, loosely based on
-MACRO. Since MACRO applies to all contests being audited (hence
-across-contest), this code acts as if each contest is independently audited
+An implemenation of batch comparison audits, based on MACRO. The functions
+that take one contest act as if each contest is independently audited
 according it its maximum relative overstatement (as if we did MACRO only one
-one contest).
+one contest). Since MACRO applies to all contests being audited (hence
+across-contest), the *_across_contests functions and MacroAuditIndex audit
+several contests at once with one shared sample, using each batch's maximum
+relative overstatement across all of them.
 
 MACRO was developed by Philip Stark (see
 https://papers.ssrn.com/sol3/papers.cfm?abstract_id=1443314 for the
 publication).
 """
 import math
-from typing import Dict, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
+import numpy as np
+
+from .batch_tallies import BatchTallies
 from .sampler_contest import Contest
 
+# The reported votes in every batch, either as nested dicts of batch ->
+# contest -> candidate -> votes (see <compute_U>), or as a columnar
+# BatchTallies of the contest being audited.
+ReportedResults = Union[Dict[Any, Dict[str, Dict[str, int]]], BatchTallies]
+
 
 def compute_error(
     batch_results: Dict[str, Dict[str, int]],
@@ -109,8 +119,204 @@ def compute_max_error(
     return error
 
 
+class MacroContestIndex:
+    """
+    The error bounds of a contest's batches, computed in one pass over the
+    reported results, so that the MACRO functions below (and
+    <sampler.draw_ppeb_sample>) don't recompute them batch by batch every
+    time they're called. Build one per contest and set of reported results,
+    and pass it to each of them.
+
+    The reported (and audited) votes are dense batches x choices arrays, so
+    the overstatements of every (winner, loser) pair in every batch are
+    computed at once by broadcasting the winners' votes against the losers'.
+    Holds the margin V_wl of each pair, each batch's maximum possible
+    overstatement u_p (as in <compute_max_error>), their sum U (as in
+    <compute_U>), and the batches laid end to end in sorted order for PPEB
+    sampling.
+    """
+
+    def __init__(self, contest: Contest, reported_results: ReportedResults):
+        """
+        Inputs:
+            contest          - a sampler_contest object of the contest to
+                               compute the errors for
+            reported_results - the reported votes in every batch, as in
+                               <compute_U>, or the contest's BatchTallies
+        """
+        self.contest = contest
+        self.choices = list(contest.candidates)
+        choice_index = {choice: i for i, choice in enumerate(self.choices)}
+        self.winners = [choice_index[winner] for winner in contest.margins["winners"]]
+        self.losers = [choice_index[loser] for loser in contest.margins["losers"]]
+        # V_wl for each (winner, loser) pair, as a winners x losers array
+        votes = np.array(list(contest.candidates.values()), dtype=np.int64)
+        self.margins = votes[self.winners, np.newaxis] - votes[self.losers]
+
+        if isinstance(reported_results, BatchTallies):
+            assert (
+                reported_results.contest_name == contest.name
+            ), "Batch tallies are for a different contest"
+            self.batch_names: List[Any] = reported_results.batches
+            self.reported_votes = reported_results.choice_votes(self.choices)
+            ballots = reported_results.ballots
+        else:
+            # Batches without the contest have no votes and no ballots in it,
+            # so their u_p comes out as 0, as in compute_max_error.
+            self.batch_names = list(reported_results)
+            contest_results = [
+                reported_results[batch].get(contest.name, {})
+                for batch in self.batch_names
+            ]
+            self.reported_votes = self.vote_matrix(contest_results)
+            ballots = np.array(
+                [results.get("ballots", 0) for results in contest_results],
+                dtype=np.int64,
+            )
+        self.batch_index = {batch: i for i, batch in enumerate(self.batch_names)}
+
+        u_p = np.zeros(len(self.batch_names))
+        if self.winners and self.losers:
+            u_pwl = (
+                self.pair_differences(self.reported_votes)
+                + ballots[:, np.newaxis, np.newaxis]
+            ) / self.margins
+            u_p = np.maximum(u_pwl.max(axis=(1, 2)), 0.0)
+        self.u_p: np.ndarray = u_p
+        self.max_errors: Dict[Any, float] = dict(zip(self.batch_names, u_p.tolist()))
+        # Summed in the batches' order, as in compute_U
+        self.U = float(np.cumsum(u_p)[-1]) if len(u_p) else 0.0
+
+        order = sorted(range(len(self.batch_names)), key=self.batch_names.__getitem__)
+        self.batches = [self.batch_names[i] for i in order]
+        self.cumulative_errors = np.cumsum(u_p[order]).tolist()
+
+    def vote_matrix(self, contest_results: List[Dict[str, int]]) -> np.ndarray:
+        """
+        Converts the votes for each of the contest's choices in a list of
+        batches (e.g. {'cand1': votes, 'cand2': votes, ...}) into a
+        batches x choices array.
+        """
+        return np.array(
+            [
+                [results.get(choice, 0) for choice in self.choices]
+                for results in contest_results
+            ],
+            dtype=np.int64,
+        ).reshape(len(contest_results), len(self.choices))
+
+    def pair_differences(self, votes: np.ndarray) -> np.ndarray:
+        """
+        Computes v_w - v_l for each batch in a batches x choices array of
+        votes and each (winner, loser) pair, as a batches x winners x losers
+        array.
+        """
+        differences: np.ndarray = (
+            votes[:, self.winners, np.newaxis] - votes[:, np.newaxis, self.losers]
+        )
+        return differences
+
+    def errors(
+        self, sample_results: Dict[str, Dict[str, Dict[str, int]]]
+    ) -> np.ndarray:
+        """
+        Computes the error e_p in each sampled batch (as in <compute_error>),
+        in the order of <sample_results>. A sampled batch without the contest
+        has no votes in it.
+        """
+        rows = [self.batch_index[batch] for batch in sample_results]
+        audited_votes = self.vote_matrix(
+            [
+                sample_results[batch].get(self.contest.name, {})
+                for batch in sample_results
+            ]
+        )
+        if not (self.winners and self.losers):
+            return np.zeros(len(rows))
+        e_pwl = (
+            self.pair_differences(self.reported_votes[rows])
+            - self.pair_differences(audited_votes)
+        ) / self.margins
+        e_p: np.ndarray = np.maximum(e_pwl.max(axis=(1, 2)), 0.0)
+        return e_p
+
+    def taints(
+        self, sample_results: Dict[str, Dict[str, Dict[str, int]]]
+    ) -> np.ndarray:
+        """
+        Computes the taint e_p / u_p of each sampled batch, in the order of
+        <sample_results>. Batches whose u_p is 0 (i.e. batches without the
+        contest) can't overstate the margins, so their taint is 0.
+        """
+        rows = [self.batch_index[batch] for batch in sample_results]
+        u_p = self.u_p[rows]
+        taints: np.ndarray = np.divide(
+            self.errors(sample_results), u_p, out=np.zeros(len(rows)), where=u_p > 0,
+        )
+        return taints
+
+    def p_values(
+        self,
+        sample_results: Dict[str, Dict[str, Dict[str, int]]],
+        risk_limit: Optional[float] = None,
+    ) -> np.ndarray:
+        """
+        Computes the running MACRO p-value after each sampled batch, in the
+        order of <sample_results>, as in <compute_risk>. If <risk_limit> is
+        given, stops at the first p-value that meets it (see
+        <running_p_values>).
+        """
+        return running_p_values(self, sample_results, risk_limit)
+
+
+def running_p_values(
+    index: Union[MacroContestIndex, "MacroAuditIndex"],
+    sample_results: Dict[str, Dict[str, Dict[str, int]]],
+    risk_limit: Optional[float] = None,
+) -> np.ndarray:
+    """
+    Computes the running MACRO p-value after each sampled batch, in the order
+    of <sample_results>, from the taints and U of a MacroContestIndex or a
+    MacroAuditIndex.
+
+    If <risk_limit> is given, stops at the first p-value that meets it, since
+    the audit would have stopped there, without looking at the batches after
+    it. The batches are taken in blocks that double in size, so that stopping
+    early doesn't cost a pass per batch.
+    """
+    p_values: List[np.ndarray] = []
+    p = 1.0
+    batches = list(sample_results)
+    start, block_size = 0, len(batches) if risk_limit is None else 1
+    while start < len(batches):
+        block = batches[start : start + block_size]
+        taints = index.taints({batch: sample_results[batch] for batch in block})
+        factors = (1 - 1 / index.U) / (1 - taints)
+        # Multiplied in the same order as compute_risk always has
+        factors[0] *= p
+        block_p_values = np.cumprod(factors)
+        if risk_limit is not None:
+            (stopped,) = np.nonzero(block_p_values < risk_limit)
+            if len(stopped) > 0:
+                p_values.append(block_p_values[: stopped[0] + 1])
+                break
+        p_values.append(block_p_values)
+        p = float(block_p_values[-1])
+        start += len(block)
+        block_size *= 2
+    return np.concatenate(p_values) if p_values else np.ones(0)
+
+
+def sample_size_for_U(risk_limit: float, U: float) -> int:
+    # The number of batches to sample so that, with no discrepancies, the
+    # running p-value (1 - 1 / U) ^ n meets the risk limit
+    return math.ceil(math.log(risk_limit) / (math.log(1 - (1 / U))))
+
+
 def compute_U(
-    reported_results: Dict[str, Dict[str, Dict[str, int]]], contest: Contest
+    reported_results: ReportedResults,
+    contest: Contest,
+    index: Optional[MacroContestIndex] = None,
 ) -> float:
     """
     Computes U, the sum of the batch-wise relative overstatement limits,
@@ -128,26 +334,29 @@ def compute_U(
                                }
                                ...
                            }
+                           or the contest's BatchTallies (see
+                           batch_tallies.py)
         contest         - a sampler_contest object of the contest to compute
                           the error for
+        index           - a MacroContestIndex of the contest and results, if
+                          one has already been built
 
     Outputs:
         U - the sum of the maximum possible overstatement for each batch
     """
-    U = 0.0
-    for batch in reported_results:
-        U += compute_max_error(reported_results[batch], contest)
-
-    return U
+    if index is None:
+        index = MacroContestIndex(contest, reported_results)
+    return index.U
 
 
 def get_sample_sizes(
     risk_limit: float,
     contest: Contest,
-    reported_results: Dict[str, Dict[str, Dict[str, int]]],
+    reported_results: ReportedResults,
     sample_results: Dict[
         str, Dict[str, Dict[str, int]]
     ],  # pylint: disable=unused-argument
+    index: Optional[MacroContestIndex] = None,
 ) -> float:
     """
     Computes initial sample sizes parameterized by likelihood that the
@@ -170,9 +379,13 @@ def get_sample_sizes(
                                }
                                ...
                            }
+                           or the contest's BatchTallies (see
+                           batch_tallies.py)
         sample_results - if a sample has already been drawn, this will
-                         contain its results, of the same form as
+                         contain its results, in the nested dict form of
                          reported_results
+        index          - a MacroContestIndex of the contest and reported
+                         results, if one has already been built
 
     Outputs:
         samples - dictionary mapping confirmation likelihood to sample size:
@@ -189,16 +402,17 @@ def get_sample_sizes(
 
     # TODO: actually use past batch results
 
-    U = compute_U(reported_results, contest)
+    U = compute_U(reported_results, contest, index)
 
-    return math.ceil(math.log(risk_limit) / (math.log(1 - (1 / U))))
+    return sample_size_for_U(risk_limit, U)
 
 
 def compute_risk(
     risk_limit: float,
     contest: Contest,
-    reported_results: Dict[str, Dict[str, Dict[str, int]]],
+    reported_results: ReportedResults,
     sample_results: Dict[str, Dict[str, Dict[str, int]]],
+    index: Optional[MacroContestIndex] = None,
 ) -> Tuple[float, bool]:
     """
     Computes the risk-value of <sample_results> based on results in <contest>.
@@ -219,9 +433,13 @@ def compute_risk(
                                }
                                ...
                            }
+                           or the contest's BatchTallies (see
+                           batch_tallies.py)
         sample_results - if a sample has already been drawn, this will
-                         contain its results, of the same form as
+                         contain its results, in the nested dict form of
                          reported_results
+        index          - a MacroContestIndex of the contest and reported
+                         results, if one has already been built
     Outputs:
         measurements    - the p-value of the hypotheses that the election
                           result is correct based on the sample for each
@@ -230,20 +448,275 @@ def compute_risk(
     """
     assert risk_limit < 1, "The risk-limit must be less than one!"
 
-    p = 1.0
+    if index is None:
+        index = MacroContestIndex(contest, reported_results)
+    if not sample_results:
+        return 1.0, False
+
+    # The audit stops as soon as the running p-value meets the risk limit
+    p = float(index.p_values(sample_results, risk_limit)[-1])
+    return p, p < risk_limit
+
+
+# The reported votes in every batch for an across-contest audit, either as
+# nested dicts of batch -> contest -> candidate -> votes (see <compute_U>), or
+# as a list of the BatchTallies of each contest being audited.
+AuditReportedResults = Union[Dict[Any, Dict[str, Dict[str, int]]], List[BatchTallies]]
+
+
+class MacroAuditIndex:
+    """
+    The error bounds of the batches in an across-contest MACRO audit of
+    several contests at once, as in the MACRO paper: each batch's maximum
+    relative overstatement u_p is the maximum over every contest (rather than
+    over one contest, as in MacroContestIndex), so the contests share one U,
+    one PPEB sample and one risk measurement. Batches that are in several
+    contests are only hand-counted once.
+
+    Every contest's choices get their own columns of one batches x choices
+    array of votes (choice names needn't be unique across contests), and
+    every contest's (winner, loser) pairs are laid side by side, so the
+    overstatements of every pair of every contest in every batch are
+    computed in one vectorized pass over the batches. The running p-value is
+    computed from the taints e_p / u_p as for one contest (see
+    <running_p_values>).
+    """
+
+    def __init__(self, contests: List[Contest], reported_results: AuditReportedResults):
+        """
+        Inputs:
+            contests         - sampler_contest objects of the contests to
+                               audit
+            reported_results - the reported votes in every batch, as in
+                               <compute_U>, or a list of the BatchTallies of
+                               each contest
+        """
+        self.contests = contests
+        # The columns of each contest's choices in the vote arrays
+        self.columns: Dict[str, Dict[str, int]] = {}
+        for contest in contests:
+            offset = sum(len(columns) for columns in self.columns.values())
+            self.columns[contest.name] = {
+                choice: offset + i for i, choice in enumerate(contest.candidates)
+            }
+
+        # The winners' and losers' columns, contest and margin V_wl of each
+        # (winner, loser) pair of each contest
+        pair_winners, pair_losers, pair_contests, margins = [], [], [], []
+        for c, contest in enumerate(contests):
+            for winner in contest.margins["winners"]:
+                for loser in contest.margins["losers"]:
+                    pair_winners.append(self.columns[contest.name][winner])
+                    pair_losers.append(self.columns[contest.name][loser])
+                    pair_contests.append(c)
+                    margins.append(
+                        contest.candidates[winner] - contest.candidates[loser]
+                    )
+        self.pair_winners = np.array(pair_winners, dtype=np.int64)
+        self.pair_losers = np.array(pair_losers, dtype=np.int64)
+        self.pair_contests = np.array(pair_contests, dtype=np.int64)
+        self.margins = np.array(margins, dtype=np.int64)
+
+        # Batches without a contest have no votes and no ballots in it, so
+        # the contest's pairs don't add to their u_p, as in compute_max_error.
+        if isinstance(reported_results, list):
+            self.batch_names: List[Any] = list(
+                dict.fromkeys(
+                    batch for tallies in reported_results for batch in tallies.batches
+                )
+            )
+            self.batch_index = {batch: i for i, batch in enumerate(self.batch_names)}
+            self.reported_votes = np.zeros(
+                (len(self.batch_names), self.num_columns), dtype=np.int64
+            )
+            ballots = np.zeros((len(self.batch_names), len(contests)), dtype=np.int64)
+            contest_index = {contest.name: c for c, contest in enumerate(contests)}
+            for tallies in reported_results:
+                rows = [self.batch_index[batch] for batch in tallies.batches]
+                columns = self.columns[tallies.contest_name]
+                self.reported_votes[
+                    np.ix_(rows, list(columns.values()))
+                ] = tallies.choice_votes(list(columns))
+                ballots[rows, contest_index[tallies.contest_name]] = tallies.ballots
+        else:
+            self.batch_names = list(reported_results)
+            self.batch_index = {batch: i for i, batch in enumerate(self.batch_names)}
+            batch_results = [reported_results[batch] for batch in self.batch_names]
+            self.reported_votes = self.vote_matrix(batch_results)
+            ballots = np.array(
+                [
+                    [
+                        results.get(contest.name, {}).get("ballots", 0)
+                        for contest in contests
+                    ]
+                    for results in batch_results
+                ],
+                dtype=np.int64,
+            ).reshape(len(batch_results), len(contests))
+
+        u_p = np.zeros(len(self.batch_names))
+        if len(self.margins):
+            u_pwl = (
+                self.pair_differences(self.reported_votes)
+                + ballots[:, self.pair_contests]
+            ) / self.margins
+            u_p = np.maximum(u_pwl.max(axis=1), 0.0)
+        self.u_p: np.ndarray = u_p
+        self.max_errors: Dict[Any, float] = dict(zip(self.batch_names, u_p.tolist()))
+        # Summed in the batches' order, as in compute_U
+        self.U = float(np.cumsum(u_p)[-1]) if len(u_p) else 0.0
+
+        order = sorted(range(len(self.batch_names)), key=self.batch_names.__getitem__)
+        self.batches = [self.batch_names[i] for i in order]
+        self.cumulative_errors = np.cumsum(u_p[order]).tolist()
+
+    @property
+    def num_columns(self) -> int:
+        return sum(len(columns) for columns in self.columns.values())
+
+    def vote_matrix(self, batch_results: List[Dict[str, Dict[str, int]]]) -> np.ndarray:
+        """
+        Converts the votes for each contest's choices in a list of batches
+        (e.g. {'contest': {'cand1': votes, ...}, ...}) into a
+        batches x choices array. Contests missing from a batch have no votes.
+        """
+        return np.array(
+            [
+                [
+                    results.get(contest.name, {}).get(choice, 0)
+                    for contest in self.contests
+                    for choice in self.columns[contest.name]
+                ]
+                for results in batch_results
+            ],
+            dtype=np.int64,
+        ).reshape(len(batch_results), self.num_columns)
+
+    def pair_differences(self, votes: np.ndarray) -> np.ndarray:
+        """
+        Computes v_w - v_l for each batch in a batches x choices array of
+        votes and each (winner, loser) pair of each contest, as a
+        batches x pairs array.
+        """
+        differences: np.ndarray = (
+            votes[:, self.pair_winners] - votes[:, self.pair_losers]
+        )
+        return differences
+
+    def errors(
+        self, sample_results: Dict[str, Dict[str, Dict[str, int]]]
+    ) -> np.ndarray:
+        """
+        Computes the maximum across-contest relative overstatement e_p in
+        each sampled batch, i.e. the largest error over every pair of every
+        contest, each relative to its own margin V_wl, in the order of
+        <sample_results>. Contests missing from a sampled batch's results
+        have no votes.
+        """
+        rows = [self.batch_index[batch] for batch in sample_results]
+        if not len(self.margins):
+            return np.zeros(len(rows))
+        audited_votes = self.vote_matrix(list(sample_results.values()))
+        e_pwl = (
+            self.pair_differences(self.reported_votes[rows])
+            - self.pair_differences(audited_votes)
+        ) / self.margins
+        e_p: np.ndarray = np.maximum(e_pwl.max(axis=1), 0.0)
+        return e_p
+
+    def taints(
+        self, sample_results: Dict[str, Dict[str, Dict[str, int]]]
+    ) -> np.ndarray:
+        """
+        Computes the taint e_p / u_p of each sampled batch, in the order of
+        <sample_results>. Batches whose u_p is 0 (i.e. batches in none of the
+        contests) can't overstate any margin, so their taint is 0, as in
+        MacroContestIndex.
+        """
+        rows = [self.batch_index[batch] for batch in sample_results]
+        u_p = self.u_p[rows]
+        taints: np.ndarray = np.divide(
+            self.errors(sample_results), u_p, out=np.zeros(len(rows)), where=u_p > 0,
+        )
+        return taints
+
+    def p_values(
+        self,
+        sample_results: Dict[str, Dict[str, Dict[str, int]]],
+        risk_limit: Optional[float] = None,
+    ) -> np.ndarray:
+        """
+        Computes the running MACRO p-value after each sampled batch, in the
+        order of <sample_results>, as in <running_p_values>.
+        """
+        return running_p_values(self, sample_results, risk_limit)
+
+
+def get_sample_size_across_contests(
+    risk_limit: float,
+    contests: List[Contest],
+    reported_results: AuditReportedResults,
+    index: Optional[MacroAuditIndex] = None,
+) -> int:
+    """
+    Computes the size of one PPEB sample that audits all of <contests> at
+    once, assuming no discrepancies.
+
+    Inputs:
+        risk_limit       - the risk-limit for this audit
+        contests         - sampler_contest objects of the contests to audit
+        reported_results - the reported votes in every batch, as in
+                           <compute_U>, or a list of the BatchTallies of
+                           each contest
+        index            - a MacroAuditIndex of the contests and reported
+                           results, if one has already been built
+
+    Outputs:
+        sample_size - the number of batches to draw (with replacement)
+    """
+    assert risk_limit < 1, "The risk-limit must be less than one!"
 
-    U = compute_U(reported_results, contest)
+    if index is None:
+        index = MacroAuditIndex(contests, reported_results)
 
-    for batch in sample_results:
-        e_p = compute_error(reported_results[batch], contest, sample_results[batch])
+    return sample_size_for_U(risk_limit, index.U)
 
-        u_p = compute_max_error(reported_results[batch], contest)
 
-        taint = e_p / u_p
+def compute_risk_across_contests(
+    risk_limit: float,
+    contests: List[Contest],
+    reported_results: AuditReportedResults,
+    sample_results: Dict[str, Dict[str, Dict[str, int]]],
+    index: Optional[MacroAuditIndex] = None,
+) -> Tuple[float, bool]:
+    """
+    Computes the risk-value of <sample_results> for all of <contests> at
+    once, based on each sampled batch's maximum across-contest relative
+    overstatement.
 
-        p *= (1 - 1 / U) / (1 - taint)
+    Inputs:
+        risk_limit       - the risk-limit for this audit
+        contests         - sampler_contest objects of the contests to audit
+        reported_results - the reported votes in every batch, as in
+                           <compute_U>, or a list of the BatchTallies of
+                           each contest
+        sample_results   - the audited votes in each sampled batch, in the
+                           nested dict form of reported_results. Contests
+                           missing from a batch have no votes.
+        index            - a MacroAuditIndex of the contests and reported
+                           results, if one has already been built
+    Outputs:
+        measurement     - the p-value of the hypothesis that some contest's
+                          result is wrong, based on the sample
+        confirmed       - a boolean indicating whether the audit can stop
+    """
+    assert risk_limit < 1, "The risk-limit must be less than one!"
 
-        if p < risk_limit:
-            return p, True
+    if index is None:
+        index = MacroAuditIndex(contests, reported_results)
+    if not sample_results:
+        return 1.0, False
 
+    # The audit stops as soon as the running p-value meets the risk limit
+    p = float(index.p_values(sample_results, risk_limit)[-1])
     return p, p < risk_limit
@@ -0,0 +1,502 @@
+"""
+Library for performing a Minerva ballot polling risk-limiting audit, as
+described by Zagórski et al. here: https://arxiv.org/abs/2008.02315
+
+BRAVO (see bravo.py) is a sequential test, so it stays valid when the risk is
+measured after every ballot, but that costs power when the risk is only
+measured at the end of each round. Minerva is a test for audits that measure
+the risk at the end of each round, and needs fewer ballots for the same risk
+limit.
+
+In each round, Minerva compares the chances of seeing at least as many votes
+for the winner as we did if the reported outcome is correct and if the
+contest is a tie, counting only the outcomes in which the audit didn't stop in
+an earlier round. So unlike bravo, the risk depends on the sample sizes of the
+previous rounds, not just the cumulative sample. The functions here take the
+same arguments as their bravo counterparts, plus the cumulative sample results
+at the end of each previous round.
+
+Like bravo, this library works for one contest at a time, and measures the
+risk of each (winner, loser) pair separately, from the votes for that pair.
+"""
+import math
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from .bravo import closest_pair, xlogy
+from .sampler_contest import Contest
+
+
+def binomial_pmf(n: int, p: float) -> np.ndarray:
+    """
+    Computes P(K = k) for K ~ Binomial(n, p), for k = 0, ..., n.
+
+    Inputs:
+        n - the number of trials
+        p - the chance of success of each trial
+
+    Outputs:
+        pmf - an array of the n + 1 probabilities
+    """
+    k = np.arange(n + 1)
+    # log(n choose k) = sum over i = 1, ..., k of log((n - i + 1) / i)
+    log_choose = np.concatenate(
+        ([0.0], np.cumsum(np.log(np.arange(n, 0, -1)) - np.log(np.arange(1, n + 1))))
+    )
+    pmf: np.ndarray = np.exp(log_choose + xlogy(k, p) + xlogy(n - k, 1 - p))
+    return pmf
+
+
+def tail_ratios(null: np.ndarray, alternative: np.ndarray) -> np.ndarray:
+    """
+    Computes the Minerva risk of seeing each number of votes for the winner,
+    i.e. the ratio of the chances of seeing at least that many votes if the
+    contest is a tie and if the reported outcome is correct.
+
+    Inputs:
+        null        - the chances of each number of votes for the winner if
+                      the contest is a tie
+        alternative - the chances of each number of votes for the winner if
+                      the reported outcome is correct
+
+    Outputs:
+        risks       - the risk for each number of votes, at most 1
+    """
+    null_tails = null[::-1].cumsum()[::-1]
+    alternative_tails = alternative[::-1].cumsum()[::-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        risks = np.where(alternative_tails > 0, null_tails / alternative_tails, 1.0)
+    capped_risks: np.ndarray = np.minimum(risks, 1.0)
+    return capped_risks
+
+
+def first_stopping_votes(risks: np.ndarray, risk_limit: float) -> int:
+    # The smallest number of votes for the winner that meets the risk limit,
+    # or one more than the most possible if none does
+    (meeting,) = np.nonzero(risks <= risk_limit)
+    return int(meeting[0]) if len(meeting) > 0 else len(risks)
+
+
+# The distributions of the winner's votes at the end of each sequence of
+# rounds in which the audit didn't stop (see <continuing_distributions>), keyed
+# by (risk limit, p_w2, round sizes), with the most recently used last. Once a
+# round ends, the distributions for the rounds so far don't change, so we
+# cache them rather than recomputing them every time the risk is measured.
+MAX_CACHED_DISTRIBUTIONS = 32
+DistributionsKey = Tuple[float, float, Tuple[int, ...]]
+_distributions: "OrderedDict[DistributionsKey, Tuple[np.ndarray, np.ndarray]]" = (
+    OrderedDict()
+)
+_distributions_lock = threading.Lock()
+
+
+def continuing_distributions(
+    risk_limit: float, p_w2: float, round_sizes: Tuple[int, ...]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the chances of each number of votes for the winner at the end of
+    a sequence of rounds, together with the audit not having stopped in any
+    of them, if the contest is a tie and if the reported outcome is correct.
+    The results are cached, and shared between callers, so they must not be
+    modified.
+
+    Inputs:
+        risk_limit, p_w2, round_sizes - as in <round_distributions>
+
+    Outputs:
+        null        - the chances of each number of votes for the winner
+                      after the last round, with the audit continuing, if
+                      the contest is a tie
+        alternative - the same, if the reported outcome is correct
+    """
+    if not round_sizes:
+        return np.ones(1), np.ones(1)
+
+    key = (risk_limit, p_w2, round_sizes)
+    with _distributions_lock:
+        if key in _distributions:
+            _distributions.move_to_end(key)
+            return _distributions[key]
+
+    null, alternative = round_distributions(risk_limit, p_w2, round_sizes)
+    # The audit would have stopped after the last round if it had met the
+    # risk limit, i.e. if it had seen enough votes for the winner
+    stopping_votes = first_stopping_votes(tail_ratios(null, alternative), risk_limit)
+    continuing = np.arange(len(null)) < stopping_votes
+    null = np.where(continuing, null, 0.0)
+    alternative = np.where(continuing, alternative, 0.0)
+    null.flags.writeable = False
+    alternative.flags.writeable = False
+
+    with _distributions_lock:
+        _distributions[key] = (null, alternative)
+        while len(_distributions) > MAX_CACHED_DISTRIBUTIONS:
+            _distributions.popitem(last=False)
+    return null, alternative
+
+
+def round_distributions(
+    risk_limit: float, p_w2: float, round_sizes: Sequence[int]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the chances of each number of votes for the winner in the last
+    of a sequence of rounds, together with the audit not having stopped in an
+    earlier round, if the contest is a tie and if the reported outcome is
+    correct.
+
+    Inputs:
+        risk_limit  - the risk-limit for this audit
+        p_w2        - the winner's share of the votes for the winner and
+                      loser
+        round_sizes - the cumulative number of votes for the winner and loser
+                      in the sample at the end of each round
+
+    Outputs:
+        null        - the chances of each number of votes for the winner in
+                      the last round if the contest is a tie
+        alternative - the same, if the reported outcome is correct
+    """
+    if not round_sizes:
+        return np.ones(1), np.ones(1)
+    null, alternative = continuing_distributions(
+        risk_limit, p_w2, tuple(round_sizes[:-1])
+    )
+    new_votes = round_sizes[-1] - (round_sizes[-2] if len(round_sizes) > 1 else 0)
+    return (
+        np.convolve(null, binomial_pmf(new_votes, 0.5)),
+        np.convolve(alternative, binomial_pmf(new_votes, p_w2)),
+    )
+
+
+def round_tails(
+    risk_limit: float, p_w2: float, round_sizes: Sequence[int]
+) -> Callable[[int], Tuple[float, float]]:
+    """
+    Prepares to compute the chances of seeing at least a number of votes for
+    the winner at the end of the last of a sequence of rounds, without having
+    stopped in an earlier round, i.e. the tails of its <round_distributions>.
+    Rather than computing the whole distributions of the last round, which
+    takes time proportional to the product of the sample sizes, we only sum
+    up the chances of seeing at least that many votes, which takes time
+    proportional to their sum.
+
+    Inputs:
+        risk_limit, p_w2, round_sizes - as in <round_distributions>
+
+    Outputs:
+        tails   - a function of the number of votes for the winner that
+                  returns the chances of seeing at least that many if the
+                  contest is a tie and if the reported outcome is correct
+    """
+    null, alternative = continuing_distributions(
+        risk_limit, p_w2, tuple(round_sizes[:-1])
+    )
+    new_votes = round_sizes[-1] - (round_sizes[-2] if len(round_sizes) > 1 else 0)
+    # The chances of at least each number of new votes for the winner, with
+    # one more for "impossible"
+    null_new_tails, alternative_new_tails = [
+        np.append(binomial_pmf(new_votes, p)[::-1].cumsum()[::-1], 0.0)
+        for p in [0.5, p_w2]
+    ]
+    previous_votes = np.arange(len(null))
+
+    def tails(winner_votes: int) -> Tuple[float, float]:
+        # The number of new votes for the winner needed to see at least
+        # <winner_votes>, for each number of votes for the winner so far
+        needed_votes = np.clip(winner_votes - previous_votes, 0, new_votes + 1)
+        return (
+            float(np.dot(null, null_new_tails[needed_votes])),
+            float(np.dot(alternative, alternative_new_tails[needed_votes])),
+        )
+
+    return tails
+
+
+def tail_ratio(null_tail: float, alternative_tail: float) -> float:
+    # One entry of <tail_ratios>
+    if alternative_tail <= 0:
+        return 1.0
+    return min(null_tail / alternative_tail, 1.0)
+
+
+def round_risk(
+    risk_limit: float, p_w2: float, round_sizes: Sequence[int], winner_votes: int
+) -> float:
+    """
+    Computes the Minerva risk of seeing <winner_votes> votes for the winner at
+    the end of the last of a sequence of rounds, i.e. the entry of the
+    <tail_ratios> of its <round_distributions>, from its <round_tails>.
+
+    Inputs:
+        risk_limit, p_w2, round_sizes - as in <round_distributions>
+        winner_votes    - the number of votes for the winner in the sample
+
+    Outputs:
+        risk            - the risk, at most 1
+    """
+    return tail_ratio(*round_tails(risk_limit, p_w2, round_sizes)(winner_votes))
+
+
+def round_stopping_votes(
+    risk_limit: float, p_w2: float, round_sizes: Sequence[int]
+) -> int:
+    """
+    Finds the smallest number of votes for the winner at the end of the last
+    of a sequence of rounds that meets the risk limit, like
+    <first_stopping_votes> of its <round_distributions>.
+
+    The votes for the winner have a monotone likelihood ratio, which the
+    rounds' stopping rule and the binomial distributions of each round's
+    votes preserve, so the risk never grows with the votes for the winner,
+    up to the most votes that are possible (or whose chances don't
+    underflow). So we can bisect with <round_tails> instead of computing the
+    whole distributions.
+
+    Inputs:
+        risk_limit, p_w2, round_sizes - as in <round_distributions>
+
+    Outputs:
+        stopping_votes  - the number of votes for the winner, or one more
+                          than the most possible if none meets the risk limit
+    """
+    tails = round_tails(risk_limit, p_w2, round_sizes)
+    none = round_sizes[-1] + 1
+
+    def stops(winner_votes: int) -> bool:
+        # Votes with no chance (or an underflowing one) count as stopping, to
+        # keep this monotone, and are checked for below.
+        null_tail, alternative_tail = tails(winner_votes)
+        return alternative_tail <= 0 or null_tail / alternative_tail <= risk_limit
+
+    low, high = -1, none
+    while high - low > 1:
+        mid = (low + high) // 2
+        if stops(mid):
+            high = mid
+        else:
+            low = mid
+    if high < none and tail_ratio(*tails(high)) > risk_limit:
+        return none
+    return high
+
+
+def pair_round_sizes(
+    winner: str, loser: str, rounds: Sequence[Dict[str, int]]
+) -> List[int]:
+    # The cumulative number of votes for the pair at the end of each round
+    return [results.get(winner, 0) + results.get(loser, 0) for results in rounds]
+
+
+def compute_risk(
+    risk_limit: float,
+    contest: Contest,
+    sample_results: Dict[str, int],
+    previous_rounds: Sequence[Dict[str, int]] = (),
+) -> Tuple[Dict[Tuple[str, str], float], bool]:
+    """
+    Computes the risk-value of <sample_results> based on results in <contest>.
+
+    Inputs:
+        risk_limit      - the risk-limit for this audit
+        contest         - a sampler_contest object for the contest being
+                          measured
+        sample_results  - mapping of candidates to votes in the (cumulative)
+                          sample at the end of the current round:
+                {
+                    candidate1: sampled_votes,
+                    candidate2: sampled_votes,
+                    ...
+                }
+        previous_rounds - the cumulative sample results at the end of each
+                          previous round, in the same form, in round order
+
+    Outputs:
+        measurements    - the p-value of the hypotheses that the election
+                          result is correct based on the sample, for each
+                          winner-loser pair.
+        confirmed       - a boolean indicating whether the audit can stop
+    """
+    assert risk_limit < 1, "The risk-limit must be less than one!"
+
+    margins = contest.margins
+    # Like bravo, contests without losers never finish
+    if not margins["losers"]:
+        return {(winner, ""): 1.0 for winner in margins["winners"]}, False
+
+    measurements = {}
+    for winner in margins["winners"]:
+        for loser in margins["losers"]:
+            measurements[(winner, loser)] = round_risk(
+                risk_limit,
+                margins["winners"][winner]["swl"][loser],
+                pair_round_sizes(
+                    winner, loser, list(previous_rounds) + [sample_results]
+                ),
+                sample_results.get(winner, 0),
+            )
+
+    finished = all(risk <= risk_limit for risk in measurements.values())
+    return measurements, finished
+
+
+def minerva_sample_sizes(
+    risk_limit: float,
+    p_w2: float,
+    round_sizes: Sequence[int],
+    sample_w: int,
+    max_size: int,
+    p_completions: Sequence[float],
+) -> List[Optional[int]]:
+    """
+    Finds the number of votes for the winner and loser the next round needs
+    to sample to meet the risk limit with each chance, if the reported
+    outcome is correct.
+
+    The chance of meeting the risk limit mostly grows with the sample size,
+    so we gallop over doubling sample sizes until one is big enough, then
+    bisect. Because of the discreteness of the votes, the sample size we
+    find is big enough, but a slightly smaller one might be too.
+
+    Inputs:
+        risk_limit      - the risk-limit for this audit
+        p_w2            - the winner's share of the votes for the winner and
+                          loser
+        round_sizes     - the cumulative number of votes for the winner and
+                          loser in the sample at the end of each round so far
+        sample_w        - the number of votes for the winner in the sample
+                          so far
+        max_size        - the largest sample size to consider
+        p_completions   - the desired chances of completion in the next round
+
+    Outputs:
+        sample_sizes    - the number of votes for the winner and loser to
+                          sample in the next round for each chance of
+                          completion, or None if even <max_size> isn't enough
+    """
+    current_size = round_sizes[-1] if round_sizes else 0
+    chances: Dict[int, float] = {}
+
+    def completion_chance(size: int) -> float:
+        # The chance of meeting the risk limit with <size> more votes
+        if size not in chances:
+            stopping_votes = round_stopping_votes(
+                risk_limit, p_w2, list(round_sizes) + [current_size + size]
+            )
+            needed_votes = max(stopping_votes - sample_w, 0)
+            chances[size] = float(binomial_pmf(size, p_w2)[needed_votes:].sum())
+        return chances[size]
+
+    sizes: List[Optional[int]] = []
+    for p_completion in p_completions:
+        low, high = 0, 1
+        while completion_chance(high) < p_completion:
+            if high >= max_size:
+                break
+            low, high = high, min(2 * high, max_size)
+        if completion_chance(high) < p_completion:
+            sizes.append(None)
+            continue
+        while high - low > 1:
+            mid = (low + high) // 2
+            if completion_chance(mid) >= p_completion:
+                high = mid
+            else:
+                low = mid
+        sizes.append(high)
+    return sizes
+
+
+def get_sample_size_curve(
+    risk_limit: float,
+    contest: Contest,
+    sample_results: Dict[str, int],
+    p_completions: Sequence[float],
+    previous_rounds: Sequence[Dict[str, int]] = (),
+) -> List[int]:
+    """
+    Computes the next round's sample size for each of a grid of chances that
+    the round will confirm the election result, assuming no discrepancies,
+    like the options of <get_sample_size>.
+
+    The sample size comes from the pair of candidates with the smallest
+    margin. A full hand count is suggested when no smaller sample is likely
+    enough to confirm the result.
+
+    Inputs:
+        risk_limit      - the risk-limit for this audit
+        contest         - a sampler_contest object of the contest being
+                          audited
+        sample_results  - mapping of candidates to votes in the (cumulative)
+                          sample, as in <compute_risk>
+        p_completions   - the chances of confirming the result in the round
+        previous_rounds - as in <compute_risk>
+
+    Outputs:
+        sample_sizes    - the sample size for each chance in <p_completions>
+    """
+    assert risk_limit < 1, "The risk-limit must be less than one!"
+
+    worse_winner, p_w, best_loser, p_l = closest_pair(contest.margins)
+
+    # Single-candidate races and ties, as in bravo.get_sample_size
+    if not contest.margins["losers"]:
+        return [-1] * len(p_completions)
+    if p_w == p_l:
+        return [contest.ballots] * len(p_completions)
+
+    sizes = minerva_sample_sizes(
+        risk_limit,
+        contest.margins["winners"][worse_winner]["swl"][best_loser],
+        pair_round_sizes(
+            worse_winner, best_loser, list(previous_rounds) + [sample_results]
+        ),
+        sample_results.get(worse_winner, 0),
+        contest.candidates[worse_winner] + contest.candidates[best_loser],
+        p_completions,
+    )
+
+    # Account for ballots without votes for the winner or loser, like bravo
+    return [
+        contest.ballots if size is None else math.ceil(size / (p_w + p_l))
+        for size in sizes
+    ]
+
+
+def get_sample_size(
+    risk_limit: float,
+    contest: Contest,
+    sample_results: Dict[str, int],
+    previous_rounds: Sequence[Dict[str, int]] = (),
+) -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    Computes the next round's sample size parameterized by the likelihood
+    that it will confirm the election result, assuming no discrepancies.
+
+    Inputs:
+        risk_limit      - the risk-limit for this audit
+        contest         - a sampler_contest object of the contest being
+                          audited
+        sample_results  - mapping of candidates to votes in the (cumulative)
+                          sample, as in <compute_risk>
+        previous_rounds - as in <compute_risk>
+
+    Outputs:
+        samples - dictionary mapping confirmation likelihood to sample size,
+                  like <bravo.get_sample_size> (without the ASN, which is a
+                  BRAVO notion):
+                {
+                    likelihood1: {"type": None, "size": sample_size,
+                                  "prob": likelihood1},
+                    ...
+                }
+    """
+    quants = [0.7, 0.8, 0.9]
+    sizes = get_sample_size_curve(
+        risk_limit, contest, sample_results, quants, previous_rounds
+    )
+    return {
+        str(quant): {"type": None, "size": size, "prob": quant}
+        for quant, size in zip(quants, sizes)
+    }
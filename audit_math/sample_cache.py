@@ -0,0 +1,248 @@
+"""
+A content-addressed cache of ballot samples.
+
+For the same seed and manifest, the sampler always draws the same sequence of
+tickets, and every sample is a slice of that sequence: a sample of
+<sample_size> tickets after <num_sampled> tickets have already been sampled
+is tickets num_sampled to num_sampled + sample_size. So we save the longest
+prefix of the sequence drawn so far under a hash of the seed and manifest,
+and serve every sample size (and every round) from it: for sample size
+previews, for retries after a failed round creation and for verification
+reruns. Recently used prefixes are kept in memory (up to a total number of
+draws), and all prefixes can also be saved to a slower, persistent
+<SampleStore>.
+
+Along with each prefix, we save the state of the <sampler.SamplerCursor> that
+drew it, so that a longer sample (or a later round) can resume drawing from
+the end of the prefix.
+"""
+import base64
+import hashlib
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, Optional, Tuple
+
+from . import sampler
+from .sampler import Sample
+
+# The default number of draws to keep in memory, across all cached samples
+MAX_DRAWS = 1_000_000
+
+
+class SampleStore:
+    """
+    A persistent store of cached samples, mapping sample keys to serialized
+    samples. Subclasses must implement <get> and <put>.
+    """
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def put(self, key: str, contents: bytes) -> None:
+        raise NotImplementedError
+
+
+class DiskSampleStore(SampleStore):
+    """
+    Stores each cached sample in its own file, named by its key, in
+    <directory>.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, contents: bytes) -> None:
+        # Write to a temporary file and rename it, so that concurrent readers
+        # never see a partially written sample.
+        temp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(contents)
+        os.replace(temp_path, self._path(key))
+
+
+def sample_key(seed: str, manifest: Dict[Any, int]) -> str:
+    """
+    Computes the key of a ticket sequence: a hash of the seed and manifest
+    that determine it.
+    """
+    fingerprint = sampler.manifest_fingerprint(seed, manifest)
+    return hashlib.sha256(f"sample-prefix:{fingerprint}".encode()).hexdigest()
+
+
+def _serialize(sample: Sample, sampler_state: bytes) -> bytes:
+    entry = {
+        "sample": [
+            (sampler.format_ticket_number(ticket_number), ballot, generation)
+            for ticket_number, ballot, generation in sample
+        ],
+        "samplerState": base64.b64encode(sampler_state).decode(),
+    }
+    return zlib.compress(json.dumps(entry, separators=(",", ":")).encode())
+
+
+def _deserialize(contents: bytes) -> Tuple[Sample, bytes]:
+    entry = json.loads(zlib.decompress(contents))
+    sample = [
+        (
+            Decimal(ticket_number),
+            sampler._to_tuples(ballot),  # pylint: disable=protected-access
+            generation,
+        )
+        for ticket_number, ballot, generation in entry["sample"]
+    ]
+    return sample, base64.b64decode(entry["samplerState"])
+
+
+class SampleCache:
+    """
+    Inputs:
+        max_draws - the number of draws to keep in memory, across all cached
+                    samples. The least recently used samples are evicted first.
+        store - an optional persistent store for cached samples
+    """
+
+    def __init__(self, max_draws: int = MAX_DRAWS, store: Optional[SampleStore] = None):
+        self.max_draws = max_draws
+        self.store = store
+        self.entries: "OrderedDict[str, Tuple[Sample, bytes]]" = OrderedDict()
+        self.num_draws = 0
+        # The server handles requests on several threads, which share the
+        # cache. The lock guards the in-memory entries; the store must be
+        # safe to use from several threads (or processes) on its own.
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[Sample, bytes]]:
+        """
+        Looks up the longest cached prefix of a ticket sequence and the state
+        of the sampler after drawing it.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+                return entry
+
+        contents = self.store and self.store.get(key)
+        if not contents:
+            return None
+        entry = _deserialize(contents)
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, prefix: Sample, sampler_state: bytes) -> None:
+        """
+        Saves a prefix of a ticket sequence and the state of the sampler
+        after drawing it.
+        """
+        if self.store:
+            self.store.put(key, _serialize(prefix, sampler_state))
+        self._remember(key, (prefix, sampler_state))
+
+    def _remember(self, key: str, entry: Tuple[Sample, bytes]) -> None:
+        with self.lock:
+            old_entry = self.entries.pop(key, None)
+            if old_entry:
+                self.num_draws -= len(old_entry[0])
+                # Another thread may have drawn a longer prefix meanwhile
+                if len(old_entry[0]) > len(entry[0]):
+                    entry = old_entry
+            if len(entry[0]) > self.max_draws:
+                return
+            self.entries[key] = entry
+            self.num_draws += len(entry[0])
+            while self.num_draws > self.max_draws:
+                _, (evicted_sample, _) = self.entries.popitem(last=False)
+                self.num_draws -= len(evicted_sample)
+
+    def draw_sample(
+        self,
+        seed: str,
+        manifest: Dict[Any, int],
+        sample_size: int,
+        num_sampled: int = 0,
+        processes: Optional[int] = None,
+    ) -> Sample:
+        """
+        Same as <sampler.draw_sample>, but serves the sample from the cached
+        prefix of the ticket sequence, extending (and caching) it if needed.
+        """
+        prefix, _ = self._prefix(seed, manifest, num_sampled + sample_size, processes)
+        return prefix[num_sampled : num_sampled + sample_size]
+
+    def draw_sample_resumably(
+        self,
+        seed: str,
+        manifest: Dict[Any, int],
+        sample_size: int,
+        num_sampled: int,
+        sampler_state: Optional[bytes],
+        processes: Optional[int] = None,
+    ) -> Tuple[Sample, bytes]:
+        """
+        Same as <sampler.draw_sample_resumably>, but serves the sample from
+        the cached prefix of the ticket sequence, extending (and caching) it
+        if needed. If nothing is cached for a later round, resumes from
+        <sampler_state> instead of drawing the whole prefix again.
+        """
+        key = sample_key(seed, manifest)
+        if num_sampled > 0 and sampler_state and not self.get(key):
+            return sampler.draw_sample_resumably(
+                seed, manifest, sample_size, num_sampled, sampler_state, processes
+            )
+
+        take = num_sampled + sample_size
+        prefix, sampler_state = self._prefix(seed, manifest, take, processes)
+        if len(prefix) > take:
+            # The sampler state after this sample is the state after the
+            # prefix, without the draws that came after the sample
+            cursor = sampler.SamplerCursor.load(
+                seed, manifest, sampler_state, processes
+            )
+            assert cursor
+            cursor.rewind(prefix[take:])
+            sampler_state = cursor.dump()
+
+        return prefix[num_sampled:take], sampler_state
+
+    def _prefix(
+        self,
+        seed: str,
+        manifest: Dict[Any, int],
+        num_draws: int,
+        processes: Optional[int],
+    ) -> Tuple[Sample, bytes]:
+        # Returns a cached prefix with at least <num_draws> tickets (unless
+        # the manifest runs out of ballots) and the sampler state after it
+        key = sample_key(seed, manifest)
+        entry = self.get(key)
+        if entry and len(entry[0]) >= num_draws:
+            return entry
+
+        # Draw the rest of the prefix, resuming from the end of the cached one
+        prefix, prefix_state = entry or ([], None)
+        rest, prefix_state = sampler.draw_sample_resumably(
+            seed,
+            manifest,
+            num_draws - len(prefix),
+            len(prefix),
+            prefix_state,
+            processes,
+        )
+        prefix = prefix + rest
+        self.put(key, prefix, prefix_state)
+        return prefix, prefix_state
@@ -1,15 +1,59 @@
 # pylint: disable=invalid-name
 # Handles generating sample sizes and taking samples
-from typing import cast, Any, Dict, List, Tuple
+import bisect
+import hashlib
+import heapq
+import itertools
+import json
+import zlib
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
 import consistent_sampler
 
 import audit_math.macro as macro
+import audit_math.tickets as tickets
 from .sampler_contest import Contest
 
+if TYPE_CHECKING:
+    from .sample_cache import SampleCache
+
+# Number of significant digits in the ticket numbers of a ballot sample
+TICKET_DIGITS = 18
+
+Sample = List[Tuple[Decimal, Tuple[Any, int], int]]
+
+
+def ticket_number_value(ticket_number: str, digits: int = TICKET_DIGITS) -> Decimal:
+    """
+    Converts a `consistent_sampler` ticket number into the exact fixed-point
+    decimal form we use for samples, keeping <digits> significant digits
+    after any leading 9s (like `consistent_sampler.trim`).
+
+    Trimmed ticket numbers have 18 digits after any leading 9s, so about 10%
+    of them have more than 18 digits, which is why we use a decimal rather
+    than a 64-bit integer. Decimals order numerically, and convert to and
+    from the database's NUMERIC type exactly.
+    """
+    return Decimal(consistent_sampler.trim(ticket_number, digits))
+
+
+def format_ticket_number(ticket_number: Decimal) -> str:
+    """
+    Formats a ticket number for display, e.g. in CSVs and JSON, the same way
+    `consistent_sampler` does (i.e. "0.<digits>", never in scientific
+    notation).
+    """
+    return f"{ticket_number:f}"
+
 
 def draw_sample(
-    seed: str, manifest: Dict[Any, int], sample_size: int, num_sampled=0
-) -> List[Tuple[str, Tuple[Any, int], int]]:
+    seed: str,
+    manifest: Dict[Any, int],
+    sample_size: int,
+    num_sampled=0,
+    processes: Optional[int] = None,
+) -> Sample:
     """
     Draws uniform random sample with replacement of size <sample_size> from the
     provided ballot manifest.
@@ -24,41 +68,404 @@ def draw_sample(
                     }
         sample_size - number of tickets to randomly draw
         num_sampled - number of tickets that have already been sampled
+        processes - if given, shard the manifest (see <shard_manifest>) and
+                    hash each shard in a pool of this many worker processes
 
     Outputs:
         sample - list of 'tickets', consisting of:
                 [
                     (
-                        '0.235789114',              # ticket number
+                        Decimal('0.235789114'),     # ticket number (see
+                                                    # <ticket_number_value>)
                         (<batch>, <ballot number>), # id, here a tuple (batch, ballot)
                         1                           # number of times this item has been picked
                     ),
                     ...
                 ]
     """
+    return list(stream_sample(seed, manifest, sample_size, num_sampled, processes))
+
+
+def ballot_ids(manifest: Dict[Any, int]) -> Iterator[Tuple[Any, int]]:
+    """
+    Lazily generates the id of every ballot in the manifest, in the same order
+    that a list of all the ballots would have them.
+
+    Inputs:
+        manifest - mapping of batches to the ballots they contain
+
+    Outputs:
+        an iterator of (<batch>, <ballot number>) tuples, where ballot numbers
+        are 1-indexed
+    """
+    for batch, num_ballots in manifest.items():
+        for ballot_number in range(1, num_ballots + 1):
+            yield (batch, ballot_number)
+
+
+def shard_manifest(manifest: Dict[Any, int]) -> List[Dict[Any, int]]:
+    """
+    Splits a manifest into shards that can be sampled independently. Batches
+    keyed by (jurisdiction, batch) tuples are sharded by jurisdiction;
+    otherwise the manifest is split into chunks of batches.
+    """
+    shards: Dict[Any, Dict[Any, int]] = {}
+    for batch, num_ballots in manifest.items():
+        shard_key = batch[0] if isinstance(batch, tuple) else None
+        shards.setdefault(shard_key, {})[batch] = num_ballots
+
+    if list(shards) == [None]:
+        return list(tickets.manifest_chunks(manifest))
+    return list(shards.values())
+
+
+def _smallest_first_tickets(
+    seed: str,
+    manifest: Dict[Any, int],
+    k: int,
+    after: Optional[consistent_sampler.Ticket] = None,
+    processes: Optional[int] = None,
+) -> List[consistent_sampler.Ticket]:
+    if processes:
+        return tickets.sharded_smallest_first_tickets(
+            seed, shard_manifest(manifest), k, after, processes
+        )
+    return tickets.smallest_first_tickets(seed, manifest, k, after)
+
+
+def stream_sample(
+    seed: str,
+    manifest: Dict[Any, int],
+    sample_size: int,
+    num_sampled=0,
+    processes: Optional[int] = None,
+) -> Iterator[Tuple[Decimal, Tuple[Any, int], int]]:
+    """
+    Lazily draws the same sample as <draw_sample>, without ever holding a list
+    of every ballot in the manifest.
+
+    Only ballots whose first ticket is among the <sample_size> + <num_sampled>
+    smallest first tickets can be drawn in the first <sample_size> +
+    <num_sampled> draws (any ballot drawn must have a first ticket no larger
+    than the drawn ticket, and every ballot with a smaller first ticket is
+    drawn before it). So we only keep those first tickets around, and run the
+    consistent sampler's with-replacement draws on them. This bounds memory by
+    the number of batches plus the sample size, and yields exactly the
+    tickets `consistent_sampler.sampler` would.
+
+    Inputs:
+        seed - random seed
+        manifest - mapping of batches to the ballots they contain
+        sample_size - number of tickets to randomly draw
+        num_sampled - number of tickets that have already been sampled
+        processes - same as <draw_sample>
+
+    Outputs:
+        an iterator of 'tickets', in the same form as <draw_sample>
+    """
+    take = sample_size + num_sampled
+
+    # A sorted list is also a valid heap
+    heap = _smallest_first_tickets(seed, manifest, take, processes=processes)
+
+    for count in range(take):
+        if not heap:
+            return
+        ticket = heapq.heappop(heap)
+        heapq.heappush(heap, consistent_sampler.next_ticket(ticket))
 
-    ballots: List[Tuple[str, int]] = []
-    # First build a faux list of ballots
-    for batch in manifest:
-        for i in range(manifest[batch]):
-            ballots.append((batch, i + 1))
-
-    return cast(
-        # The signature of `consistent_sampler.sampler` can't be represented by
-        # mypy yet, so it is typed as a less specific version of what it really
-        # is. This casts it back to the more specific version.
-        List[Tuple[str, Tuple[str, int], int]],
-        list(
-            consistent_sampler.sampler(
-                ballots,
-                seed=seed,
-                take=sample_size + num_sampled,
-                with_replacement=True,
-                output="tuple",
-                digits=18,
+        if count >= num_sampled:
+            yield (
+                ticket_number_value(ticket.ticket_number),
+                ticket.id,
+                ticket.generation,
             )
-        )[num_sampled:],
+
+
+def sample_workloads(
+    seed: str,
+    manifest: Dict[Any, int],
+    sample_sizes: Dict[str, int],
+    num_sampled=0,
+    processes: Optional[int] = None,
+    cache: Optional["SampleCache"] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Computes the ballot retrieval workload of several sample size options at
+    the cost of drawing one sample. The samples for different sizes are
+    prefixes of the same ticket sequence, so we draw the largest size once
+    and tally the workload of each option as we go.
+
+    Inputs:
+        seed, manifest, num_sampled, processes - same as <draw_sample>
+        cache - if given, the cache to look up (or save) the largest sample in
+        sample_sizes - mapping of sample size option keys to sizes:
+                        {
+                            option1: sample_size,
+                            ...
+                        }
+
+    Outputs:
+        workloads - mapping of sample size option keys to their workload:
+                {
+                    option1: {
+                        "numDraws": 120,          # tickets drawn
+                        "numBallots": 115,        # new ballots to retrieve
+                        "numDuplicateDraws": 5,   # draws of ballots that were
+                                                  # already drawn
+                        "numBatches": 40,         # batches with new ballots
+                        # Only for manifests keyed by (jurisdiction, batch):
+                        "numBallotsByJurisdiction": {
+                            jurisdiction1: 60,
+                            ...
+                        }
+                    },
+                    ...
+                }
+    """
+    keyed_by_jurisdiction = bool(manifest) and all(
+        isinstance(batch, tuple) for batch in manifest
     )
+    largest_size = max([int(size) for size in sample_sizes.values()] + [0])
+    sample = (
+        iter(cache.draw_sample(seed, manifest, largest_size, num_sampled, processes))
+        if cache
+        else stream_sample(seed, manifest, largest_size, num_sampled, processes)
+    )
+
+    num_draws = 0
+    num_ballots = 0
+    batches = set()
+    ballots_by_jurisdiction: Dict[Any, int] = defaultdict(int)
+
+    workloads = {}
+    for option in sorted(sample_sizes, key=lambda option: sample_sizes[option]):
+        for (_, (batch, _), generation) in itertools.islice(
+            sample, max(int(sample_sizes[option]) - num_draws, 0)
+        ):
+            num_draws += 1
+            if generation == 1:
+                num_ballots += 1
+                batches.add(batch)
+                if keyed_by_jurisdiction:
+                    ballots_by_jurisdiction[batch[0]] += 1
+
+        workload: Dict[str, Any] = {
+            "numDraws": num_draws,
+            "numBallots": num_ballots,
+            "numDuplicateDraws": num_draws - num_ballots,
+            "numBatches": len(batches),
+        }
+        if keyed_by_jurisdiction:
+            workload["numBallotsByJurisdiction"] = dict(ballots_by_jurisdiction)
+        workloads[option] = workload
+
+    return workloads
+
+
+def manifest_fingerprint(seed: str, manifest: Dict[Any, int]) -> str:
+    """
+    Computes a hash that identifies a (seed, manifest) pair, so that saved
+    sampler state can be checked against the inputs it was computed from. The
+    order of the batches in the manifest does not affect the sample, so it
+    does not affect the fingerprint either.
+    """
+    return hashlib.sha256(
+        repr((str(seed), sorted(manifest.items()))).encode("utf-8")
+    ).hexdigest()
+
+
+def _to_tuples(value: Any) -> Any:
+    # JSON turns our tuple ids into lists, so we turn them back
+    if isinstance(value, list):
+        return tuple(_to_tuples(item) for item in value)
+    return value
+
+
+class SamplerCursor:
+    """
+    The state of a with-replacement ballot draw from a manifest, which can be
+    saved after one round and resumed in the next, so that later rounds don't
+    have to replay the draws of earlier rounds.
+
+    The cursor holds a pool of tickets (a heap, exactly like the one
+    `consistent_sampler.sampler` uses) for the ballots with the smallest first
+    tickets, plus the frontier: the largest first ticket in the pool. Every
+    ballot outside the pool has a first ticket larger than the frontier, so
+    the smallest ticket in the pool can be drawn as long as it does not exceed
+    the frontier. Otherwise, we stream the manifest again to pull the next
+    smallest first tickets into the pool.
+    """
+
+    # When we have to pull more ballots into the pool, we pull this many times
+    # the number of draws we need, so that the next round can usually continue
+    # without streaming the manifest again.
+    LOOKAHEAD_FACTOR = 2
+
+    def __init__(
+        self, seed: str, manifest: Dict[Any, int], processes: Optional[int] = None
+    ):
+        self.seed = seed
+        self.manifest = manifest
+        self.processes = processes
+        self.fingerprint = manifest_fingerprint(seed, manifest)
+        self.num_drawn = 0
+        self.heap: List[consistent_sampler.Ticket] = []
+        self.frontier: Optional[consistent_sampler.Ticket] = None
+        self.exhausted = False  # True once every ballot is in the pool
+
+    def _extend_pool(self, num_draws: int):
+        size = max(num_draws, 1) * self.LOOKAHEAD_FACTOR
+        new_tickets = _smallest_first_tickets(
+            self.seed, self.manifest, size, self.frontier, self.processes
+        )
+
+        for ticket in new_tickets:
+            heapq.heappush(self.heap, ticket)
+        if new_tickets:
+            self.frontier = new_tickets[-1]
+        if len(new_tickets) < size:
+            self.exhausted = True
+
+    def draw(self, sample_size: int) -> Sample:
+        """
+        Draws the next <sample_size> tickets, continuing from where the last
+        draw stopped. Returns them in the same form as <draw_sample>.
+        """
+        sample = []
+        for count in range(sample_size):
+            if not self.exhausted and (
+                self.frontier is None or self.heap[0] > self.frontier
+            ):
+                self._extend_pool(sample_size - count)
+            if not self.heap:
+                break
+
+            ticket = heapq.heappop(self.heap)
+            heapq.heappush(self.heap, consistent_sampler.next_ticket(ticket))
+            self.num_drawn += 1
+            sample.append(
+                (
+                    ticket_number_value(ticket.ticket_number),
+                    ticket.id,
+                    ticket.generation,
+                )
+            )
+        return sample
+
+    def rewind(self, draws: Sample) -> None:
+        """
+        Undoes <draws>, the most recent draws of this cursor, so that it
+        continues as if it had stopped before them. Drawing a ballot only
+        replaces its ticket with its next ticket, so we put back each drawn
+        ticket. The pool keeps any ballots pulled in for those draws: their
+        first tickets are no larger than the frontier, so it stays valid.
+        """
+        seed_hash = consistent_sampler.sha256_hex(self.seed)
+        pool = {ticket.id: ticket for ticket in self.heap}
+        for _, ballot, generation in reversed(draws):
+            assert pool[ballot].generation == generation + 1, "Not a recent draw"
+            ticket = consistent_sampler.first_ticket(ballot, self.seed, seed_hash)
+            for _ in range(generation - 1):
+                ticket = consistent_sampler.next_ticket(ticket)
+            pool[ballot] = ticket
+        self.heap = list(pool.values())
+        heapq.heapify(self.heap)
+        self.num_drawn -= len(draws)
+
+    def dump(self) -> bytes:
+        """
+        Serializes the cursor compactly, so it can be saved between rounds.
+        The manifest itself is not saved, only its fingerprint. Neither are
+        the tickets, which are long and incompressible: each ticket is
+        determined by the seed, its ballot and its generation, so we only
+        save the generation of each ballot in the pool (grouped by batch) and
+        recompute the tickets in <load>.
+        """
+        pool: Dict[Any, List[int]] = defaultdict(list)
+        for ticket in self.heap:
+            batch, ballot_position = ticket.id
+            pool[batch].extend([ballot_position, ticket.generation])
+
+        state = {
+            "fingerprint": self.fingerprint,
+            "numDrawn": self.num_drawn,
+            "pool": [[batch, ballots] for batch, ballots in pool.items()],
+            "frontier": self.frontier and self.frontier.id,
+            "exhausted": self.exhausted,
+        }
+        return zlib.compress(json.dumps(state, separators=(",", ":")).encode())
+
+    @staticmethod
+    def load(
+        seed: str,
+        manifest: Dict[Any, int],
+        dumped: bytes,
+        processes: Optional[int] = None,
+    ) -> Optional["SamplerCursor"]:
+        """
+        Restores a cursor saved with <dump>. Returns None if the cursor was
+        saved for a different seed or manifest.
+        """
+        state = json.loads(zlib.decompress(dumped))
+        cursor = SamplerCursor(seed, manifest, processes)
+        if state["fingerprint"] != cursor.fingerprint:
+            return None
+
+        seed_hash = consistent_sampler.sha256_hex(seed)
+
+        def to_ticket(ballot: Any, generation: int) -> consistent_sampler.Ticket:
+            ticket = consistent_sampler.first_ticket(ballot, seed, seed_hash)
+            for _ in range(generation - 1):
+                ticket = consistent_sampler.next_ticket(ticket)
+            return ticket
+
+        cursor.num_drawn = state["numDrawn"]
+        cursor.heap = [
+            to_ticket((_to_tuples(batch), ballots[i]), ballots[i + 1])
+            for batch, ballots in state["pool"]
+            for i in range(0, len(ballots), 2)
+        ]
+        heapq.heapify(cursor.heap)
+        cursor.frontier = state["frontier"] and to_ticket(
+            _to_tuples(state["frontier"]), 1
+        )
+        cursor.exhausted = state["exhausted"]
+        return cursor
+
+
+def draw_sample_resumably(
+    seed: str,
+    manifest: Dict[Any, int],
+    sample_size: int,
+    num_sampled: int,
+    sampler_state: Optional[bytes],
+    processes: Optional[int] = None,
+) -> Tuple[Sample, bytes]:
+    """
+    Draws the same sample as <draw_sample>, resuming from a saved
+    <SamplerCursor> when it matches the seed, manifest and number of tickets
+    already sampled. Otherwise, starts a fresh cursor and skips past the
+    tickets that have already been sampled.
+
+    Inputs:
+        seed, manifest, sample_size, num_sampled, processes - same as
+            <draw_sample>
+        sampler_state - the cursor state saved after the last draw, if any
+
+    Outputs:
+        sample - same as <draw_sample>
+        sampler_state - the cursor state to save for the next draw
+    """
+    cursor = sampler_state and SamplerCursor.load(
+        seed, manifest, sampler_state, processes
+    )
+    if not cursor or cursor.num_drawn != num_sampled:
+        cursor = SamplerCursor(seed, manifest, processes)
+        cursor.draw(num_sampled)
+
+    sample = cursor.draw(sample_size)
+    return sample, cursor.dump()
 
 
 def draw_ppeb_sample(
@@ -66,8 +473,9 @@ def draw_ppeb_sample(
     contest: Contest,
     sample_size: int,
     num_sampled: int,
-    batch_results: Dict[str, Dict[str, Dict[str, int]]],
-) -> List[Tuple[str, Tuple[str, int], int]]:
+    batch_results: macro.ReportedResults,
+    index: Optional[macro.MacroContestIndex] = None,
+) -> List[Tuple[Decimal, Any, int]]:
     """
     Draws sample with replacement of size <sample_size> from the
     provided ballot manifest using proportional-with-error-bound (PPEB) sampling.
@@ -89,14 +497,18 @@ def draw_ppeb_sample(
                             }
                             ...
                         }
+                        or the contest's <batch_tallies.BatchTallies>
+        index - a <macro.MacroContestIndex> of the contest and batch
+                results, if one has already been built
 
     Outputs:
-        sample - list of 'tickets', consisting of:
+        sample - list of 'tickets', in ticket number order, consisting of:
                 [
                     (
-                        '0.235789114', # ticket number
-                        (<batch>, <ballot number>), # id, here a tuple (batch, ballot)
-                        1                           # number of times this item has been picked
+                        Decimal('0.235789114'), # ticket number
+                        <batch>,                # id, here the batch
+                        1                       # number of times this item
+                                                # has been picked
                     ),
                     ...
                 ]
@@ -104,47 +516,96 @@ def draw_ppeb_sample(
 
     assert batch_results, "Must have batch-level results to use MACRO"
 
-    U = macro.compute_U(batch_results, contest)
-
-    # Map each batch to its weighted probability of being picked
-    batch_to_prob = {}
-    min_prob = 1.0
-    # Get u_ps
-    for batch in batch_results:
-        error = macro.compute_max_error(batch_results[batch], contest)
-
-        # Probability of being picked is directly related to how much this
-        # batch contributes to the overall possible error
-        batch_to_prob[batch] = error / U
-
-        if error / U < min_prob:
-            min_prob = error / U
-
-    sample_from = []
-    # Now build faux list of batches, where each batch appears a number of
-    # times proportional to its prob
-    for batch in batch_to_prob:
-        times = int(batch_to_prob[batch] / min_prob)
-
-        for i in range(times):
-            # We have to create "unique" records for the sampler, so we add
-            # a '.n' to the batch name so we know which duplicate it is.
-            sample_from.append("{}.{}".format(batch, i))
-
-    # Now draw the sample
-    faux_sample = list(
-        consistent_sampler.sampler(
-            sample_from,
-            seed=seed,
-            take=sample_size + num_sampled,
-            with_replacement=True,
-            output="tuple",
-        )
-    )[num_sampled:]
+    # Each batch is picked with probability proportional to how much it
+    # contributes to the overall possible error, i.e. its u_p. We lay the
+    # batches end to end on [0, U), and pick the batch under a uniformly
+    # random point. The index sorts the batches so that the sample doesn't
+    # depend on the order of the batch results.
+    if index is None:
+        index = macro.MacroContestIndex(contest, batch_results)
+    return _draw_ppeb(
+        seed, index.batches, index.cumulative_errors, sample_size, num_sampled
+    )
+
+
+def draw_ppeb_sample_across_contests(
+    seed: str,
+    contests: List[Contest],
+    sample_size: int,
+    num_sampled: int,
+    batch_results: macro.AuditReportedResults,
+    index: Optional[macro.MacroAuditIndex] = None,
+) -> List[Tuple[Decimal, Any, int]]:
+    """
+    Draws one PPEB sample with replacement of size <sample_size> to audit all
+    of <contests> at once with across-contest MACRO (see
+    <macro.MacroAuditIndex>). Each batch is picked with probability
+    proportional to its maximum relative overstatement across the contests.
+
+    Inputs:
+        seed    - the random seed to use in sampling
+        contests - sampler_contest objects of the contests to audit
+        sample_size - number of ballots to randomly draw
+        num_sampled - number of ballots that have already been sampled
+        batch_results - the result of the election, per batch, as in
+                        <draw_ppeb_sample>, or a list of the
+                        <batch_tallies.BatchTallies> of each contest
+        index - a <macro.MacroAuditIndex> of the contests and batch results,
+                if one has already been built
+
+    Outputs:
+        sample - list of 'tickets', in ticket number order, as in
+                 <draw_ppeb_sample>
+    """
+
+    assert batch_results, "Must have batch-level results to use MACRO"
+
+    if index is None:
+        index = macro.MacroAuditIndex(contests, batch_results)
+    return _draw_ppeb(
+        seed, index.batches, index.cumulative_errors, sample_size, num_sampled
+    )
+
+
+def _draw_ppeb(
+    seed: str,
+    batches: List[Any],
+    cumulative_errors: List[float],
+    sample_size: int,
+    num_sampled: int,
+) -> List[Tuple[Decimal, Any, int]]:
+    U = cumulative_errors[-1]
+    assert U > 0, "Must have at least one batch with possible error"
+
+    # Each draw's random point and ticket number are derived from the seed
+    # and the draw number, so any draw can be replayed on its own. They come
+    # from separate hashes, so that a draw's ticket number says nothing about
+    # which batch it picked.
+    seed_hash = consistent_sampler.sha256_hex(seed)
+    times_sampled: Dict[Any, int] = defaultdict(int)
+
+    draws = []
+    for draw in range(1, num_sampled + sample_size + 1):
+        fraction = consistent_sampler.sha256_uniform(f"{seed_hash}:{draw}")
+        point = U * float(fraction[: 2 + TICKET_DIGITS])
+        batch = batches[
+            min(bisect.bisect_right(cumulative_errors, point), len(batches) - 1)
+        ]
+
+        if draw > num_sampled:
+            ticket_number = consistent_sampler.sha256_uniform(
+                f"{seed_hash}:{draw}:ticket"
+            )
+            draws.append((ticket_number_value(ticket_number, 9), batch))
+        else:
+            times_sampled[batch] += 1
 
-    # here we take off the decimals.
+    # Like the ballot samples, each round's draws are in ticket number order.
+    # Since ticket numbers are independent of the batches, any prefix of the
+    # sample in this order is itself a PPEB sample.
     sample = []
-    for item in faux_sample:
-        sample.append((item[0], item[1].split(".")[0], item[2]))
+    for ticket, batch in sorted(draws, key=lambda draw: draw[0]):
+        times_sampled[batch] += 1
+        sample.append((ticket, batch, times_sampled[batch]))
 
     return sample
@@ -2,13 +2,73 @@
 A Module containing the Contest class, which encapsulates useful info for RLA
 computations.
 """
-from typing import Dict, Tuple, List, cast
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Tuple, List, Optional, cast
 import operator
+import threading
 
 
-def from_db_contest(db_contest):
+# Contest objects built by <from_db_contest>, keyed by contest id and the
+# time the contest was last updated, with the most recently used last.
+MAX_CACHED_DB_CONTESTS = 256
+_db_contests: "OrderedDict[Tuple[str, datetime], Contest]" = OrderedDict()
+_db_contests_lock = threading.Lock()
+
+
+def from_db_contest(db_contest) -> "Contest":
+    """
+    Builds sampler_contest object from the database. Building a contest sorts
+    its candidates and computes all of its margins, so we cache the contest
+    objects we build, keyed by the contest's id and last update time. Cached
+    contests are shared between callers, so they must not be modified.
+
+    Since the cache key includes the contest's last update time, contests
+    that are updated in the database are rebuilt. But updating a contest's
+    choices doesn't update the contest itself, so code that changes choices
+    should also call <invalidate_db_contests>.
+
+    Inputs:
+        db_contest - a contest object as defined in arlo_server/model.py
+
+    Outputs:
+        Contest - A contest object
     """
-    Builds sampler_contest object from the database
+    # Contests that haven't been saved yet don't have an update time
+    if db_contest.updated_at is None:
+        return build_db_contest(db_contest)
+
+    key = (db_contest.id, db_contest.updated_at)
+    with _db_contests_lock:
+        if key in _db_contests:
+            _db_contests.move_to_end(key)
+            return _db_contests[key]
+
+    contest = build_db_contest(db_contest)
+    with _db_contests_lock:
+        _db_contests[key] = contest
+        while len(_db_contests) > MAX_CACHED_DB_CONTESTS:
+            _db_contests.popitem(last=False)
+    return contest
+
+
+def invalidate_db_contests(contest_ids: Optional[Iterable[str]] = None) -> None:
+    """
+    Removes the cached contest objects for <contest_ids> (or for all
+    contests, if not given), e.g. when their choices change.
+    """
+    with _db_contests_lock:
+        if contest_ids is None:
+            _db_contests.clear()
+            return
+        contest_ids = set(contest_ids)
+        for key in [key for key in _db_contests if key[0] in contest_ids]:
+            del _db_contests[key]
+
+
+def build_db_contest(db_contest) -> "Contest":
+    """
+    Builds sampler_contest object from the database, without caching
 
     Inputs:
         db_contest - a contest object as defined in arlo_server/model.py
@@ -47,6 +107,17 @@ class Contest:
 
     margins: Dict[str, Dict]  # Dict of the margins for this contest
 
+    __slots__ = (
+        "name",
+        "ballots",
+        "num_winners",
+        "votes_allowed",
+        "candidates",
+        "winners",
+        "losers",
+        "margins",
+    )
+
     def __init__(self, name: str, contest_info_dict: Dict[str, int]):
         """
         Initializes the contest info from a dict of the form:
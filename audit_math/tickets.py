@@ -0,0 +1,234 @@
+"""
+A batched engine for computing the first ticket numbers that
+`consistent_sampler` assigns to the ballots in a manifest.
+
+`consistent_sampler` hashes each ballot id one at a time, formats the hash as a
+decimal string and reverses it to get the ticket number. Here we hash every
+ballot in a tight loop, reusing the hash state of the seed and of each batch
+name, and keep only the leading digits of each ticket number as a fixed-point
+integer in a NumPy array. Comparing these integers orders tickets the same way
+comparing the ticket number strings does, except when two tickets share all of
+their leading digits, in which case we fall back to the exact ticket numbers.
+"""
+import hashlib
+import heapq
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import consistent_sampler
+
+# The number of leading ticket number digits we keep. 10^19 < 2^64, so these
+# fit in a uint64.
+KEY_DIGITS = 19
+KEY_MODULUS = 10 ** KEY_DIGITS
+
+# The number of ballots we hash before selecting the smallest tickets, which
+# bounds the memory used for the ticket number arrays.
+CHUNK_SIZE = 1_000_000
+
+
+def _reverse_digits(values: np.ndarray) -> np.ndarray:
+    reversed_values = np.zeros_like(values)
+    ten = np.uint64(10)
+    for _ in range(KEY_DIGITS):
+        values, digit = np.divmod(values, ten)
+        reversed_values = reversed_values * ten + digit
+    return reversed_values
+
+
+def _batch_ticket_numbers(
+    seed_hash: "hashlib._Hash", batch: Any, num_ballots: int
+) -> Iterator[int]:
+    # The id of a ballot is (batch, ballot_number), and consistent_sampler
+    # hashes str(id), which is "(<repr of batch>, <ballot_number>)".
+    batch_hash = seed_hash.copy()
+    batch_hash.update(f"({batch!r}, ".encode("utf-8"))
+    for ballot_number in range(1, num_ballots + 1):
+        ballot_hash = batch_hash.copy()
+        ballot_hash.update(b"%d)" % ballot_number)
+        # The ticket number is the decimal representation of the hash,
+        # reversed, so its leading digits are the hash's trailing digits.
+        yield int.from_bytes(ballot_hash.digest(), "big") % KEY_MODULUS
+
+
+def _seed_hash(seed: Any) -> "hashlib._Hash":
+    return hashlib.sha256(consistent_sampler.sha256_hex(seed).encode("utf-8"))
+
+
+def first_ticket_numbers(seed: Any, manifest: Dict[Any, int]) -> np.ndarray:
+    """
+    Computes the first ticket number of every ballot in the manifest.
+
+    Inputs:
+        seed - random seed
+        manifest - mapping of batches to the ballots they contain
+
+    Outputs:
+        an array of the leading <KEY_DIGITS> digits of each ballot's first
+        ticket number as a uint64 (i.e. the ticket number times
+        10^<KEY_DIGITS>, truncated), in the same order as
+        `sampler.ballot_ids(manifest)`
+    """
+    seed_hash = _seed_hash(seed)
+    total_ballots = sum(manifest.values())
+    trailing_digits = np.fromiter(
+        (
+            ticket_number
+            for batch, num_ballots in manifest.items()
+            for ticket_number in _batch_ticket_numbers(seed_hash, batch, num_ballots)
+        ),
+        dtype=np.uint64,
+        count=total_ballots,
+    )
+    return _reverse_digits(trailing_digits)
+
+
+def ticket_number_key(ticket_number: str) -> int:
+    """
+    Converts a ticket number string into the fixed-point integer form used by
+    <first_ticket_numbers>.
+    """
+    return int(ticket_number[2 : 2 + KEY_DIGITS].ljust(KEY_DIGITS, "0"))
+
+
+def manifest_chunks(manifest: Dict[Any, int]) -> Iterator[Dict[Any, int]]:
+    """
+    Splits a manifest into chunks of whole batches with about <CHUNK_SIZE>
+    ballots each.
+    """
+    chunk: Dict[Any, int] = {}
+    chunk_size = 0
+    for batch, num_ballots in manifest.items():
+        chunk[batch] = num_ballots
+        chunk_size += num_ballots
+        if chunk_size >= CHUNK_SIZE:
+            yield chunk
+            chunk, chunk_size = {}, 0
+    if chunk:
+        yield chunk
+
+
+def _ballots_at(
+    chunk: Dict[Any, int], keys: np.ndarray, indexes: np.ndarray
+) -> List[Tuple[int, Tuple[Any, int]]]:
+    # Maps indexes into the ticket number array of a manifest chunk back to
+    # (key, ballot id) pairs
+    batches = list(chunk.keys())
+    batch_ends = np.cumsum(list(chunk.values()))
+    batch_indexes = np.searchsorted(batch_ends, indexes, side="right")
+    ballots = []
+    for index, batch_index in zip(indexes, batch_indexes):
+        batch = batches[batch_index]
+        batch_start = batch_ends[batch_index] - chunk[batch]
+        ballots.append((int(keys[index]), (batch, int(index - batch_start) + 1)))
+    return ballots
+
+
+def _candidate_keys(
+    seed: Any, manifest: Dict[Any, int], k: int, after_key: Optional[int]
+) -> List[Tuple[int, Tuple[Any, int]]]:
+    # Returns (key, ballot id) for every ballot whose key is larger than
+    # <after_key> and no larger than the <k>th smallest such key, plus every
+    # ballot whose key equals <after_key>. This set contains the <k> ballots
+    # with the smallest first tickets after the ticket <after_key> came from,
+    # since keys are truncated ticket numbers.
+    candidates: List[Tuple[int, Tuple[Any, int]]] = []
+    ties: List[Tuple[int, Tuple[Any, int]]] = []
+
+    for chunk in manifest_chunks(manifest):
+        keys = first_ticket_numbers(seed, chunk)
+
+        if after_key is None:
+            indexes = np.arange(len(keys))
+        else:
+            (indexes,) = np.nonzero(keys > np.uint64(after_key))
+            (tie_indexes,) = np.nonzero(keys == np.uint64(after_key))
+            ties.extend(_ballots_at(chunk, keys, tie_indexes))
+
+        if len(indexes) > k:
+            kth_key = np.partition(keys[indexes], k - 1)[k - 1]
+            indexes = indexes[keys[indexes] <= kth_key]
+        candidates.extend(_ballots_at(chunk, keys, indexes))
+
+        if len(candidates) > k:
+            candidates.sort(key=lambda candidate: candidate[0])
+            kth_key = candidates[k - 1][0]
+            candidates = [c for c in candidates if c[0] <= kth_key]
+
+    return candidates + ties
+
+
+def smallest_first_tickets(
+    seed: Any,
+    manifest: Dict[Any, int],
+    k: int,
+    after: Optional[consistent_sampler.Ticket] = None,
+) -> List[consistent_sampler.Ticket]:
+    """
+    Finds the <k> ballots in the manifest with the smallest first tickets.
+
+    Inputs:
+        seed - random seed
+        manifest - mapping of batches to the ballots they contain
+        k - the number of tickets to find
+        after - if given, only consider tickets larger than this one
+
+    Outputs:
+        the first tickets (exactly as `consistent_sampler.first_ticket` would
+        compute them) of the <k> ballots with the smallest first tickets,
+        sorted
+    """
+    if k <= 0:
+        return []
+
+    after_key = ticket_number_key(after.ticket_number) if after else None
+    candidates = _candidate_keys(seed, manifest, k, after_key)
+
+    seed_hash = consistent_sampler.sha256_hex(seed)
+    tickets = [
+        consistent_sampler.first_ticket(ballot, seed, seed_hash)
+        for _, ballot in candidates
+    ]
+    if after:
+        tickets = [ticket for ticket in tickets if ticket > after]
+    return sorted(tickets)[:k]
+
+
+def sharded_smallest_first_tickets(
+    seed: Any,
+    shards: List[Dict[Any, int]],
+    k: int,
+    after: Optional[consistent_sampler.Ticket] = None,
+    processes: Optional[int] = None,
+) -> List[consistent_sampler.Ticket]:
+    """
+    Same as <smallest_first_tickets> on the union of the manifest <shards>,
+    but finds the smallest tickets of each shard in a pool of worker
+    processes. Since each ballot's ticket only depends on the seed and its
+    id, the global <k> smallest tickets are the <k> smallest of the shards'
+    <k> smallest tickets, which we find with a k-way merge.
+
+    Inputs:
+        seed, k, after - same as <smallest_first_tickets>
+        shards - manifests with disjoint batches
+        processes - the number of worker processes to use (defaults to the
+                    number of CPUs)
+
+    Outputs:
+        same as <smallest_first_tickets>
+    """
+    if k <= 0:
+        return []
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        shard_tickets = list(
+            executor.map(
+                smallest_first_tickets,
+                itertools.repeat(seed),
+                shards,
+                itertools.repeat(k),
+                itertools.repeat(after),
+            )
+        )
+    return list(itertools.islice(heapq.merge(*shard_tickets), k))
@@ -0,0 +1,249 @@
+"""
+Public verification of a round's sample.
+
+Re-derives the ballots sampled in a round from the published random seed and
+the jurisdictions' ballot manifests (as downloaded from the ballot manifest
+CSV endpoint), and checks them against the jurisdictions' ballot retrieval
+lists. This only depends on `audit_math`, so observers can run it without
+setting up an Arlo server:
+
+    python -m audit_math.verify_sample \\
+        --seed 1234567890 --sample-size 119 \\
+        --manifest "J1=J1 manifest.csv" --manifest "J2=J2 manifest.csv" \\
+        --retrieval-list "J1=J1 retrieval list.csv"
+
+Manifests are streamed one row at a time and the sample is drawn with the
+chunked ticket engine in `audit_math.tickets`, so memory use is bounded by the
+number of batches, not the number of ballots.
+"""
+import argparse
+import csv
+import locale
+import sys
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+from . import sampler
+
+# Manifest and retrieval list column headers, as in
+# arlo_server.ballot_manifest and arlo_server.ballots
+BATCH_NAME = "Batch Name"
+NUMBER_OF_BALLOTS = "Number of Ballots"
+BALLOT_NUMBER = "Ballot Number"
+TICKET_NUMBERS = "Ticket Numbers"
+ALREADY_AUDITED = "Already Audited"
+
+# (batch name, ballot number)
+BallotKey = Tuple[str, int]
+# (sorted ticket numbers, already audited)
+RetrievalListEntry = Tuple[List[str], bool]
+RetrievalList = Dict[BallotKey, RetrievalListEntry]
+
+
+class VerificationError(Exception):
+    pass
+
+
+def _dict_rows(file: TextIO, required_headers: List[str]) -> Iterator[Dict[str, str]]:
+    # Streams the rows of a CSV file, matching headers case-insensitively
+    # like arlo_server's CSV parser does.
+    rows = csv.reader(file)
+    headers = [header.strip().lower() for header in next(rows, [])]
+    missing_headers = [
+        header for header in required_headers if header.lower() not in headers
+    ]
+    if missing_headers:
+        raise VerificationError(
+            f"{file.name}: missing columns: {', '.join(missing_headers)}."
+        )
+    indexes = {header: headers.index(header.lower()) for header in required_headers}
+    for row in rows:
+        if any(cell.strip() for cell in row):
+            yield {
+                header: row[index].strip() if index < len(row) else ""
+                for header, index in indexes.items()
+            }
+
+
+def read_manifest(file: TextIO) -> Iterator[Tuple[str, int]]:
+    """
+    Streams (batch name, number of ballots) pairs from a ballot manifest CSV.
+    """
+    for row in _dict_rows(file, [BATCH_NAME, NUMBER_OF_BALLOTS]):
+        yield row[BATCH_NAME], locale.atoi(row[NUMBER_OF_BALLOTS])
+
+
+def read_retrieval_list(file: TextIO) -> RetrievalList:
+    """
+    Reads the ballots, ticket numbers and "already audited" flags from a
+    ballot retrieval list CSV.
+    """
+    return {
+        (row[BATCH_NAME], int(row[BALLOT_NUMBER])): (
+            sorted(row[TICKET_NUMBERS].split(",")),
+            row[ALREADY_AUDITED] == "Y",
+        )
+        for row in _dict_rows(
+            file, [BATCH_NAME, BALLOT_NUMBER, TICKET_NUMBERS, ALREADY_AUDITED]
+        )
+    }
+
+
+def expected_retrieval_lists(
+    seed: str,
+    manifest: Dict[Tuple[str, str], int],
+    sample_size: int,
+    num_sampled: int = 0,
+    processes: Optional[int] = None,
+) -> Dict[str, RetrievalList]:
+    """
+    Draws a round's sample and groups it into the retrieval list entries each
+    jurisdiction should have.
+
+    Inputs:
+        seed - the election's random seed
+        manifest - mapping of (jurisdiction name, batch name) to the number
+                   of ballots in the batch
+        sample_size - the number of tickets drawn in the round
+        num_sampled - the number of tickets drawn in all previous rounds
+        processes - same as <sampler.draw_sample>
+
+    Outputs:
+        a mapping of jurisdiction names to their expected retrieval list
+        entries, in the form returned by <read_retrieval_list>
+    """
+    retrieval_lists: Dict[str, RetrievalList] = {}
+    first_generations: Dict[Tuple[str, BallotKey], int] = {}
+    for (
+        ticket_number,
+        ((jurisdiction, batch), position),
+        generation,
+    ) in sampler.draw_sample(seed, manifest, sample_size, num_sampled, processes):
+        ballot = (batch, position)
+        retrieval_list = retrieval_lists.setdefault(jurisdiction, {})
+        ticket_numbers, _ = retrieval_list.get(ballot, ([], False))
+        first_generation = first_generations.setdefault(
+            (jurisdiction, ballot), generation
+        )
+        # A ballot was audited in a previous round if its first draw in this
+        # round wasn't its first draw ever.
+        retrieval_list[ballot] = (
+            sorted(ticket_numbers + [sampler.format_ticket_number(ticket_number)]),
+            first_generation > 1,
+        )
+    return retrieval_lists
+
+
+def diff_retrieval_list(expected: RetrievalList, actual: RetrievalList) -> List[str]:
+    """
+    Describes the differences between an expected and a published retrieval
+    list, one line per ballot.
+    """
+    differences = []
+    for ballot in sorted(set(expected) | set(actual)):
+        batch, position = ballot
+        where = f"Batch {batch}, ballot {position}"
+        if ballot not in actual:
+            differences.append(f"{where}: sampled, but missing from retrieval list")
+        elif ballot not in expected:
+            differences.append(f"{where}: on retrieval list, but not sampled")
+        elif expected[ballot][0] != actual[ballot][0]:
+            differences.append(
+                f"{where}: expected ticket numbers {','.join(expected[ballot][0])},"
+                f" got {','.join(actual[ballot][0])}"
+            )
+        elif expected[ballot][1] != actual[ballot][1]:
+            differences.append(
+                f"{where}: expected already audited"
+                f" {'Y' if expected[ballot][1] else 'N'},"
+                f" got {'Y' if actual[ballot][1] else 'N'}"
+            )
+    return differences
+
+
+def _named_path(value: str) -> Tuple[str, str]:
+    jurisdiction, separator, path = value.partition("=")
+    if not separator or not jurisdiction or not path:
+        raise argparse.ArgumentTypeError(
+            f"expected <jurisdiction name>=<path>, got: {value}"
+        )
+    return jurisdiction, path
+
+
+def main(argv: List[str], out: TextIO = sys.stdout) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m audit_math.verify_sample",
+        description="Verify a round's ballot retrieval lists against the"
+        " sample drawn from the election's random seed and ballot manifests.",
+    )
+    parser.add_argument("--seed", required=True, help="the random seed")
+    parser.add_argument(
+        "--sample-size",
+        required=True,
+        type=int,
+        help="the number of ballot draws in the round",
+    )
+    parser.add_argument(
+        "--num-sampled",
+        default=0,
+        type=int,
+        help="the number of ballot draws in all previous rounds",
+    )
+    parser.add_argument(
+        "--manifest",
+        required=True,
+        action="append",
+        type=_named_path,
+        metavar="JURISDICTION=PATH",
+        help="the ballot manifest CSV of every jurisdiction in the contest",
+    )
+    parser.add_argument(
+        "--retrieval-list",
+        default=[],
+        action="append",
+        type=_named_path,
+        metavar="JURISDICTION=PATH",
+        help="a retrieval list CSV to check",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        help="draw the sample using this many worker processes",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        manifest: Dict[Tuple[str, str], int] = {}
+        for jurisdiction, path in args.manifest:
+            with open(path, newline="", encoding="utf-8-sig") as file:
+                for batch, num_ballots in read_manifest(file):
+                    manifest[(jurisdiction, batch)] = num_ballots
+
+        expected = expected_retrieval_lists(
+            args.seed, manifest, args.sample_size, args.num_sampled, args.processes
+        )
+
+        num_differences = 0
+        for jurisdiction, path in args.retrieval_list:
+            with open(path, newline="", encoding="utf-8-sig") as file:
+                actual = read_retrieval_list(file)
+            differences = diff_retrieval_list(expected.get(jurisdiction, {}), actual)
+            for difference in differences:
+                print(f"{jurisdiction}: {difference}", file=out)
+            num_differences += len(differences)
+    except (OSError, ValueError, VerificationError) as error:
+        print(f"Error: {error}", file=out)
+        return 2
+
+    num_ballots = sum(len(ballots) for ballots in expected.values())
+    print(
+        f"Drew {args.sample_size} tickets ({num_ballots} ballots) from"
+        f" {sum(manifest.values())} ballots in {len(args.manifest)} manifests."
+        f" Checked {len(args.retrieval_list)} retrieval lists:"
+        f" {num_differences} differences.",
+        file=out,
+    )
+    return 1 if num_differences else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,143 @@
+"""
+Benchmarks balancing sampled batches across audit boards with
+`util.binpacking.BalancedBucketList`.
+
+Builds synthetic sets of sampled batches (batch name -> number of sampled
+ballots) of various sizes, then times the heap-based balancing against the
+linear scan it replaced, which looked at every bucket to find the least-full
+one for each batch, and checks that both assign every batch to the same
+audit board. Results are printed (or written to a file) as JSON:
+
+    python -m benchmarks.binpacking_benchmark --output results.json
+    python -m benchmarks.binpacking_benchmark --batches 1000 --boards 5 50
+"""
+import argparse, json, operator, platform, sys, time
+from typing import Any, Callable, Dict, List, Tuple
+import numpy as np
+
+from util.binpacking import BalancedBucketList, Bucket
+
+NUM_BATCHES = [100, 1_000, 10_000, 100_000]
+NUM_AUDIT_BOARDS = [5, 50, 500]
+
+
+def synthetic_batches(num_batches: int) -> Dict[str, int]:
+    """
+    Builds <num_batches> sampled batches with a heavy-tailed number of sampled
+    ballots in each, as in a PPEB or large ballot polling sample.
+    """
+    rand = np.random.RandomState(314159)
+    sizes = np.ceil(rand.lognormal(1, 1, num_batches)).astype(int)
+    return {f"Batch {i}": int(size) for i, size in enumerate(sizes)}
+
+
+def buckets_with_batches(num_audit_boards: int, batches: Dict[str, int]):
+    # As in arlo_server.audit_boards, all the batches start in the first bucket
+    buckets = [Bucket(f"Audit Board #{i + 1}") for i in range(num_audit_boards)]
+    for batch_name, batch_size in batches.items():
+        buckets[0].add_batch(batch_name, batch_size)
+    return buckets
+
+
+def linear_scan_balance(buckets: List[Bucket]) -> List[Bucket]:
+    """
+    The balancing BalancedBucketList did before it kept the buckets in a heap:
+    for each batch, largest first, scan every bucket for the least-full one.
+    """
+    avg_size = np.mean([bucket.size for bucket in buckets])
+    new_buckets = [Bucket(bucket.name) for bucket in buckets]
+    batches: List[Tuple[str, int]] = sorted(
+        (
+            (batch_name, batch_size)
+            for bucket in buckets
+            for batch_name, batch_size in bucket.batches.items()
+        ),
+        key=operator.itemgetter(1),
+        reverse=True,
+    )
+    for batch_name, batch_size in batches:
+        (min_idx, _min_del) = min(
+            enumerate([bucket.size + batch_size - avg_size for bucket in new_buckets]),
+            key=operator.itemgetter(1),
+        )
+        new_buckets[min_idx].add_batch(batch_name, batch_size)
+    return new_buckets
+
+
+def measure(run: Callable[[], Any], repeat: int) -> float:
+    """
+    Runs <run> <repeat> times, and returns the fastest time.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_benchmarks(
+    num_batches: List[int],
+    num_audit_boards: List[int],
+    repeat: int = 1,
+    log: Callable[[str], None] = lambda message: None,
+) -> List[Dict[str, Any]]:
+    results = []
+    for batches_count in num_batches:
+        batches = synthetic_batches(batches_count)
+        for audit_boards in num_audit_boards:
+            buckets = buckets_with_batches(audit_boards, batches)
+
+            heap_buckets = BalancedBucketList(buckets).buckets
+            scan_buckets = linear_scan_balance(buckets)
+            assert [bucket.batches for bucket in heap_buckets] == [
+                bucket.batches for bucket in scan_buckets
+            ], "Heap and linear scan balancing assigned batches differently"
+
+            result = {
+                "numBatches": batches_count,
+                "numBallots": sum(batches.values()),
+                "numAuditBoards": audit_boards,
+                "heapSeconds": measure(lambda: BalancedBucketList(buckets), repeat),
+                "linearScanSeconds": measure(
+                    lambda: linear_scan_balance(buckets), repeat
+                ),
+                "deviation": BalancedBucketList(buckets).deviation(),
+            }
+            log(json.dumps(result))
+            results.append(result)
+    return results
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.binpacking_benchmark",
+        description="Benchmark balancing sampled batches across audit boards.",
+    )
+    parser.add_argument("--batches", type=int, nargs="+", default=NUM_BATCHES)
+    parser.add_argument("--boards", type=int, nargs="+", default=NUM_AUDIT_BOARDS)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    results = {
+        "benchmark": "binpacking",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": run_benchmarks(
+            args.batches,
+            args.boards,
+            args.repeat,
+            log=lambda message: print(message, file=sys.stderr),
+        ),
+    }
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
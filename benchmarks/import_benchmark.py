@@ -0,0 +1,111 @@
+"""
+Benchmarks the time it takes to import the audit math (and the server, which
+imports it), and to compute a first sample size afterwards, with each
+distributions backend. Each measurement runs in a fresh Python process, so
+that nothing is already imported. Results are printed (or written to a file)
+as JSON:
+
+    python -m benchmarks.import_benchmark --output results.json
+    python -m benchmarks.import_benchmark --modules audit_math.bravo --repeat 10
+"""
+import argparse, json, os, platform, subprocess, sys
+from typing import Any, Callable, Dict, List
+
+from audit_math import distributions
+
+MODULES = ["audit_math.bravo", "arlo_server"]
+
+# Runs in a fresh process: imports the module, then computes a sample size,
+# and prints how long each took.
+MEASURE = """
+import json, time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+from audit_math import bravo, distributions
+distributions.set_backend({backend!r})
+bravo.bravo_sample_sizes(0.1, 0.55, 0.45, 0, 0, 0.9)
+computed = time.perf_counter()
+print(json.dumps({{
+    "importSeconds": imported - start,
+    "firstSampleSizeSeconds": computed - imported,
+}}))
+"""
+
+
+def measure(module: str, backend: str, repeat: int) -> Dict[str, float]:
+    """
+    Imports <module> and computes a sample size in <repeat> fresh processes,
+    and returns the fastest times.
+    """
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", MEASURE.format(module=module, backend=backend)],
+            check=True,
+            stdout=subprocess.PIPE,
+            # Importing arlo_server needs the server's config, which is set up
+            # for tests by default
+            env={"FLASK_ENV": "test", **os.environ},
+        ).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+    return {key: min(run[key] for run in runs) for key in runs[0]}
+
+
+def run_benchmarks(
+    modules: List[str],
+    backends: List[str],
+    repeat: int = 5,
+    log: Callable[[str], None] = lambda message: None,
+) -> List[Dict[str, Any]]:
+    results = []
+    for module in modules:
+        for backend in backends:
+            result = {
+                "module": module,
+                "backend": backend,
+                **measure(module, backend, repeat),
+            }
+            log(json.dumps(result))
+            results.append(result)
+    return results
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.import_benchmark",
+        description="Benchmark importing the audit math and computing a first"
+        " sample size in a fresh process.",
+    )
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        choices=list(distributions.BACKENDS),
+        default=list(distributions.BACKENDS),
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    results = {
+        "benchmark": "import",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": run_benchmarks(
+            args.modules,
+            args.backends,
+            args.repeat,
+            log=lambda message: print(message, file=sys.stderr),
+        ),
+    }
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,199 @@
+"""
+Benchmarks for drawing samples with `audit_math.sampler`.
+
+Builds synthetic manifests (and, for PPEB sampling, batch results) of various
+sizes and batch size distributions, then times and memory-profiles
+`draw_sample` and `draw_ppeb_sample` at several sample sizes and numbers of
+previously sampled tickets. Results are printed (or written to a file) as
+JSON, so that runs from different releases can be compared:
+
+    python -m benchmarks.sampler_benchmark --output results.json
+    python -m benchmarks.sampler_benchmark --ballots 10000 100000 --repeat 3
+"""
+import argparse, json, platform, sys, time, tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+import numpy as np
+
+from audit_math import sampler
+from audit_math.sampler_contest import Contest
+
+SEED = "12345678901234567890abcdefghijklmnopqrstuvwxyz😊"
+
+NUM_BALLOTS = [10_000, 100_000, 1_000_000, 10_000_000]
+SAMPLE_SIZES = [100, 10_000]
+NUM_SAMPLED = [0, 5_000]
+
+AVERAGE_BATCH_SIZE = 500
+NUM_JURISDICTIONS = 50
+
+# Batch size distributions, each a function from (random state, number of
+# batches) to relative batch sizes. Real manifests tend to have many small
+# batches and a few very large ones (e.g. central count vs. precincts), which
+# "skewed" approximates with a heavy-tailed lognormal.
+DISTRIBUTIONS: Dict[str, Callable[[np.random.RandomState, int], np.ndarray]] = {
+    "uniform": lambda rand, num_batches: np.ones(num_batches),
+    "skewed": lambda rand, num_batches: rand.lognormal(0, 1.5, num_batches),
+}
+
+
+def synthetic_manifest(
+    num_ballots: int, distribution: str
+) -> Dict[Tuple[str, str], int]:
+    """
+    Builds a manifest with about <num_ballots> ballots, keyed by
+    (jurisdiction, batch) like the manifests the server samples from.
+    """
+    rand = np.random.RandomState(314159)
+    num_batches = max(num_ballots // AVERAGE_BATCH_SIZE, 1)
+    weights = DISTRIBUTIONS[distribution](rand, num_batches)
+    batch_sizes = np.maximum(
+        np.floor(weights / weights.sum() * num_ballots).astype(int), 1
+    )
+    return {
+        (f"J{batch % NUM_JURISDICTIONS}", f"Batch {batch}"): int(batch_size)
+        for batch, batch_size in enumerate(batch_sizes)
+    }
+
+
+def synthetic_batch_results(
+    manifest: Dict[Tuple[str, str], int]
+) -> Tuple[Contest, Dict[str, Dict[str, Dict[str, int]]]]:
+    """
+    Builds a two candidate contest with per-batch results for every batch in
+    the manifest, for PPEB sampling.
+    """
+    rand = np.random.RandomState(271828)
+    batch_results = {}
+    for (jurisdiction, batch), num_ballots in manifest.items():
+        winner_votes = int(rand.binomial(num_ballots, 0.55))
+        batch_results[f"{jurisdiction} {batch}"] = {
+            "Contest": {
+                "winner": winner_votes,
+                "loser": num_ballots - winner_votes,
+                "ballots": num_ballots,
+            }
+        }
+    contest = Contest(
+        "Contest",
+        {
+            "winner": sum(r["Contest"]["winner"] for r in batch_results.values()),
+            "loser": sum(r["Contest"]["loser"] for r in batch_results.values()),
+            "ballots": sum(manifest.values()),
+            "numWinners": 1,
+            "votesAllowed": 1,
+        },
+    )
+    return contest, batch_results
+
+
+def measure(run: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """
+    Runs <run> <repeat> times to find the fastest time, then once more with
+    tracemalloc to find its peak memory use (tracemalloc slows down
+    allocation-heavy code, so we don't time that run).
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"seconds": min(times), "peakMemoryBytes": peak_memory}
+
+
+def run_benchmarks(
+    num_ballots: List[int],
+    distributions: List[str],
+    sample_sizes: List[int],
+    num_sampled: List[int],
+    repeat: int = 1,
+    log: Callable[[str], None] = lambda message: None,
+) -> List[Dict[str, Any]]:
+    results = []
+    for ballots in num_ballots:
+        for distribution in distributions:
+            manifest = synthetic_manifest(ballots, distribution)
+            contest, batch_results = synthetic_batch_results(manifest)
+            for sample_size in sample_sizes:
+                for already_sampled in num_sampled:
+                    for function, run in [
+                        (
+                            "draw_sample",
+                            lambda: sampler.draw_sample(
+                                SEED, manifest, sample_size, already_sampled
+                            ),
+                        ),
+                        (
+                            "draw_ppeb_sample",
+                            lambda: sampler.draw_ppeb_sample(
+                                SEED,
+                                contest,
+                                sample_size,
+                                already_sampled,
+                                batch_results,
+                            ),
+                        ),
+                    ]:
+                        result = {
+                            "function": function,
+                            "numBallots": sum(manifest.values()),
+                            "numBatches": len(manifest),
+                            "distribution": distribution,
+                            "sampleSize": sample_size,
+                            "numSampled": already_sampled,
+                            **measure(run, repeat),
+                        }
+                        log(json.dumps(result))
+                        results.append(result)
+    return results
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.sampler_benchmark",
+        description="Benchmark drawing samples from synthetic manifests.",
+    )
+    parser.add_argument("--ballots", type=int, nargs="+", default=NUM_BALLOTS)
+    parser.add_argument(
+        "--distributions",
+        nargs="+",
+        choices=list(DISTRIBUTIONS),
+        default=list(DISTRIBUTIONS),
+    )
+    parser.add_argument("--sample-sizes", type=int, nargs="+", default=SAMPLE_SIZES)
+    parser.add_argument("--num-sampled", type=int, nargs="+", default=NUM_SAMPLED)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    results = {
+        "benchmark": "sampler",
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": run_benchmarks(
+            args.ballots,
+            args.distributions,
+            args.sample_sizes,
+            args.num_sampled,
+            args.repeat,
+            log=lambda message: print(message, file=sys.stderr),
+        ),
+    }
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
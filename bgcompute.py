@@ -4,6 +4,8 @@ from arlo_server import db
 from arlo_server.models import Election, File, Jurisdiction, RoundContest
 from arlo_server.routes import compute_sample_sizes
 from arlo_server.ballot_manifest import process_ballot_manifest_file
+from arlo_server.batch_tallies import process_batch_tallies_file
+from arlo_server.sample_sizes import evict_sample_cache
 from util.jurisdiction_bulk_update import process_jurisdictions_file
 
 
@@ -11,6 +13,8 @@ def bgcompute():
     bgcompute_compute_round_contests_sample_sizes()
     bgcompute_update_election_jurisdictions_file()
     bgcompute_update_ballot_manifest_file()
+    bgcompute_update_batch_tallies_file()
+    bgcompute_evict_sample_cache()
 
 
 def bgcompute_compute_round_contests_sample_sizes():
@@ -74,6 +78,32 @@ def bgcompute_update_ballot_manifest_file() -> int:
     return len(files)
 
 
+def bgcompute_update_batch_tallies_file() -> int:
+    files = (
+        File.query.join(Jurisdiction, File.id == Jurisdiction.batch_tallies_file_id)
+        .filter(File.processing_started_at.is_(None))
+        .all()
+    )
+
+    for file in files:
+        try:
+            jurisdiction = Jurisdiction.query.filter_by(
+                batch_tallies_file_id=file.id
+            ).one()
+            process_batch_tallies_file(db.session, jurisdiction, file)
+        except Exception:
+            print("ERROR updating batch tallies file")
+
+    return len(files)
+
+
+def bgcompute_evict_sample_cache():
+    try:
+        evict_sample_cache()
+    except Exception:
+        print("ERROR evicting cached samples")
+
+
 def bgcompute_forever():
     while True:
         bgcompute()
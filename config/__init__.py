@@ -118,6 +118,26 @@ def read_http_origin() -> str:
 HTTP_ORIGIN = read_http_origin()
 
 
+def read_sampler_processes() -> int:
+    # Sampling ballots for elections with many jurisdictions can be sharded
+    # by jurisdiction across a pool of worker processes. This is off (0) by
+    # default, in which case sampling runs in the request's process.
+    return int(os.environ.get("ARLO_SAMPLER_PROCESSES", "0"))
+
+
+SAMPLER_PROCESSES = read_sampler_processes()
+
+
+def read_distributions_backend() -> str:
+    # The implementation of the probability distributions used to compute
+    # sample sizes and risk measurements: "scipy" (the default) or "numpy",
+    # which doesn't need to import scipy. See audit_math/distributions.py.
+    return os.environ.get("ARLO_DISTRIBUTIONS_BACKEND", "scipy")
+
+
+DISTRIBUTIONS_BACKEND = read_distributions_backend()
+
+
 def read_superadmin_auth0_creds() -> Tuple[str, str, str, str]:
     return (
         os.environ.get("ARLO_SUPERADMIN_AUTH0_BASE_URL", ""),
@@ -97,3 +97,8 @@ def sampler(
     output: Literal["id", "tuple", "ticket"] = ...,
     digits: int = ...,
 ) -> Union[Iterable[Id], Iterable[Tuple[str, str, int]], Iterable[Ticket]]: ...
+def trim(x: str, mantissa_display_length: int = ...) -> str: ...
+def sha256_hex(hash_input: Any) -> str: ...
+def sha256_uniform(hash_input: Any) -> str: ...
+def first_ticket(id: Id, seed: Any, seed_hash: str = ...) -> Ticket[Id]: ...
+def next_ticket(ticket: Ticket[Id]) -> Ticket[Id]: ...
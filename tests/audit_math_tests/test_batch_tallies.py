@@ -0,0 +1,114 @@
+import pytest
+import numpy as np
+
+from audit_math import macro, sampler
+from audit_math.batch_tallies import BatchTallies
+from audit_math.sampler_contest import Contest
+
+SEED = "12345678901234567890abcdefghijklmnopqrstuvwxyz😊"
+RISK_LIMIT = 0.1
+
+
+contest_info = {"ballots": 10000, "numWinners": 1, "votesAllowed": 1}
+
+
+@pytest.fixture
+def contest():
+    return Contest("Contest", {"winner": 5500, "loser": 4000, **contest_info})
+
+
+@pytest.fixture
+def tallies():
+    return BatchTallies(
+        "Contest",
+        [f"Batch {i}" for i in range(100)],
+        ["loser", "winner"],
+        np.array([[40 - i % 3, 55 + i % 5] for i in range(100)]),
+        np.full(100, 100),
+    )
+
+
+def nested_results(tallies: BatchTallies):
+    return {
+        batch: {
+            tallies.contest_name: {
+                **dict(zip(tallies.choices, votes.tolist())),
+                "ballots": int(ballots),
+            }
+        }
+        for batch, votes, ballots in zip(
+            tallies.batches, tallies.votes, tallies.ballots
+        )
+    }
+
+
+def test_dump_and_load(tallies):
+    loaded = BatchTallies.load(tallies.dump())
+    assert loaded.contest_name == tallies.contest_name
+    assert loaded.batches == tallies.batches
+    assert loaded.choices == tallies.choices
+    assert (loaded.votes == tallies.votes).all()
+    assert (loaded.ballots == tallies.ballots).all()
+
+    # Tuple batch ids survive the round trip
+    combined = BatchTallies.combine({"J1": tallies})
+    assert BatchTallies.load(combined.dump()).batches == combined.batches
+
+
+def test_combine(tallies):
+    other = BatchTallies(
+        "Contest",
+        ["Batch 0", "Batch 1"],
+        ["winner", "other"],
+        np.array([[10, 2], [20, 3]]),
+        np.array([15, 25]),
+    )
+    combined = BatchTallies.combine({"J1": tallies, "J2": other})
+
+    assert len(combined) == 102
+    assert combined.batches[:2] == [("J1", "Batch 0"), ("J1", "Batch 1")]
+    assert combined.batches[-2:] == [("J2", "Batch 0"), ("J2", "Batch 1")]
+    assert combined.choices == ["loser", "winner", "other"]
+    assert combined.votes[0].tolist() == [40, 55, 0]
+    assert combined.votes[-1].tolist() == [0, 20, 3]
+    assert combined.ballots[-2:].tolist() == [15, 25]
+
+    with pytest.raises(AssertionError, match="one contest"):
+        BatchTallies.combine(
+            {
+                "J1": tallies,
+                "J2": BatchTallies(
+                    "Other", [], ["winner"], np.zeros((0, 1)), np.zeros(0)
+                ),
+            }
+        )
+
+
+def test_macro_with_tallies(contest, tallies):
+    # The MACRO functions give the same results from the tallies as from the
+    # equivalent nested dicts
+    batch_results = nested_results(tallies)
+    index = macro.MacroContestIndex(contest, tallies)
+    dict_index = macro.MacroContestIndex(contest, batch_results)
+
+    assert index.u_p.tolist() == dict_index.u_p.tolist()
+    assert index.U == dict_index.U
+    assert macro.compute_U(tallies, contest) == macro.compute_U(batch_results, contest)
+    assert macro.get_sample_sizes(
+        RISK_LIMIT, contest, tallies, {}
+    ) == macro.get_sample_sizes(RISK_LIMIT, contest, batch_results, {})
+
+    sample = sampler.draw_ppeb_sample(SEED, contest, 20, 0, tallies)
+    assert sample == sampler.draw_ppeb_sample(SEED, contest, 20, 0, batch_results)
+
+    sample_results = {
+        batch: {"Contest": {"winner": 50, "loser": 45}} for _, batch, _ in sample
+    }
+    assert macro.compute_risk(
+        RISK_LIMIT, contest, tallies, sample_results, index
+    ) == macro.compute_risk(RISK_LIMIT, contest, batch_results, sample_results)
+
+    with pytest.raises(AssertionError, match="different contest"):
+        macro.MacroContestIndex(
+            Contest("Other", {**contest.candidates, **contest_info}), tallies
+        )
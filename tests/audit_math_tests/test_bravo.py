@@ -1,6 +1,7 @@
 # pylint: disable=invalid-name
 import math
 import pytest
+from scipy import stats
 
 from audit_math import bravo
 from audit_math.sampler_contest import Contest
@@ -203,6 +204,95 @@ def test_bravo_sample_sizes_round1_incomplete():
     )
 
 
+def linear_first_size_attaining_risk_limit(
+    size, p_completion, p_w2, plus, minus, threshold
+):
+    # Reference implementation, checking one sample size at a time
+    while True:
+        x_c = stats.binom.ppf(1.0 - p_completion, size, p_w2)
+        test_stat = x_c * plus + (size - x_c) * minus
+        if test_stat > threshold:
+            return size
+        size += 1
+
+
+def test_bravo_sample_sizes_matches_linear_search(monkeypatch):
+    for margin in [0.3, 0.1, 0.05, 0.02, 0.01, 0.005, 0.002]:
+        for risk_limit in [0.01, 0.05, 0.1, 0.2]:
+            for p_completion in [0.52, 0.7, 0.8, 0.9]:
+                for sample_w, sample_r in [(0, 0), (60, 40), (40, 60)]:
+                    args = (
+                        risk_limit,
+                        0.5 + margin / 2 - 0.01,
+                        0.5 - margin / 2 - 0.01,
+                        sample_w,
+                        sample_r,
+                        p_completion,
+                    )
+                    size = bravo.bravo_sample_sizes(*args)
+                    with monkeypatch.context() as patch:
+                        patch.setattr(
+                            bravo,
+                            "first_size_attaining_risk_limit",
+                            linear_first_size_attaining_risk_limit,
+                        )
+                        assert size == bravo.bravo_sample_sizes(*args), args
+
+
+def test_bravo_sample_size_curve():
+    p_completions = [round(0.5 + 0.01 * i, 2) for i in range(50)]
+    for margin in [0.3, 0.05, 0.01, 0.002]:
+        for risk_limit in [0.01, 0.1, 0.2]:
+            for sample_w, sample_r in [(0, 0), (60, 40), (40, 60), (300, 100)]:
+                args = (
+                    risk_limit,
+                    0.5 + margin / 2 - 0.01,
+                    0.5 - margin / 2 - 0.01,
+                    sample_w,
+                    sample_r,
+                )
+                assert list(bravo.bravo_sample_size_curve(*args, p_completions)) == [
+                    bravo.bravo_sample_sizes(*args, p_completion)
+                    for p_completion in p_completions
+                ], args
+
+
+def test_first_round_sample_size_curve(monkeypatch):
+    p_completions = [0.7, 0.8, 0.9]
+    for margin in [0.3, 0.05, 0.01]:
+        for risk_limit in [0.01, 0.1]:
+            args = (risk_limit, 0.5 + margin / 2 - 0.01, 0.5 - margin / 2 - 0.01)
+            expected = list(bravo.bravo_sample_size_curve(*args, 0, 0, p_completions))
+            assert (
+                list(bravo.first_round_sample_size_curve(*args, p_completions))
+                == expected
+            )
+
+            # Later lookups come from the table
+            with monkeypatch.context() as patch:
+                patch.setattr(bravo, "two_way_sample_sizes", None)
+                assert (
+                    list(bravo.first_round_sample_size_curve(*args, p_completions))
+                    == expected
+                )
+
+
+def test_get_sample_size_curve(contests):
+    quants = [0.7, 0.8, 0.9]
+    for contest in contests:
+        computed = bravo.get_sample_size_curve(
+            RISK_LIMIT, contests[contest], round0_sample_results[contest], quants
+        )
+        expected = true_sample_sizes[contest]
+        if contests[contest].num_winners != 1:
+            assert computed is None
+        elif "0.7" not in expected:
+            # Landslides only have an ASN option
+            assert computed == [1, 1, 1]
+        else:
+            assert computed == [expected[str(quant)]["size"] for quant in quants]
+
+
 def test_get_sample_size(contests):
 
     for contest in contests:
@@ -379,6 +469,55 @@ def test_compute_risk_empty(contests):
         )
 
 
+def test_test_statistics_match_pairwise_products():
+    # A contest with dozens of write-in choices
+    votes = {"cand1": 5000, "cand2": 4000, "cand3": 900}
+    votes.update({f"write-in{i}": i for i in range(40)})
+    contest = Contest(
+        "writeins",
+        {**votes, "ballots": sum(votes.values()), "numWinners": 2, "votesAllowed": 2},
+    )
+    sample = {"cand1": 60, "cand2": 45, "cand3": 10, "write-in39": 1, "write-in0": 0}
+
+    T = bravo.get_test_statistics(contest.margins, sample)
+
+    winners = contest.margins["winners"]
+    losers = contest.margins["losers"]
+    assert list(T) == [(winner, loser) for winner in winners for loser in losers]
+    for (winner, loser), value in T.items():
+        swl = winners[winner]["swl"][loser]
+        expected = (swl / 0.5) ** sample.get(winner, 0) * (
+            (1 - swl) / 0.5
+        ) ** sample.get(loser, 0)
+        assert value == pytest.approx(expected, rel=1e-9)
+
+
+def test_compute_risk_large_sample():
+    # T* for samples this large overflows floats, so the risk underflows to
+    # 0 rather than raising
+    contest = Contest(
+        "large",
+        {
+            "cand1": 600000,
+            "cand2": 400000,
+            "ballots": 1000000,
+            "numWinners": 1,
+            "votesAllowed": 1,
+        },
+    )
+    risk, finished = bravo.compute_risk(
+        RISK_LIMIT, contest, {"cand1": 600000, "cand2": 400000}
+    )
+    assert risk == {("cand1", "cand2"): 0.0}
+    assert finished
+
+    risk, finished = bravo.compute_risk(
+        RISK_LIMIT, contest, {"cand1": 400000, "cand2": 600000}
+    )
+    assert risk == {("cand1", "cand2"): math.inf}
+    assert not finished
+
+
 bravo_contests = {
     "test1": {
         "cand1": 600,
@@ -0,0 +1,126 @@
+import pytest
+import numpy as np
+
+from audit_math import bravo, bravo_simulation
+from audit_math.sampler_contest import Contest
+
+RISK_LIMIT = 0.1
+
+
+@pytest.fixture
+def contest():
+    return Contest(
+        "Contest",
+        {
+            "cand1": 600,
+            "cand2": 350,
+            "ballots": 1000,
+            "numWinners": 1,
+            "votesAllowed": 1,
+        },
+    )
+
+
+def test_completion_probabilities_match_sample_sizes(contest):
+    sample_results = {"cand1": 0, "cand2": 0}
+    options = bravo.get_sample_size(RISK_LIMIT, contest, sample_results)
+    quants = ["0.7", "0.8", "0.9"]
+
+    probabilities = bravo_simulation.completion_probabilities(
+        RISK_LIMIT,
+        contest,
+        [options[quant]["size"] for quant in quants],
+        num_trials=20_000,
+        seed=12345,
+    )
+
+    # BRAVO's sample sizes are conservative approximations
+    for quant, probability in zip(quants, probabilities):
+        assert float(quant) - 0.02 <= probability <= float(quant) + 0.05
+
+
+def test_completion_probabilities_unsorted(contest):
+    args = (RISK_LIMIT, contest)
+    sorted_probabilities = bravo_simulation.completion_probabilities(
+        *args, [5, 100, 300], num_trials=1000, seed=1
+    )
+    assert sorted_probabilities[0] == 0
+    assert sorted_probabilities[1] < sorted_probabilities[2]
+
+    assert bravo_simulation.completion_probabilities(
+        *args, [300, 5, 100], num_trials=1000, seed=1
+    ) == [sorted_probabilities[2], sorted_probabilities[0], sorted_probabilities[1]]
+
+
+def test_simulation_reproducible(contest, monkeypatch):
+    # Use several chunks of trials, so that they're spread over the processes
+    monkeypatch.setattr(bravo_simulation, "TRIALS_PER_CHUNK", 300)
+    args = (RISK_LIMIT, contest, [50, 100, 200], 1000)
+
+    complete = bravo_simulation.simulate_audits(*args, seed=42)
+    assert complete.shape == (1000, 3)
+    assert (bravo_simulation.simulate_audits(*args, seed=42) == complete).all()
+    assert (
+        bravo_simulation.simulate_audits(*args, seed=42, processes=2) == complete
+    ).all()
+
+
+def test_round_distribution(contest):
+    sample_sizes = [100, 200, 400]
+    distribution = bravo_simulation.round_distribution(
+        RISK_LIMIT, contest, sample_sizes, num_trials=5000, seed=7
+    )
+    assert len(distribution) == 4
+    assert sum(distribution) == pytest.approx(1)
+
+    # The first round completes about as often as a one round audit of that
+    # size
+    assert distribution[0] == pytest.approx(
+        bravo_simulation.completion_probabilities(
+            RISK_LIMIT, contest, [100], num_trials=5000, seed=7
+        )[0],
+        abs=0.03,
+    )
+
+    # Every audit would complete within the rounds if they could go on
+    # forever, but a few don't complete within these rounds
+    assert 0 < distribution[-1] < 0.05
+
+
+def test_audits_complete_matches_compute_risk():
+    contest = Contest(
+        "Multi-winner Contest",
+        {
+            "cand1": 500,
+            "cand2": 400,
+            "cand3": 300,
+            "cand4": 100,
+            "ballots": 700,
+            "numWinners": 2,
+            "votesAllowed": 2,
+        },
+    )
+    for votes in [[50, 40, 30, 10], [150, 140, 70, 10], [0, 0, 0, 0], [90, 0, 0, 0]]:
+        _, finished = bravo.compute_risk(
+            RISK_LIMIT, contest, dict(zip(contest.candidates, votes))
+        )
+        assert (
+            bravo_simulation.audits_complete(RISK_LIMIT, contest, np.array(votes))
+            == finished
+        ), votes
+
+    probabilities = bravo_simulation.completion_probabilities(
+        RISK_LIMIT, contest, [50, 200, 400], num_trials=2000, seed=3
+    )
+    assert probabilities == sorted(probabilities)
+    assert probabilities[-1] > 0.5
+
+
+def test_simulation_no_losers():
+    contest = Contest(
+        "Uncontested",
+        {"cand1": 600, "ballots": 1000, "numWinners": 1, "votesAllowed": 1},
+    )
+    assert bravo_simulation.completion_probabilities(
+        RISK_LIMIT, contest, [100, 1000], num_trials=100, seed=1
+    ) == [0, 0]
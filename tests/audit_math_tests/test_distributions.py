@@ -0,0 +1,100 @@
+import os, subprocess, sys
+import numpy as np
+import pytest
+from scipy import special, stats
+
+from audit_math import bravo, distributions
+
+NUMPY = distributions.NumpyBackend()
+
+
+@pytest.fixture
+def numpy_backend():
+    distributions.set_backend("numpy")
+    yield
+    distributions.set_backend("scipy")
+
+
+def test_norm_ppf():
+    q = np.linspace(0, 1, 1001)
+    assert NUMPY.norm_ppf(q) == pytest.approx(stats.norm.ppf(q), rel=1e-12)
+    assert NUMPY.norm_ppf(0.9) == pytest.approx(stats.norm.ppf(0.9), rel=1e-12)
+    assert np.isnan(NUMPY.norm_ppf(1.5))
+
+
+def test_norm_cdf():
+    x = np.linspace(-30, 30, 1001)
+    assert NUMPY.norm_cdf(x) == pytest.approx(stats.norm.cdf(x), rel=1e-9)
+    assert NUMPY.norm_cdf(-1.5) == pytest.approx(stats.norm.cdf(-1.5), rel=1e-12)
+
+
+def test_betainc():
+    rand = np.random.RandomState(12345)
+    a = np.concatenate([rand.uniform(0.5, 20, 100), rand.uniform(1, 1e6, 100)])
+    b = np.concatenate([rand.uniform(0.5, 20, 100), rand.uniform(1, 1e6, 100)])
+    x = rand.uniform(0, 1, 200)
+    assert distributions.betainc(a, b, x) == pytest.approx(
+        special.betainc(a, b, x), abs=1e-9
+    )
+    assert list(distributions.betainc(3, 4, [0, 1])) == [0, 1]
+
+
+def test_binom_ppf():
+    q = np.array([0, 1e-6, 0.01, 0.1, 0.2, 0.3, 0.48, 0.5, 0.7, 0.9, 0.99, 1])
+    for n in [0, 1, 2, 5, 10, 37, 100, 1000, 12345, 100000, 3572660]:
+        for p in [0.01, 0.3, 0.5, 0.501, 0.6, 0.9, 0.99]:
+            computed = NUMPY.binom_ppf(q, n, p)
+            expected = stats.binom.ppf(q, n, p)
+            for i in np.nonzero(computed != expected)[0]:
+                # The CDF can tie with q up to rounding error, in which case
+                # either quantile is right
+                k = min(computed[i], expected[i])
+                assert abs(computed[i] - expected[i]) == 1, (q[i], n, p)
+                assert stats.binom.cdf(k, n, p) == pytest.approx(q[i], rel=1e-12)
+
+    # Invalid parameters, and broadcasting
+    assert np.isnan(NUMPY.binom_ppf(0.5, -1, 0.5))
+    assert np.isnan(NUMPY.binom_ppf(0.5, 2.5, 0.5))
+    assert np.isnan(NUMPY.binom_ppf(0.5, 10, 1.5))
+    sizes = np.arange(100, 110)
+    assert list(NUMPY.binom_ppf(0.1, sizes, 0.55)) == list(
+        stats.binom.ppf(0.1, sizes, 0.55)
+    )
+
+
+def test_bravo_sample_sizes_with_numpy_backend(
+    numpy_backend,  # pylint: disable=redefined-outer-name,unused-argument
+):
+    assert isinstance(distributions.get_backend(), distributions.NumpyBackend)
+    for margin in [0.3, 0.05, 0.01]:
+        for risk_limit in [0.01, 0.1]:
+            for p_completion in [0.52, 0.7, 0.9]:
+                args = (risk_limit, 0.5 + margin / 2 - 0.01, 0.5 - margin / 2 - 0.01)
+                distributions.set_backend("scipy")
+                expected = bravo.bravo_sample_sizes(*args, 60, 40, p_completion)
+                expected_prob = bravo.expected_prob(*args, 60, 40, expected)
+                distributions.set_backend("numpy")
+                assert bravo.bravo_sample_sizes(*args, 60, 40, p_completion) == expected
+                assert bravo.expected_prob(*args, 60, 40, expected) == expected_prob
+
+
+def test_set_backend():
+    with pytest.raises(ValueError, match="Unknown distributions backend: magic"):
+        distributions.set_backend("magic")
+    assert isinstance(distributions.get_backend(), distributions.ScipyBackend)
+
+
+def test_scipy_imported_lazily():
+    check = (
+        "import sys\n"
+        "from audit_math import bravo, distributions\n"
+        "assert 'scipy' not in sys.modules\n"
+        "distributions.set_backend('numpy')\n"
+        "bravo.bravo_sample_sizes(0.1, 0.6, 0.4, 0, 0, 0.9)\n"
+        "assert 'scipy' not in sys.modules\n"
+        "distributions.set_backend('scipy')\n"
+        "bravo.bravo_sample_sizes(0.1, 0.6, 0.4, 0, 0, 0.9)\n"
+        "assert 'scipy' in sys.modules\n"
+    )
+    repo_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    subprocess.run([sys.executable, "-c", check], check=True, cwd=repo_root)
@@ -1,6 +1,9 @@
+import math
 import pytest
+import numpy as np
 
 from audit_math import macro
+from audit_math.batch_tallies import BatchTallies
 from audit_math.sampler_contest import Contest
 
 SEED = "12345678901234567890abcdefghijklmnopqrstuvwxyz😊"
@@ -170,3 +173,306 @@ def test_compute_risk(contests, batches):
         )
 
         assert result, "Audit did not terminate but should have"
+
+
+def test_contest_index(contests, batches):
+    sample = {
+        "Batch 0": {
+            "Contest A": {"winner": 190, "loser": 190},
+            "Contest B": {"winner": 200, "loser": 160},
+            "Contest C": {"winner": 200, "loser": 140},
+        },
+        "Batch 1": {
+            "Contest A": {"winner": 200, "loser": 180},
+            "Contest B": {"winner": 200, "loser": 160},
+            "Contest C": {"winner": 210, "loser": 130},
+        },
+    }
+
+    for contest in contests.values():
+        index = macro.MacroContestIndex(contest, batches)
+
+        # The index's error bounds match the batch-by-batch computations
+        assert index.max_errors == {
+            batch: macro.compute_max_error(batches[batch], contest) for batch in batches
+        }
+        assert index.U == macro.compute_U(batches, contest)
+        assert index.batches == sorted(batches)
+        assert index.cumulative_errors[-1] == pytest.approx(index.U)
+        assert index.errors(sample).tolist() == [
+            macro.compute_error(batches[batch], contest, sample[batch])
+            for batch in sample
+        ]
+
+        # So the MACRO functions give the same results with the index
+        assert macro.compute_U(batches, contest, index) == index.U
+        assert macro.get_sample_sizes(
+            RISK_LIMIT, contest, batches, {}, index
+        ) == macro.get_sample_sizes(RISK_LIMIT, contest, batches, {})
+        assert macro.compute_risk(
+            RISK_LIMIT, contest, batches, sample, index
+        ) == macro.compute_risk(RISK_LIMIT, contest, batches, sample)
+
+
+def test_contest_index_arrays():
+    contest = Contest(
+        "Multi-winner",
+        {
+            "cand1": 5000,
+            "cand2": 4000,
+            "cand3": 2500,
+            "cand4": 1000,
+            "ballots": 7000,
+            "numWinners": 2,
+            "votesAllowed": 2,
+        },
+    )
+    batches = {
+        f"Batch {i}": {
+            "Multi-winner": {
+                "cand1": 50 + i % 7,
+                "cand2": 40 + i % 5,
+                "cand3": 25 + i % 3,
+                "cand4": 10 + i % 4,
+                "ballots": 70,
+            }
+        }
+        for i in range(100)
+    }
+    batches["No contest"] = {"Other": {"cand1": 10, "ballots": 10}}
+    sample = {
+        f"Batch {i}": {
+            "Multi-winner": {
+                "cand1": 45 + i % 11,
+                "cand2": 40,
+                "cand3": 25 + i % 2,
+                "cand4": 12,
+            }
+        }
+        for i in range(0, 100, 9)
+    }
+
+    index = macro.MacroContestIndex(contest, batches)
+    assert index.reported_votes.shape == (101, 4)
+    assert index.margins.tolist() == [[2500, 4000], [1500, 3000]]
+    assert index.max_errors["No contest"] == 0
+
+    # The vectorized computations match the scalar ones batch by batch
+    assert index.u_p.tolist() == [
+        macro.compute_max_error(batches[batch], contest) for batch in batches
+    ]
+    e_p = [
+        macro.compute_error(batches[batch], contest, sample[batch]) for batch in sample
+    ]
+    assert index.errors(sample).tolist() == e_p
+    taints = [
+        error / macro.compute_max_error(batches[batch], contest)
+        for error, batch in zip(e_p, sample)
+    ]
+    assert index.taints(sample).tolist() == taints
+
+    p = 1.0
+    p_values = []
+    for taint in taints:
+        p *= (1 - 1 / index.U) / (1 - taint)
+        p_values.append(p)
+    assert index.p_values(sample).tolist() == p_values
+
+    assert macro.compute_risk(0.1, contest, batches, {}, index) == (1.0, False)
+    assert macro.compute_risk(0.1, contest, batches, sample, index) == (
+        p_values[-1],
+        p_values[-1] < 0.1,
+    )
+
+    # Batches without the contest can't overstate the margins, so they have
+    # no taint, rather than nan
+    with np.errstate(all="raise"):
+        no_contest = {"No contest": {"Multi-winner": {"cand4": 10}}}
+        assert index.taints(no_contest).tolist() == [0.0]
+        assert index.p_values(no_contest).tolist() == [1 - 1 / index.U]
+
+
+def test_contest_index_p_values_stop():
+    contest = Contest(
+        "Contest",
+        {
+            "winner": 600,
+            "loser": 400,
+            "ballots": 1000,
+            "numWinners": 1,
+            "votesAllowed": 1,
+        },
+    )
+    batches = {
+        f"Batch {i}": {"Contest": {"winner": 60, "loser": 40, "ballots": 100}}
+        for i in range(10)
+    }
+    sample = {batch: batches[batch] for batch in batches}
+    index = macro.MacroContestIndex(contest, batches)
+
+    # The p-values stop at the first one that meets the risk limit, as the
+    # audit would
+    p_values = index.p_values(sample).tolist()
+    stopped = next(i for i, p in enumerate(p_values) if p < RISK_LIMIT)
+    assert 0 < stopped < len(p_values) - 1
+    assert index.p_values(sample, RISK_LIMIT).tolist() == p_values[: stopped + 1]
+    assert macro.compute_risk(RISK_LIMIT, contest, batches, sample, index) == (
+        p_values[stopped],
+        True,
+    )
+
+
+def test_audit_index_across_contests(contests, batches):
+    index = macro.MacroAuditIndex(list(contests.values()), batches)
+
+    # Each batch's error bound is the largest of any contest's
+    assert index.max_errors == {
+        batch: max(
+            macro.compute_max_error(batches[batch], contest)
+            for contest in contests.values()
+        )
+        for batch in batches
+    }
+    assert index.U == pytest.approx(sum(index.max_errors.values()))
+    assert index.batches == sorted(batches)
+    assert index.cumulative_errors[-1] == pytest.approx(index.U)
+
+    # One shared sample is smaller than a sample for each contest, but still
+    # big enough for the hardest contest
+    sample_size = macro.get_sample_size_across_contests(
+        RISK_LIMIT, list(contests.values()), batches, index
+    )
+    contest_sample_sizes = [
+        macro.get_sample_sizes(RISK_LIMIT, contest, batches, {})
+        for contest in contests.values()
+    ]
+    assert max(contest_sample_sizes) <= sample_size < sum(contest_sample_sizes)
+
+    # Each sampled batch's error is the largest of any contest's
+    sample = {
+        "Batch 0": {
+            "Contest A": {"winner": 200, "loser": 180},
+            "Contest B": {"winner": 190, "loser": 170},
+            "Contest C": {"winner": 200, "loser": 140},
+        },
+        "Batch 100": {
+            "Contest A": {"winner": 210, "loser": 170},
+            "Contest C": {"winner": 200, "loser": 140},
+        },
+        "Batch 150 AV": {"Contest A": {"winner": 90, "loser": 100}},
+    }
+    assert index.errors(sample).tolist() == [
+        max(
+            macro.compute_error(batches[batch], contest, sample[batch])
+            for contest in contests.values()
+            if contest.name in batches[batch]
+        )
+        for batch in sample
+    ]
+    # and its taint is that error over its across-contest error bound
+    with np.errstate(all="raise"):
+        assert index.taints(sample).tolist() == [
+            index.errors({batch: sample[batch]})[0] / index.max_errors[batch]
+            for batch in sample
+        ]
+    assert macro.compute_risk_across_contests(
+        RISK_LIMIT, list(contests.values()), batches, sample
+    ) == macro.compute_risk_across_contests(
+        RISK_LIMIT, list(contests.values()), batches, sample, index
+    )
+
+    # With one contest, the audit is the contest's audit
+    contest = contests["Contest A"]
+    assert macro.get_sample_size_across_contests(
+        RISK_LIMIT, [contest], batches
+    ) == macro.get_sample_sizes(RISK_LIMIT, contest, batches, {})
+    assert macro.compute_risk_across_contests(
+        RISK_LIMIT, [contest], batches, sample
+    ) == macro.compute_risk(RISK_LIMIT, contest, batches, sample)
+
+    # A sample with no discrepancies confirms every contest
+    no_discrepancies = {
+        f"Batch {i}": {
+            contest: {"winner": results["winner"], "loser": results["loser"]}
+            for contest, results in batches[f"Batch {i}"].items()
+        }
+        for i in range(sample_size)
+    }
+    _, confirmed = macro.compute_risk_across_contests(
+        RISK_LIMIT, list(contests.values()), batches, no_discrepancies, index
+    )
+    assert confirmed
+
+
+def test_audit_index_taint_small_contest():
+    # A batch that barely touches a small contest can overstate its margin by
+    # as much as the batch could overstate that contest, but that's a small
+    # part of the batch's error bound across contests, so the audit can still
+    # confirm the results.
+    contests = [
+        Contest(
+            name,
+            {
+                "winner": winner,
+                "loser": loser,
+                "ballots": winner + loser,
+                "numWinners": 1,
+                "votesAllowed": 1,
+            },
+        )
+        for name, winner, loser in [("Large", 6000, 5000), ("Small", 30, 20)]
+    ]
+    batches = {
+        f"Batch {i}": {"Large": {"winner": 300, "loser": 250, "ballots": 550}}
+        for i in range(20)
+    }
+    batches["Batch 0"]["Small"] = {"winner": 1, "loser": 0, "ballots": 1}
+    batches["Small batch"] = {"Small": {"winner": 29, "loser": 20, "ballots": 49}}
+    index = macro.MacroAuditIndex(contests, batches)
+
+    sample = {
+        "Batch 0": {
+            "Large": {"winner": 300, "loser": 250},
+            "Small": {"winner": 0, "loser": 1},
+        }
+    }
+    small_index = macro.MacroContestIndex(contests[1], batches)
+    assert small_index.taints(sample).tolist() == [1.0]
+    assert index.taints(sample).tolist() == [
+        pytest.approx((2 / 10) / ((50 + 550) / 1000))
+    ]
+    p_value, _ = macro.compute_risk_across_contests(
+        RISK_LIMIT, contests, batches, sample, index
+    )
+    assert math.isfinite(p_value)
+
+
+def test_audit_index_with_tallies(contests, batches):
+    tallies = [
+        BatchTallies(
+            contest.name,
+            [batch for batch in batches if contest.name in batches[batch]],
+            list(contest.candidates),
+            np.array(
+                [
+                    [results[contest.name][choice] for choice in contest.candidates]
+                    for results in batches.values()
+                    if contest.name in results
+                ]
+            ),
+            np.array(
+                [
+                    results[contest.name]["ballots"]
+                    for results in batches.values()
+                    if contest.name in results
+                ]
+            ),
+        )
+        for contest in contests.values()
+    ]
+
+    index = macro.MacroAuditIndex(list(contests.values()), tallies)
+    dict_index = macro.MacroAuditIndex(list(contests.values()), batches)
+    assert index.max_errors == dict_index.max_errors
+    assert index.batches == dict_index.batches
+    assert index.cumulative_errors == dict_index.cumulative_errors
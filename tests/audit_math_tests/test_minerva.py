@@ -0,0 +1,206 @@
+import pytest
+import numpy as np
+from scipy import stats
+
+from audit_math import bravo, minerva
+from audit_math.sampler_contest import Contest
+
+RISK_LIMIT = 0.1
+
+
+@pytest.fixture
+def contest():
+    return Contest(
+        "Contest",
+        {
+            "cand1": 600,
+            "cand2": 400,
+            "ballots": 1000,
+            "numWinners": 1,
+            "votesAllowed": 1,
+        },
+    )
+
+
+def test_binomial_pmf():
+    for n in [0, 1, 10, 1000]:
+        for p in [0.0, 0.5, 0.6, 1.0]:
+            assert minerva.binomial_pmf(n, p) == pytest.approx(
+                stats.binom.pmf(np.arange(n + 1), n, p), abs=1e-12
+            )
+
+
+def test_compute_risk_first_round(contest):
+    for winner_votes, loser_votes in [(0, 0), (60, 40), (70, 40), (110, 80)]:
+        measurements, finished = minerva.compute_risk(
+            RISK_LIMIT, contest, {"cand1": winner_votes, "cand2": loser_votes}
+        )
+        # The ratio of the tail probabilities of the sampled winner votes
+        n = winner_votes + loser_votes
+        expected_risk = min(
+            stats.binom.sf(winner_votes - 1, n, 0.5)
+            / stats.binom.sf(winner_votes - 1, n, 0.6),
+            1.0,
+        )
+        assert measurements[("cand1", "cand2")] == pytest.approx(expected_risk)
+        assert finished == (expected_risk <= RISK_LIMIT)
+
+
+def test_compute_risk_limits_risk(contest):
+    # If the contest were a tie, the chance of the audit stopping in either
+    # of two rounds would be at most the risk limit.
+    round_sizes = [50, 120]
+    null_stopping_chance = 0.0
+    for size in round_sizes:
+        first_stopping_votes = min(
+            (
+                winner_votes
+                for winner_votes in range(size + 1)
+                if minerva.compute_risk(
+                    RISK_LIMIT,
+                    contest,
+                    {"cand1": winner_votes, "cand2": size - winner_votes},
+                    [
+                        {"cand1": previous_size, "cand2": 0}
+                        for previous_size in round_sizes
+                        if previous_size < size
+                    ],
+                )[1]
+            ),
+        )
+        null, _ = minerva.round_distributions(
+            RISK_LIMIT, 0.6, [s for s in round_sizes if s <= size]
+        )
+        null_stopping_chance += null[first_stopping_votes:].sum()
+
+    assert 0 < null_stopping_chance <= RISK_LIMIT
+
+
+def test_compute_risk_later_round(contest):
+    # Not having stopped in the first round makes it harder to stop now
+    sample_results = {"cand1": 110, "cand2": 80}
+    first_round_risks, _ = minerva.compute_risk(RISK_LIMIT, contest, sample_results)
+    later_round_risks, _ = minerva.compute_risk(
+        RISK_LIMIT, contest, sample_results, [{"cand1": 60, "cand2": 50}]
+    )
+    assert (
+        first_round_risks[("cand1", "cand2")]
+        < later_round_risks[("cand1", "cand2")]
+        < 1
+    )
+
+
+def test_get_sample_size(contest):
+    sample_results = {"cand1": 0, "cand2": 0}
+    sizes = minerva.get_sample_size(RISK_LIMIT, contest, sample_results)
+    bravo_sizes = bravo.get_sample_size(RISK_LIMIT, contest, sample_results)
+
+    assert list(sizes) == ["0.7", "0.8", "0.9"]
+    for quant, option in sizes.items():
+        assert option["type"] is None
+        assert option["prob"] == float(quant)
+        # Minerva needs fewer ballots than BRAVO
+        assert option["size"] < bravo_sizes[quant]["size"]
+    assert sizes["0.7"]["size"] < sizes["0.8"]["size"] < sizes["0.9"]["size"]
+
+
+def test_minerva_sample_sizes_complete():
+    quants = [0.5, 0.7, 0.9, 0.99]
+    for round_sizes, sample_w in [([], 0), ([100], 55)]:
+        sizes = minerva.minerva_sample_sizes(
+            RISK_LIMIT, 0.6, round_sizes, sample_w, 10000, quants
+        )
+        for quant, size in zip(quants, sizes):
+            null, alternative = minerva.round_distributions(
+                RISK_LIMIT, 0.6, round_sizes + [sum(round_sizes) + size]
+            )
+            stopping_votes = minerva.first_stopping_votes(
+                minerva.tail_ratios(null, alternative), RISK_LIMIT
+            )
+            completion_chance = stats.binom.sf(stopping_votes - sample_w - 1, size, 0.6)
+            assert completion_chance >= quant, (round_sizes, quant)
+
+    # Sample sizes that could never be enough
+    assert minerva.minerva_sample_sizes(RISK_LIMIT, 0.6, [], 0, 10, [0.9]) == [None]
+
+
+def test_get_sample_size_special_cases():
+    no_losers = Contest(
+        "No losers",
+        {"cand1": 600, "ballots": 1000, "numWinners": 1, "votesAllowed": 1},
+    )
+    assert (
+        minerva.get_sample_size(RISK_LIMIT, no_losers, {"cand1": 0})["0.9"]["size"]
+        == -1
+    )
+    assert minerva.compute_risk(RISK_LIMIT, no_losers, {"cand1": 100}) == (
+        {("cand1", ""): 1.0},
+        False,
+    )
+
+    tie = Contest(
+        "Tie",
+        {
+            "cand1": 500,
+            "cand2": 500,
+            "ballots": 1000,
+            "numWinners": 1,
+            "votesAllowed": 1,
+        },
+    )
+    assert (
+        minerva.get_sample_size(RISK_LIMIT, tie, {"cand1": 0, "cand2": 0})["0.9"][
+            "size"
+        ]
+        == 1000
+    )
+    assert minerva.compute_risk(RISK_LIMIT, tie, {"cand1": 900, "cand2": 0}) == (
+        {("cand1", "cand2"): 1.0},
+        False,
+    )
+
+
+def test_multi_winner():
+    contest = Contest(
+        "Multi-winner Contest",
+        {
+            "cand1": 500,
+            "cand2": 400,
+            "cand3": 200,
+            "cand4": 100,
+            "ballots": 700,
+            "numWinners": 2,
+            "votesAllowed": 2,
+        },
+    )
+    sizes = minerva.get_sample_size(RISK_LIMIT, contest, {})
+    assert 0 < sizes["0.9"]["size"] < contest.ballots
+
+    measurements, finished = minerva.compute_risk(
+        RISK_LIMIT, contest, {"cand1": 50, "cand2": 40, "cand3": 20, "cand4": 10}
+    )
+    assert set(measurements) == {
+        (winner, loser) for winner in ["cand1", "cand2"] for loser in ["cand3", "cand4"]
+    }
+    assert finished == all(risk <= RISK_LIMIT for risk in measurements.values())
+
+
+def test_round_risk():
+    # The risk of the last round's votes, and the votes that meet the risk
+    # limit, are the same as from the last round's whole distributions
+    for round_sizes in [[0], [10], [50, 120], [100, 101, 300]]:
+        null, alternative = minerva.round_distributions(RISK_LIMIT, 0.6, round_sizes)
+        risks = minerva.tail_ratios(null, alternative)
+        for winner_votes in range(round_sizes[-1] + 1):
+            assert minerva.round_risk(
+                RISK_LIMIT, 0.6, round_sizes, winner_votes
+            ) == pytest.approx(risks[winner_votes], rel=1e-9, abs=1e-12)
+        for risk_limit in [0.01, RISK_LIMIT, 0.5]:
+            null, alternative = minerva.round_distributions(
+                risk_limit, 0.6, round_sizes
+            )
+            assert minerva.round_stopping_votes(
+                risk_limit, 0.6, round_sizes
+            ) == minerva.first_stopping_votes(
+                minerva.tail_ratios(null, alternative), risk_limit
+            )
@@ -0,0 +1,126 @@
+import threading
+
+from audit_math import sampler
+from audit_math.sample_cache import SampleCache, DiskSampleStore, sample_key
+
+SEED = "12345678901234567890abcdefghijklmnopqrstuvwxyz😊"
+
+MANIFEST = {("J1", "pct 1"): 25, ("J1", "pct 2"): 25, ("J2", "pct 3"): 25}
+
+
+def assert_resumes(sampler_state, num_sampled):
+    # The sampler state picks up where a fresh sampler would, without
+    # starting over
+    cursor = sampler.SamplerCursor.load(SEED, MANIFEST, sampler_state)
+    assert cursor and cursor.num_drawn == num_sampled
+    assert cursor.draw(10) == sampler.draw_sample(SEED, MANIFEST, 10, num_sampled)
+
+
+def no_sampling(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("Should have used the cache")
+
+    monkeypatch.setattr(sampler, "draw_sample_resumably", fail)
+
+
+def test_sample_key():
+    key = sample_key(SEED, MANIFEST)
+    assert key == sample_key(SEED, dict(reversed(list(MANIFEST.items()))))
+    assert key != sample_key("other seed", MANIFEST)
+    assert key != sample_key(SEED, {**MANIFEST, ("J2", "pct 4"): 1})
+
+
+def test_cache_matches_sampler(monkeypatch):
+    cache = SampleCache()
+    expected = sampler.draw_sample(SEED, MANIFEST, 20, 5)
+    sample, sampler_state = cache.draw_sample_resumably(SEED, MANIFEST, 20, 5, None)
+    assert sample == expected
+    assert cache.draw_sample(SEED, MANIFEST, 20, 5) == expected
+
+    no_sampling(monkeypatch)
+    assert cache.draw_sample_resumably(SEED, MANIFEST, 20, 5, None) == (
+        sample,
+        sampler_state,
+    )
+
+    # The cached sampler state resumes drawing where the cached sample ended
+    assert_resumes(sampler_state, 25)
+
+
+def test_one_prefix_serves_every_size(monkeypatch):
+    cache = SampleCache()
+    cache.draw_sample(SEED, MANIFEST, 50)
+    assert cache.num_draws == 50
+
+    # Smaller samples, and later rounds within the prefix, are slices of it,
+    # with the sampler state rewound to the end of the slice
+    no_sampling(monkeypatch)
+    for sample_size, num_sampled in [(10, 0), (20, 10), (50, 0), (5, 45)]:
+        sample, sampler_state = cache.draw_sample_resumably(
+            SEED, MANIFEST, sample_size, num_sampled, None
+        )
+        assert_resumes(sampler_state, num_sampled + sample_size)
+        monkeypatch.undo()
+        assert sample == sampler.draw_sample(SEED, MANIFEST, sample_size, num_sampled)
+        no_sampling(monkeypatch)
+
+    # Larger samples extend the prefix
+    monkeypatch.undo()
+    assert cache.draw_sample(SEED, MANIFEST, 30, 40) == sampler.draw_sample(
+        SEED, MANIFEST, 30, 40
+    )
+    assert cache.num_draws == 70
+
+
+def test_cache_evicts_least_recently_used():
+    manifests = [{("J1", f"pct {i}"): 25} for i in range(3)]
+    cache = SampleCache(max_draws=30)
+    keys = [sample_key(SEED, manifest) for manifest in manifests]
+    for manifest, size in zip(manifests, [10, 15, 5]):
+        cache.draw_sample(SEED, manifest, size)
+    assert cache.num_draws == 30
+
+    # Using the first prefix makes the second the least recently used
+    assert cache.get(keys[0])
+    cache.draw_sample(SEED, manifests[2], 12)
+    assert cache.num_draws == 22
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) and cache.get(keys[2])
+
+    # Prefixes larger than the whole cache aren't kept
+    cache.draw_sample(SEED, manifests[1], 31)
+    assert cache.num_draws == 22
+
+
+def test_disk_store(tmp_path, monkeypatch):
+    expected = sampler.draw_sample_resumably(SEED, MANIFEST, 20, 0, None)
+    SampleCache(store=DiskSampleStore(str(tmp_path))).draw_sample(SEED, MANIFEST, 20)
+
+    # A new cache (e.g. in a new process) finds the sample on disk
+    no_sampling(monkeypatch)
+    cache = SampleCache(store=DiskSampleStore(str(tmp_path)))
+    assert cache.draw_sample_resumably(SEED, MANIFEST, 20, 0, None) == expected
+    assert cache.num_draws == 20
+
+
+def test_cache_is_thread_safe():
+    manifests = [{("J1", f"pct {i}"): 25} for i in range(10)]
+    cache = SampleCache(max_draws=50)
+    errors = []
+
+    def use_cache():
+        try:
+            for i in range(200):
+                cache.draw_sample(SEED, manifests[i % len(manifests)], 10 + i % 7)
+        except Exception as error:  # pylint: disable=broad-except
+            errors.append(error)
+
+    threads = [threading.Thread(target=use_cache) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert cache.num_draws == sum(len(sample) for sample, _ in cache.entries.values())
+    assert cache.num_draws <= 50
@@ -1,12 +1,23 @@
 import random
+from decimal import Decimal
 import pytest
-from audit_math import sampler
+import consistent_sampler
+from audit_math import macro, sampler
 from audit_math.sampler_contest import Contest
 
 SEED = "12345678901234567890abcdefghijklmnopqrstuvwxyz😊"
 RISK_LIMIT = 0.1
 
 
+def formatted(sample):
+    # Formats ticket numbers the way we display them, to compare against the
+    # expected samples below
+    return [
+        (sampler.format_ticket_number(ticket_number), ballot, generation)
+        for ticket_number, ballot, generation in sample
+    ]
+
+
 @pytest.fixture
 def macro_batches():
     batches = {}
@@ -49,7 +60,7 @@ def test_draw_sample():
         "pct 4": 25,
     }
 
-    sample = sampler.draw_sample(SEED, manifest, 20, 0)
+    sample = formatted(sampler.draw_sample(SEED, manifest, 20, 0))
 
     for i, item in enumerate(sample):
         expected = expected_sample[i]
@@ -68,7 +79,7 @@ def test_draw_more_samples():
     }
 
     samp_size = 10
-    sample = sampler.draw_sample(SEED, manifest, 10, 0)
+    sample = formatted(sampler.draw_sample(SEED, manifest, 10, 0))
     assert samp_size == len(sample), "Received sample of size {}, expected {}".format(
         samp_size, len(sample)
     )
@@ -80,7 +91,7 @@ def test_draw_more_samples():
         )
 
     samp_size = 10
-    sample = sampler.draw_sample(SEED, manifest, 10, num_sampled=10)
+    sample = formatted(sampler.draw_sample(SEED, manifest, 10, num_sampled=10))
     assert samp_size == len(sample), "Received sample of size {}, expected {}".format(
         samp_size, len(sample)
     )
@@ -93,8 +104,10 @@ def test_draw_more_samples():
 
 def test_draw_macro_sample(macro_batches, macro_contest):
     # Test getting a sample
-    sample = sampler.draw_ppeb_sample(
-        SEED, macro_contest, 10, 0, batch_results=macro_batches
+    sample = formatted(
+        sampler.draw_ppeb_sample(
+            SEED, macro_contest, 10, 0, batch_results=macro_batches
+        )
     )
 
     for i, item in enumerate(sample):
@@ -107,8 +120,10 @@ def test_draw_macro_sample(macro_batches, macro_contest):
 def test_draw_more_macro_sample(macro_batches, macro_contest):
     # Test getting a sample
     samp_size = 5
-    sample = sampler.draw_ppeb_sample(
-        SEED, macro_contest, samp_size, 0, batch_results=macro_batches,
+    sample = formatted(
+        sampler.draw_ppeb_sample(
+            SEED, macro_contest, samp_size, 0, batch_results=macro_batches,
+        )
     )
     assert samp_size == len(sample), "Received sample of size {}, expected {}".format(
         samp_size, len(sample)
@@ -121,8 +136,10 @@ def test_draw_more_macro_sample(macro_batches, macro_contest):
         )
 
     samp_size = 5
-    sample = sampler.draw_ppeb_sample(
-        SEED, macro_contest, samp_size, num_sampled=5, batch_results=macro_batches
+    sample = formatted(
+        sampler.draw_ppeb_sample(
+            SEED, macro_contest, samp_size, num_sampled=5, batch_results=macro_batches
+        )
     )
     assert samp_size == len(sample), "Received sample of size {}, expected {}".format(
         samp_size, len(sample)
@@ -134,6 +151,102 @@ def test_draw_more_macro_sample(macro_batches, macro_contest):
         )
 
 
+def test_ppeb_sample_is_weighted_by_max_error(macro_batches, macro_contest):
+    # Batches with no possible error are never picked
+    macro_batches["pct 20"] = {"test1": {"cand1": 0, "cand2": 50, "ballots": 50}}
+    # Batch order doesn't matter
+    reversed_batches = dict(reversed(list(macro_batches.items())))
+
+    sample = sampler.draw_ppeb_sample(SEED, macro_contest, 2000, 0, macro_batches)
+    assert sample == sampler.draw_ppeb_sample(
+        SEED, macro_contest, 2000, 0, reversed_batches
+    )
+
+    # A prebuilt contest index gives the same sample
+    index = macro.MacroContestIndex(macro_contest, macro_batches)
+    assert sample == sampler.draw_ppeb_sample(
+        SEED, macro_contest, 2000, 0, macro_batches, index
+    )
+
+    draws_per_batch = {batch: 0 for batch in macro_batches}
+    for (_, batch, _) in sample:
+        draws_per_batch[batch] += 1
+    assert draws_per_batch["pct 20"] == 0
+
+    # The pct 0-9 batches have twice the max error of the pct 11-19 batches,
+    # so they should be picked about twice as often.
+    heavy = sum(draws_per_batch[f"pct {i}"] for i in range(10)) / 10
+    light = sum(draws_per_batch[f"pct {i}"] for i in range(11, 20)) / 9
+    assert 1.7 < heavy / light < 2.3
+
+
+def test_ppeb_sample_ticket_order(macro_batches, macro_contest):
+    sample = sampler.draw_ppeb_sample(SEED, macro_contest, 200, 0, macro_batches)
+    ticket_numbers = [ticket_number for ticket_number, _, _ in sample]
+    assert ticket_numbers == sorted(ticket_numbers)
+
+    # Each batch's pick count goes up by one each time it's picked, in
+    # ticket number order
+    times_sampled = {batch: 0 for batch in macro_batches}
+    for _, batch, num_times in sample:
+        times_sampled[batch] += 1
+        assert num_times == times_sampled[batch]
+
+    # Resuming picks the same batches as drawing the whole sample at once,
+    # with each round in ticket number order
+    first_round = sampler.draw_ppeb_sample(SEED, macro_contest, 150, 0, macro_batches)
+    second_round = sampler.draw_ppeb_sample(SEED, macro_contest, 50, 150, macro_batches)
+    assert sorted(
+        (ticket_number, batch) for ticket_number, batch, _ in first_round + second_round
+    ) == sorted((ticket_number, batch) for ticket_number, batch, _ in sample)
+    for round_sample in [first_round, second_round]:
+        assert round_sample == sorted(round_sample)
+
+
+def test_ppeb_sample_across_contests(macro_batches, macro_contest):
+    # With one contest, the across-contest sample is the contest's sample
+    assert sampler.draw_ppeb_sample_across_contests(
+        SEED, [macro_contest], 100, 10, macro_batches
+    ) == sampler.draw_ppeb_sample(SEED, macro_contest, 100, 10, macro_batches)
+
+    # Batches only in another contest can be picked too
+    other_contest = Contest(
+        "test2",
+        {
+            "cand1": 300,
+            "cand2": 100,
+            "ballots": 400,
+            "numWinners": 1,
+            "votesAllowed": 1,
+        },
+    )
+    macro_batches["other"] = {"test2": {"cand1": 300, "cand2": 100, "ballots": 400}}
+    index = macro.MacroAuditIndex([macro_contest, other_contest], macro_batches)
+    sample = sampler.draw_ppeb_sample_across_contests(
+        SEED, [macro_contest, other_contest], 100, 0, macro_batches, index
+    )
+    assert len(sample) == 100
+    assert "other" in {batch for _, batch, _ in sample}
+
+
+def test_ticket_number_value():
+    # Ticket numbers keep 18 significant digits after any leading 9s, so they
+    # can have more than 18 digits
+    ticket = "0.99123456789012345678901234"
+    assert sampler.ticket_number_value(ticket) == Decimal("0.99123456789012345678")
+    assert sampler.format_ticket_number(
+        sampler.ticket_number_value(ticket)
+    ) == consistent_sampler.trim(ticket, 18)
+
+    # Small ticket numbers and trailing zeros are formatted as is
+    for ticket in ["0.000000012345678901234567890", "0.123456789012345000"]:
+        assert sampler.format_ticket_number(
+            sampler.ticket_number_value(ticket)
+        ) == consistent_sampler.trim(ticket, 18)
+
+    assert sampler.ticket_number_value("0.23") < sampler.ticket_number_value("0.3")
+
+
 def random_manifest():
     rand = random.Random(12345)
     return {f"pct {n}": rand.randint(1, 10) for n in range(rand.randint(1, 10))}
@@ -147,6 +260,155 @@ def test_ballot_labels():
             assert 1 <= ballot_number <= manifest[batch]
 
 
+def full_ballot_list_sample(manifest, sample_size, num_sampled):
+    # The sample as drawn by handing consistent_sampler a list of every ballot
+    ballots = [(batch, i + 1) for batch in manifest for i in range(manifest[batch])]
+    return [
+        (Decimal(ticket_number), ballot, generation)
+        for ticket_number, ballot, generation in consistent_sampler.sampler(
+            ballots,
+            seed=SEED,
+            take=sample_size + num_sampled,
+            with_replacement=True,
+            output="tuple",
+            digits=18,
+        )
+    ][num_sampled:]
+
+
+def test_streaming_sample_matches_full_ballot_list():
+    rand = random.Random(314159)
+    for _ in range(20):
+        manifest = {f"pct {n}": rand.randint(1, 50) for n in range(rand.randint(1, 20))}
+        sample_size = rand.randint(1, 100)
+        num_sampled = rand.randint(0, 50)
+        assert sampler.draw_sample(
+            SEED, manifest, sample_size, num_sampled
+        ) == full_ballot_list_sample(manifest, sample_size, num_sampled)
+
+
+def test_streaming_sample_with_jurisdiction_batch_keys():
+    manifest = {
+        ("J1", "1"): 23,
+        ("J1", "2"): 101,
+        ("J2", "1"): 20,
+        ("J2", "2"): 10,
+    }
+    assert sampler.draw_sample(SEED, manifest, 40, 7) == full_ballot_list_sample(
+        manifest, 40, 7
+    )
+
+
+def test_streaming_sample_larger_than_manifest():
+    manifest = {"pct 1": 2, "pct 2": 1}
+    sample = sampler.draw_sample(SEED, manifest, 10, 0)
+    assert len(sample) == 10
+    assert sample == full_ballot_list_sample(manifest, 10, 0)
+
+    assert sampler.draw_sample(SEED, {}, 10, 0) == []
+
+
+def test_stream_sample_is_lazy():
+    manifest = {"pct 1": 25, "pct 2": 25, "pct 3": 25, "pct 4": 25}
+    stream = sampler.stream_sample(SEED, manifest, 20, 0)
+    assert formatted([next(stream)]) == expected_sample[:1]
+    assert formatted(stream) == expected_sample[1:]
+
+
+def test_sampler_cursor_resumes_draws():
+    manifest = {("J1", "1"): 23, ("J1", "2"): 101, ("J2", "1"): 20, ("J2", "2"): 10}
+    round_sizes = [5, 30, 2, 100]
+
+    sampler_state = None
+    num_sampled = 0
+    for sample_size in round_sizes:
+        sample, sampler_state = sampler.draw_sample_resumably(
+            SEED, manifest, sample_size, num_sampled, sampler_state
+        )
+        assert sample == sampler.draw_sample(SEED, manifest, sample_size, num_sampled)
+
+        cursor = sampler.SamplerCursor.load(SEED, manifest, sampler_state)
+        assert cursor.num_drawn == num_sampled + sample_size
+        num_sampled += sample_size
+
+
+def test_sampler_cursor_resumes_without_restreaming():
+    manifest = {"pct 1": 25, "pct 2": 25, "pct 3": 25, "pct 4": 25}
+    cursor = sampler.SamplerCursor(SEED, manifest)
+    assert formatted(cursor.draw(10)) == expected_first_sample
+
+    cursor = sampler.SamplerCursor.load(SEED, manifest, cursor.dump())
+
+    def fail():
+        raise Exception("Should not stream the manifest again")
+
+    cursor._extend_pool = fail  # pylint: disable=protected-access
+    assert formatted(cursor.draw(10)) == expected_second_sample
+
+
+def test_sampler_cursor_dump_is_compact():
+    manifest = {("J1", f"Batch {i}"): 200 for i in range(50)}
+    cursor = sampler.SamplerCursor(SEED, manifest)
+    cursor.draw(2000)
+    sampler_state = cursor.dump()
+
+    # The tickets are recomputed from the seed rather than saved
+    loaded = sampler.SamplerCursor.load(SEED, manifest, sampler_state)
+    assert sorted(loaded.heap) == sorted(cursor.heap)
+    assert loaded.frontier == cursor.frontier
+    assert len(sampler_state) < 4 * len(cursor.heap)
+    assert loaded.draw(100) == cursor.draw(100)
+
+
+def test_sampler_cursor_mismatch():
+    manifest = {"pct 1": 25, "pct 2": 25}
+    cursor = sampler.SamplerCursor(SEED, manifest)
+    cursor.draw(10)
+    sampler_state = cursor.dump()
+
+    # Batch order doesn't matter
+    assert sampler.SamplerCursor.load(SEED, {"pct 2": 25, "pct 1": 25}, sampler_state)
+    assert not sampler.SamplerCursor.load(SEED, {"pct 1": 25}, sampler_state)
+    assert not sampler.SamplerCursor.load("other seed", manifest, sampler_state)
+
+    # If the saved state doesn't match, we start over
+    sample, _ = sampler.draw_sample_resumably(SEED, {"pct 1": 25}, 5, 10, sampler_state)
+    assert sample == sampler.draw_sample(SEED, {"pct 1": 25}, 5, 10)
+
+    # Same if the number of tickets already sampled doesn't match
+    sample, _ = sampler.draw_sample_resumably(SEED, manifest, 5, 3, sampler_state)
+    assert sample == sampler.draw_sample(SEED, manifest, 5, 3)
+
+
+def test_sample_workloads():
+    manifest = {
+        ("J1", "Batch 1"): 30,
+        ("J1", "Batch 2"): 5,
+        ("J2", "Batch 1"): 10,
+    }
+    sample_sizes = {"asn": 12, "0.7": 30, "0.9": 60, "empty": 0}
+    workloads = sampler.sample_workloads(SEED, manifest, sample_sizes, 4)
+
+    for option, sample_size in sample_sizes.items():
+        sample = sampler.draw_sample(SEED, manifest, sample_size, 4)
+        new_ballots = [ballot for (_, ballot, generation) in sample if generation == 1]
+        assert workloads[option] == {
+            "numDraws": sample_size,
+            "numBallots": len(new_ballots),
+            "numDuplicateDraws": sample_size - len(new_ballots),
+            "numBatches": len({batch for (batch, _) in new_ballots}),
+            "numBallotsByJurisdiction": {
+                jurisdiction: len([b for b in new_ballots if b[0][0] == jurisdiction])
+                for jurisdiction in {b[0][0] for b in new_ballots}
+            },
+        }
+
+    # Manifests without jurisdictions don't get a jurisdiction breakdown
+    workloads = sampler.sample_workloads(SEED, {"pct 1": 25}, {"asn": 10})
+    assert workloads["asn"]["numDraws"] == 10
+    assert "numBallotsByJurisdiction" not in workloads["asn"]
+
+
 expected_sample = [
     ("0.000617786129909912", ("pct 2", 3), 1),
     ("0.002991631653037245", ("pct 3", 24), 1),
@@ -171,16 +433,16 @@ expected_sample = [
 ]
 
 expected_macro_sample = [
-    ("0.003875995", "pct 16", 1),
-    ("0.011835450", "pct 2", 1),
-    ("0.022865957", "pct 2", 2),
-    ("0.035732442", "pct 3", 1),
-    ("0.125751540", "pct 2", 3),
-    ("0.136070319", "pct 18", 1),
-    ("0.150306323", "pct 6", 1),
-    ("0.176060218", "pct 4", 1),
-    ("0.183200120", "pct 13", 1),
-    ("0.191343085", "pct 18", 2),
+    ("0.049705056", "pct 14", 1),
+    ("0.120671605", "pct 2", 1),
+    ("0.185489374", "pct 8", 1),
+    ("0.186711107", "pct 2", 2),
+    ("0.289914781", "pct 7", 1),
+    ("0.309227608", "pct 14", 2),
+    ("0.339714059", "pct 7", 2),
+    ("0.501488329", "pct 17", 1),
+    ("0.627108257", "pct 1", 1),
+    ("0.826976306", "pct 7", 3),
 ]
 
 expected_first_sample = [
@@ -210,17 +472,17 @@ expected_second_sample = [
 ]
 
 expected_first_macro_sample = [
-    ("0.003875995", "pct 16", 1),
-    ("0.011835450", "pct 2", 1),
-    ("0.022865957", "pct 2", 2),
-    ("0.035732442", "pct 3", 1),
-    ("0.125751540", "pct 2", 3),
+    ("0.049705056", "pct 14", 1),
+    ("0.186711107", "pct 2", 1),
+    ("0.309227608", "pct 14", 2),
+    ("0.339714059", "pct 7", 1),
+    ("0.627108257", "pct 1", 1),
 ]
 
 expected_second_macro_sample = [
-    ("0.136070319", "pct 18", 1),
-    ("0.150306323", "pct 6", 1),
-    ("0.176060218", "pct 4", 1),
-    ("0.183200120", "pct 13", 1),
-    ("0.191343085", "pct 18", 2),
+    ("0.120671605", "pct 2", 2),
+    ("0.185489374", "pct 8", 1),
+    ("0.289914781", "pct 7", 2),
+    ("0.501488329", "pct 17", 1),
+    ("0.826976306", "pct 7", 3),
 ]
@@ -1,5 +1,8 @@
+from datetime import datetime
+from types import SimpleNamespace
 import pytest
 
+from audit_math import sampler_contest
 from audit_math.sampler_contest import Contest
 
 
@@ -66,6 +69,85 @@ def test_repr(contests):
     assert str_rep == expected, "String representation is wrong!"
 
 
+def db_contest(contest_id: str, updated_at, votes):
+    return SimpleNamespace(
+        id=contest_id,
+        updated_at=updated_at,
+        total_ballots_cast=sum(votes),
+        num_winners=1,
+        votes_allowed=1,
+        choices=[
+            SimpleNamespace(id=f"cand{i}", num_votes=num_votes)
+            for i, num_votes in enumerate(votes)
+        ],
+    )
+
+
+def test_from_db_contest_cache():
+    sampler_contest.invalidate_db_contests()
+    updated_at = datetime(2020, 6, 1)
+
+    contest = sampler_contest.from_db_contest(db_contest("c1", updated_at, [60, 40]))
+    assert contest.candidates == {"cand0": 60, "cand1": 40}
+    assert contest.margins["winners"]["cand0"]["p_w"] == 0.6
+
+    # The same revision of a contest is only built once
+    assert (
+        sampler_contest.from_db_contest(db_contest("c1", updated_at, [60, 40]))
+        is contest
+    )
+
+    # Updated contests are rebuilt
+    updated = sampler_contest.from_db_contest(
+        db_contest("c1", datetime(2020, 6, 2), [70, 30])
+    )
+    assert updated.candidates == {"cand0": 70, "cand1": 30}
+
+    # Choices can change without updating the contest, in which case the
+    # contest needs to be invalidated explicitly
+    changed_choices = db_contest("c1", updated_at, [55, 45])
+    assert sampler_contest.from_db_contest(changed_choices) is contest
+    sampler_contest.invalidate_db_contests(["c2", "c1"])
+    assert sampler_contest.from_db_contest(changed_choices).candidates == {
+        "cand0": 55,
+        "cand1": 45,
+    }
+
+    # Unsaved contests aren't cached
+    unsaved = db_contest("c1", None, [60, 40])
+    assert sampler_contest.from_db_contest(
+        unsaved
+    ) is not sampler_contest.from_db_contest(unsaved)
+
+
+def test_from_db_contest_cache_evicts_least_recently_used(monkeypatch):
+    sampler_contest.invalidate_db_contests()
+    monkeypatch.setattr(sampler_contest, "MAX_CACHED_DB_CONTESTS", 2)
+    updated_at = datetime(2020, 6, 1)
+
+    contest_1 = sampler_contest.from_db_contest(db_contest("c1", updated_at, [6, 4]))
+    contest_2 = sampler_contest.from_db_contest(db_contest("c2", updated_at, [6, 4]))
+    assert (
+        sampler_contest.from_db_contest(db_contest("c1", updated_at, [6, 4]))
+        is contest_1
+    )
+    sampler_contest.from_db_contest(db_contest("c3", updated_at, [6, 4]))
+
+    assert (
+        sampler_contest.from_db_contest(db_contest("c1", updated_at, [6, 4]))
+        is contest_1
+    )
+    assert (
+        sampler_contest.from_db_contest(db_contest("c2", updated_at, [6, 4]))
+        is not contest_2
+    )
+
+
+def test_contest_slots(contests):
+    with pytest.raises(AttributeError):
+        contests[0].__dict__  # pylint: disable=pointless-statement
+
+
 bravo_contests = {
     "test1": {
         "cand1": 600,
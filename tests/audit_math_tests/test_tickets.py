@@ -0,0 +1,117 @@
+import random
+import pytest
+import consistent_sampler
+
+from audit_math import sampler, tickets
+
+SEED = "12345678901234567890abcdefghijklmnopqrstuvwxyz😊"
+
+
+def random_manifests():
+    rand = random.Random(271828)
+    for _ in range(25):
+        num_batches = rand.randint(1, 30)
+        yield {
+            rand.choice(
+                [f"pct {n}", ("Jurisdiction {}".format(n % 3), f"Batch {n}"), n]
+            ): rand.randint(1, 40)
+            for n in range(num_batches)
+        }
+
+
+@pytest.fixture(params=[tickets.CHUNK_SIZE, 7])
+def chunk_size(request, monkeypatch):
+    monkeypatch.setattr(tickets, "CHUNK_SIZE", request.param)
+    return request.param
+
+
+def test_first_ticket_numbers():
+    for manifest in random_manifests():
+        seed_hash = consistent_sampler.sha256_hex(SEED)
+        expected = [
+            tickets.ticket_number_key(
+                consistent_sampler.first_ticket(ballot, SEED, seed_hash).ticket_number
+            )
+            for ballot in sampler.ballot_ids(manifest)
+        ]
+        assert list(tickets.first_ticket_numbers(SEED, manifest)) == expected
+
+
+@pytest.mark.usefixtures("chunk_size")
+def test_smallest_first_tickets():
+    rand = random.Random(1)
+    for manifest in random_manifests():
+        seed_hash = consistent_sampler.sha256_hex(SEED)
+        all_tickets = sorted(
+            consistent_sampler.first_ticket(ballot, SEED, seed_hash)
+            for ballot in sampler.ballot_ids(manifest)
+        )
+        k = rand.randint(1, len(all_tickets) + 5)
+        assert tickets.smallest_first_tickets(SEED, manifest, k) == all_tickets[:k]
+
+        start = rand.randint(0, len(all_tickets) - 1)
+        assert (
+            tickets.smallest_first_tickets(SEED, manifest, k, after=all_tickets[start])
+            == all_tickets[start + 1 : start + 1 + k]
+        )
+
+
+@pytest.mark.usefixtures("chunk_size")
+def test_sample_matches_consistent_sampler():
+    rand = random.Random(2)
+    for manifest in random_manifests():
+        sample_size = rand.randint(1, 60)
+        num_sampled = rand.randint(0, 20)
+        expected = list(
+            consistent_sampler.sampler(
+                list(sampler.ballot_ids(manifest)),
+                seed=SEED,
+                take=sample_size + num_sampled,
+                with_replacement=True,
+                output="tuple",
+                digits=18,
+            )
+        )[num_sampled:]
+        assert [
+            (sampler.format_ticket_number(ticket_number), ballot, generation)
+            for ticket_number, ballot, generation in sampler.draw_sample(
+                SEED, manifest, sample_size, num_sampled
+            )
+        ] == expected
+
+
+def test_ticket_number_key():
+    assert tickets.ticket_number_key("0.1234") == 1234000000000000000
+    assert tickets.ticket_number_key("0.12345678901234567890123") == 1234567890123456789
+
+
+def test_sharded_smallest_first_tickets():
+    manifest = {
+        (f"J{j}", f"Batch {b}"): 10 + j + b for j in range(12) for b in range(3)
+    }
+    shards = sampler.shard_manifest(manifest)
+    assert len(shards) == 12
+    assert all(len({batch[0] for batch in shard}) == 1 for shard in shards)
+
+    expected = tickets.smallest_first_tickets(SEED, manifest, 50)
+    assert (
+        tickets.sharded_smallest_first_tickets(SEED, shards, 50, processes=2)
+        == expected
+    )
+    assert (
+        tickets.sharded_smallest_first_tickets(
+            SEED, shards, 20, after=expected[29], processes=2
+        )
+        == expected[30:50]
+    )
+
+
+def test_sharded_sample():
+    manifest = {(f"J{j}", f"Batch {b}"): 10 + j * b for j in range(5) for b in range(4)}
+    expected = sampler.draw_sample(SEED, manifest, 30, 10)
+    assert sampler.draw_sample(SEED, manifest, 30, 10, processes=2) == expected
+
+    # Manifests without jurisdictions get sharded into chunks of batches
+    manifest = {f"pct {b}": 10 + b for b in range(20)}
+    expected = sampler.draw_sample(SEED, manifest, 30, 10)
+    assert sampler.draw_sample(SEED, manifest, 30, 10, processes=2) == expected
@@ -0,0 +1,103 @@
+import io
+
+from audit_math import sampler, verify_sample
+
+SEED = "12345678901234567890abcdefghijklmnopqrstuvwxyz😊"
+
+MANIFEST_CSVS = {
+    "J1": "Batch Name,Number of Ballots,Storage Location\n1,23,A\n2,101,B\n\n",
+    "J2": "batch name,number of ballots\n1,20\n2,10\n3,220\n",
+}
+
+MANIFEST = {
+    ("J1", "1"): 23,
+    ("J1", "2"): 101,
+    ("J2", "1"): 20,
+    ("J2", "2"): 10,
+    ("J2", "3"): 220,
+}
+
+
+def retrieval_list_csv(retrieval_list: verify_sample.RetrievalList) -> str:
+    rows = [
+        "Batch Name,Ballot Number,Storage Location,Tabulator,Ticket Numbers,Already Audited,Audit Board"
+    ] + [
+        f"{batch},{position},,,\"{','.join(tickets)}\",{'Y' if audited else 'N'},AB1"
+        for (batch, position), (tickets, audited) in sorted(retrieval_list.items())
+    ]
+    return "\n".join(rows) + "\n"
+
+
+def test_read_manifest():
+    for jurisdiction, manifest_csv in MANIFEST_CSVS.items():
+        assert {
+            (jurisdiction, batch): num_ballots
+            for batch, num_ballots in verify_sample.read_manifest(
+                io.StringIO(manifest_csv)
+            )
+        } == {key: value for key, value in MANIFEST.items() if key[0] == jurisdiction}
+
+
+def test_expected_retrieval_lists():
+    retrieval_lists = verify_sample.expected_retrieval_lists(SEED, MANIFEST, 50, 30)
+    sample = sampler.draw_sample(SEED, MANIFEST, 50, 30)
+    previous_ballots = {
+        ballot for _, ballot, _ in sampler.draw_sample(SEED, MANIFEST, 30)
+    }
+
+    assert sum(
+        len(tickets)
+        for retrieval_list in retrieval_lists.values()
+        for tickets, _ in retrieval_list.values()
+    ) == len(sample)
+    for ticket_number, ((jurisdiction, batch), position), _ in sample:
+        tickets, audited = retrieval_lists[jurisdiction][(batch, position)]
+        assert sampler.format_ticket_number(ticket_number) in tickets
+        assert audited == (((jurisdiction, batch), position) in previous_ballots)
+
+
+def test_diff_retrieval_list():
+    expected = verify_sample.expected_retrieval_lists(SEED, MANIFEST, 50, 30)["J2"]
+    actual = verify_sample.read_retrieval_list(
+        io.StringIO(retrieval_list_csv(expected))
+    )
+    assert actual == expected
+    assert verify_sample.diff_retrieval_list(expected, actual) == []
+
+    ballots = sorted(expected)
+    del actual[ballots[0]]
+    actual[("3", 221)] = (["0.5"], False)
+    actual[ballots[1]] = (["0.5"], actual[ballots[1]][1])
+    actual[ballots[2]] = (actual[ballots[2]][0], not actual[ballots[2]][1])
+    assert verify_sample.diff_retrieval_list(expected, actual) == [
+        f"Batch {ballots[0][0]}, ballot {ballots[0][1]}: sampled, but missing from retrieval list",
+        f"Batch {ballots[1][0]}, ballot {ballots[1][1]}: expected ticket numbers {','.join(expected[ballots[1]][0])}, got 0.5",
+        f"Batch {ballots[2][0]}, ballot {ballots[2][1]}: expected already audited {'Y' if expected[ballots[2]][1] else 'N'}, got {'N' if expected[ballots[2]][1] else 'Y'}",
+        "Batch 3, ballot 221: on retrieval list, but not sampled",
+    ]
+
+
+def test_main(tmp_path):
+    args = ["--seed", SEED, "--sample-size", "50", "--num-sampled", "30"]
+    for jurisdiction, manifest_csv in MANIFEST_CSVS.items():
+        (tmp_path / f"{jurisdiction}-manifest.csv").write_text(manifest_csv)
+        args += ["--manifest", f"{jurisdiction}={tmp_path}/{jurisdiction}-manifest.csv"]
+
+    expected = verify_sample.expected_retrieval_lists(SEED, MANIFEST, 50, 30)
+    (tmp_path / "J1-retrieval.csv").write_text(retrieval_list_csv(expected["J1"]))
+    args += ["--retrieval-list", f"J1={tmp_path}/J1-retrieval.csv"]
+
+    out = io.StringIO()
+    assert verify_sample.main(args, out) == 0
+    assert out.getvalue().endswith("Checked 1 retrieval lists: 0 differences.\n")
+
+    del expected["J2"][sorted(expected["J2"])[0]]
+    (tmp_path / "J2-retrieval.csv").write_text(retrieval_list_csv(expected["J2"]))
+    args += ["--retrieval-list", f"J2={tmp_path}/J2-retrieval.csv"]
+    out = io.StringIO()
+    assert verify_sample.main(args, out) == 1
+    assert "J2: Batch" in out.getvalue()
+    assert out.getvalue().endswith("1 differences.\n")
+
+    out = io.StringIO()
+    assert verify_sample.main(args + ["--manifest", "J3=missing.csv"], out) == 2
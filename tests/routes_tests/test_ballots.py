@@ -1,10 +1,12 @@
-from typing import List
-import json
+from typing import Dict, List, Optional
+import io, json
+import pytest
 from flask.testing import FlaskClient
 
 from tests.helpers import (
     set_logged_in_user,
     DEFAULT_JA_EMAIL,
+    DEFAULT_AA_EMAIL,
     assert_is_id,
     compare_json,
     put_json,
@@ -16,7 +18,15 @@ from tests.helpers import (
     AB1_BALLOTS_ROUND_2,
 )
 from arlo_server.auth import UserType
-from arlo_server.models import ContestChoice
+from arlo_server.models import (
+    Contest,
+    ContestChoice,
+    Election,
+    Jurisdiction,
+    RoundContest,
+    SampledBallotDraw,
+)
+from audit_math import bravo, sampler_contest, verify_sample
 from util.jsonschema import JSONDict
 
 
@@ -390,6 +400,94 @@ def test_ab_audit_ballot_happy_path(
         assert ballots[0] == {**ballot, **audit_request}
 
 
+def test_ab_audit_ballot_updates_risk_measurement(
+    client: FlaskClient,
+    election_id: str,
+    jurisdiction_ids: List[str],
+    contest_ids: List[str],
+    round_1_id: str,
+    audit_board_round_1_ids: List[str],
+):
+    set_logged_in_user(client, UserType.AUDIT_BOARD, audit_board_round_1_ids[0])
+    rv = client.get(
+        f"/election/{election_id}/jurisdiction/{jurisdiction_ids[0]}/round/{round_1_id}/audit-board/{audit_board_round_1_ids[0]}/ballots"
+    )
+    ballots = json.loads(rv.data)["ballots"]
+    choice_1_id, choice_2_id = [
+        choice.id
+        for choice in ContestChoice.query.filter_by(contest_id=contest_ids[0])
+        .order_by(ContestChoice.name)
+        .all()
+    ]
+
+    def audit(ballot: JSONDict, choice_id: Optional[str]):
+        rv = put_json(
+            client,
+            f"/election/{election_id}/jurisdiction/{jurisdiction_ids[0]}/round/{round_1_id}/audit-board/{audit_board_round_1_ids[0]}/ballots/{ballot['id']}",
+            {
+                "status": "AUDITED",
+                "interpretations": [
+                    {
+                        "contestId": contest_ids[0],
+                        "interpretation": "VOTE" if choice_id else "BLANK",
+                        "choiceId": choice_id,
+                        "comment": None,
+                    }
+                ],
+            },
+        )
+        assert_ok(rv)
+
+    def current_p_value() -> float:
+        round_contest = RoundContest.query.filter_by(
+            round_id=round_1_id, contest_id=contest_ids[0]
+        ).one()
+        p_value: float = round_contest.current_p_value
+        return p_value
+
+    def expected_p_value(votes: Dict[str, int]) -> float:
+        contest = Contest.query.get(contest_ids[0])
+        risk, _ = bravo.compute_risk(
+            0.1, sampler_contest.from_db_contest(contest), votes
+        )
+        return max(risk.values())
+
+    def num_draws(ballot: JSONDict) -> int:
+        count: int = SampledBallotDraw.query.filter_by(
+            ballot_id=ballot["id"], round_id=round_1_id
+        ).count()
+        return count
+
+    assert current_p_value() == 1.0
+
+    for ballot in ballots[:20]:
+        audit(ballot, choice_1_id)
+    for ballot in ballots[20:25]:
+        audit(ballot, choice_2_id)
+    votes = {
+        choice_1_id: sum(num_draws(ballot) for ballot in ballots[:20]),
+        choice_2_id: sum(num_draws(ballot) for ballot in ballots[20:25]),
+    }
+    assert current_p_value() == pytest.approx(expected_p_value(votes))
+    assert current_p_value() < 1
+
+    # Re-auditing a ballot replaces its votes
+    audit(ballots[0], choice_2_id)
+    votes[choice_1_id] -= num_draws(ballots[0])
+    votes[choice_2_id] += num_draws(ballots[0])
+    assert current_p_value() == pytest.approx(expected_p_value(votes))
+
+    audit(ballots[0], None)
+    votes[choice_2_id] -= num_draws(ballots[0])
+    assert current_p_value() == pytest.approx(expected_p_value(votes))
+
+    # The status endpoint reports the current risk measurement
+    set_logged_in_user(client, UserType.AUDIT_ADMIN, DEFAULT_AA_EMAIL)
+    rv = client.get(f"/election/{election_id}/contest")
+    contests = json.loads(rv.data)["contests"]
+    assert contests[0]["currentRoundStatus"]["currentPValue"] == current_p_value()
+
+
 def test_ab_audit_ballot_invalid(
     client: FlaskClient,
     election_id: str,
@@ -696,6 +794,53 @@ def test_ja_ballot_retrieval_list_round_2(
     assert retrieval_list == EXPECTED_RETRIEVAL_LIST_ROUND_2
 
 
+def test_retrieval_lists_match_public_verification(
+    client: FlaskClient,
+    election_id: str,
+    jurisdiction_ids: List[str],
+    round_1_id: str,
+    round_2_id: str,
+    audit_board_round_2_ids: str,  # pylint: disable=unused-argument
+    tmp_path,
+):
+    # Observers should be able to re-derive the retrieval lists using only the
+    # published seed, sample sizes and downloaded manifests
+    election = Election.query.get(election_id)
+    round_sizes = {
+        round_id: RoundContest.query.filter_by(round_id=round_id).first().sample_size
+        for round_id in [round_1_id, round_2_id]
+    }
+
+    args = ["--seed", election.random_seed]
+    for jurisdiction in Jurisdiction.query.filter(
+        Jurisdiction.id.in_(jurisdiction_ids[:2])
+    ):
+        set_logged_in_user(client, UserType.AUDIT_ADMIN, DEFAULT_AA_EMAIL)
+        rv = client.get(
+            f"/election/{election_id}/jurisdiction/{jurisdiction.id}/ballot-manifest/csv"
+        )
+        manifest_path = tmp_path / f"{jurisdiction.id}-manifest.csv"
+        manifest_path.write_bytes(rv.data)
+        args += ["--manifest", f"{jurisdiction.name}={manifest_path}"]
+
+    for round_id in [round_1_id, round_2_id]:
+        round_args = list(args)
+        if round_id == round_2_id:
+            round_args += ["--num-sampled", str(round_sizes[round_1_id])]
+        round_args += ["--sample-size", str(round_sizes[round_id])]
+
+        set_logged_in_user(client, UserType.JURISDICTION_ADMIN, DEFAULT_JA_EMAIL)
+        rv = client.get(
+            f"/election/{election_id}/jurisdiction/{jurisdiction_ids[0]}/round/{round_id}/retrieval-list"
+        )
+        retrieval_list_path = tmp_path / f"{round_id}-retrieval-list.csv"
+        retrieval_list_path.write_bytes(rv.data)
+        round_args += ["--retrieval-list", f"J1={retrieval_list_path}"]
+
+        out = io.StringIO()
+        assert verify_sample.main(round_args, out) == 0, out.getvalue()
+
+
 EXPECTED_RETRIEVAL_LIST_ROUND_1 = """Batch Name,Ballot Number,Storage Location,Tabulator,Ticket Numbers,Already Audited,Audit Board
 4,8,,,0.036908465434400494,N,Audit Board #1
 4,19,,,0.039175371814673076,N,Audit Board #1
@@ -0,0 +1,287 @@
+import io, json
+from typing import List
+from flask.testing import FlaskClient
+
+from arlo_server.models import Contest, File, Jurisdiction
+from arlo_server.batch_tallies import contest_batch_tallies
+from audit_math import macro, sampler, sampler_contest
+from audit_math.batch_tallies import BatchTallies
+from tests.helpers import (
+    set_logged_in_user,
+    DEFAULT_JA_EMAIL,
+    UserType,
+    compare_json,
+    assert_is_date,
+    assert_ok,
+)
+from bgcompute import (
+    bgcompute_update_ballot_manifest_file,
+    bgcompute_update_batch_tallies_file,
+)
+from util.process_file import ProcessingStatus
+
+J1_BATCH_TALLIES = (
+    b"Batch Name,candidate 1,candidate 2\n"
+    b"1,10,5\n"
+    b"2,60,40\n"
+    b"3,70,50\n"
+    b"4,250,150\n"
+)
+
+
+def upload_batch_tallies(
+    client: FlaskClient,
+    election_id: str,
+    jurisdiction_id: str,
+    contents: bytes,
+    user_email: str = DEFAULT_JA_EMAIL,
+):
+    set_logged_in_user(client, UserType.JURISDICTION_ADMIN, user_email)
+    return client.put(
+        f"/election/{election_id}/jurisdiction/{jurisdiction_id}/batch-tallies",
+        data={"batchTallies": (io.BytesIO(contents), "batch-tallies.csv")},
+    )
+
+
+def test_batch_tallies_upload(
+    client: FlaskClient,
+    election_id: str,
+    jurisdiction_ids: List[str],
+    contest_ids: List[str],
+    manifests,  # pylint: disable=unused-argument
+):
+    rv = upload_batch_tallies(
+        client, election_id, jurisdiction_ids[0], J1_BATCH_TALLIES
+    )
+    assert_ok(rv)
+
+    rv = client.get(
+        f"/election/{election_id}/jurisdiction/{jurisdiction_ids[0]}/batch-tallies"
+    )
+    compare_json(
+        json.loads(rv.data),
+        {
+            "file": {"name": "batch-tallies.csv", "uploadedAt": assert_is_date},
+            "processing": {
+                "status": ProcessingStatus.READY_TO_PROCESS,
+                "startedAt": None,
+                "completedAt": None,
+                "error": None,
+            },
+        },
+    )
+
+    bgcompute_update_batch_tallies_file()
+
+    rv = client.get(
+        f"/election/{election_id}/jurisdiction/{jurisdiction_ids[0]}/batch-tallies"
+    )
+    compare_json(
+        json.loads(rv.data),
+        {
+            "file": {"name": "batch-tallies.csv", "uploadedAt": assert_is_date},
+            "processing": {
+                "status": ProcessingStatus.PROCESSED,
+                "startedAt": assert_is_date,
+                "completedAt": assert_is_date,
+                "error": None,
+            },
+        },
+    )
+
+    contest = Contest.query.get(contest_ids[0])
+    choice_ids = [choice.id for choice in contest.choices]
+    tallies = BatchTallies.load(
+        Jurisdiction.query.get(jurisdiction_ids[0]).batch_tallies
+    )
+    assert tallies.contest_name == contest.id
+    assert tallies.batches == ["1", "2", "3", "4"]
+    assert tallies.choices == choice_ids
+    assert tallies.votes.tolist() == [[10, 5], [60, 40], [70, 50], [250, 150]]
+    # The number of ballots in each batch comes from the manifest
+    assert tallies.ballots.tolist() == [23, 101, 122, 400]
+
+    rv = upload_batch_tallies(
+        client,
+        election_id,
+        jurisdiction_ids[1],
+        b"Batch Name,candidate 1,candidate 2\n"
+        b"1,10,8\n"
+        b"2,5,4\n"
+        b"3,120,90\n"
+        b"4,20,15\n",
+    )
+    assert_ok(rv)
+    bgcompute_update_batch_tallies_file()
+
+    # The contest's tallies aren't complete until every jurisdiction in it has
+    # had its tallies processed
+    assert contest_batch_tallies(Contest.query.get(contest_ids[0])) is None
+
+    set_logged_in_user(client, UserType.JURISDICTION_ADMIN, "j3@example.com")
+    rv = client.put(
+        f"/election/{election_id}/jurisdiction/{jurisdiction_ids[2]}/ballot-manifest",
+        data={
+            "manifest": (
+                io.BytesIO(b"Batch Name,Number of Ballots\n" b"1,50"),
+                "manifest.csv",
+            )
+        },
+    )
+    assert_ok(rv)
+    bgcompute_update_ballot_manifest_file()
+    rv = upload_batch_tallies(
+        client,
+        election_id,
+        jurisdiction_ids[2],
+        b"Batch Name,candidate 1,candidate 2\n" b"1,30,20\n",
+        user_email="j3@example.com",
+    )
+    assert_ok(rv)
+    bgcompute_update_batch_tallies_file()
+
+    # The jurisdictions' tallies are combined to feed the batch comparison
+    # audit math, giving the same results as the equivalent nested dicts
+    contest = Contest.query.get(contest_ids[0])
+    combined = contest_batch_tallies(contest)
+    assert combined is not None
+    assert combined.batches == [
+        (jurisdiction, batch)
+        for jurisdiction in ["J1", "J2"]
+        for batch in ["1", "2", "3", "4"]
+    ] + [("J3", "1")]
+    batch_results = {
+        batch: {
+            contest.id: {
+                **dict(zip(choice_ids, votes.tolist())),
+                "ballots": int(ballots),
+            }
+        }
+        for batch, votes, ballots in zip(
+            combined.batches, combined.votes, combined.ballots
+        )
+    }
+    db_contest = sampler_contest.from_db_contest(contest)
+    index = macro.MacroContestIndex(db_contest, combined)
+    assert (
+        index.max_errors
+        == macro.MacroContestIndex(db_contest, batch_results).max_errors
+    )
+    assert macro.get_sample_sizes(
+        0.1, db_contest, combined, {}
+    ) == macro.get_sample_sizes(0.1, db_contest, batch_results, {})
+    assert sampler.draw_ppeb_sample(
+        "1234567890", db_contest, 10, 0, combined, index
+    ) == sampler.draw_ppeb_sample("1234567890", db_contest, 10, 0, batch_results)
+
+
+def test_batch_tallies_clear(
+    client: FlaskClient,
+    election_id: str,
+    jurisdiction_ids: List[str],
+    contest_ids: List[str],  # pylint: disable=unused-argument
+    manifests,  # pylint: disable=unused-argument
+):
+    rv = upload_batch_tallies(
+        client, election_id, jurisdiction_ids[0], J1_BATCH_TALLIES,
+    )
+    assert_ok(rv)
+    bgcompute_update_batch_tallies_file()
+    assert Jurisdiction.query.get(jurisdiction_ids[0]).batch_tallies is not None
+    num_files = File.query.count()
+
+    rv = client.delete(
+        f"/election/{election_id}/jurisdiction/{jurisdiction_ids[0]}/batch-tallies"
+    )
+    assert_ok(rv)
+
+    rv = client.get(
+        f"/election/{election_id}/jurisdiction/{jurisdiction_ids[0]}/batch-tallies"
+    )
+    assert json.loads(rv.data) == {"file": None, "processing": None}
+    assert Jurisdiction.query.get(jurisdiction_ids[0]).batch_tallies is None
+    assert File.query.count() == num_files - 1
+
+    # Replacing the ballot manifest clears the batch tallies too
+    rv = upload_batch_tallies(
+        client, election_id, jurisdiction_ids[0], J1_BATCH_TALLIES,
+    )
+    assert_ok(rv)
+    bgcompute_update_batch_tallies_file()
+    assert Jurisdiction.query.get(jurisdiction_ids[0]).batch_tallies is not None
+    rv = client.delete(
+        f"/election/{election_id}/jurisdiction/{jurisdiction_ids[0]}/ballot-manifest"
+    )
+    assert_ok(rv)
+    rv = client.get(
+        f"/election/{election_id}/jurisdiction/{jurisdiction_ids[0]}/batch-tallies"
+    )
+    assert json.loads(rv.data) == {"file": None, "processing": None}
+    assert Jurisdiction.query.get(jurisdiction_ids[0]).batch_tallies is None
+
+
+def test_batch_tallies_upload_before_manifest(
+    client: FlaskClient,
+    election_id: str,
+    jurisdiction_ids: List[str],
+    contest_ids: List[str],  # pylint: disable=unused-argument
+):
+    rv = upload_batch_tallies(
+        client,
+        election_id,
+        jurisdiction_ids[0],
+        b"Batch Name,candidate 1,candidate 2\n1,10,5\n",
+    )
+    assert rv.status_code == 400
+    assert json.loads(rv.data) == {
+        "errors": [
+            {
+                "errorType": "Bad Request",
+                "message": "Must upload ballot manifest before uploading batch tallies.",
+            }
+        ]
+    }
+
+
+def test_batch_tallies_upload_invalid(
+    client: FlaskClient,
+    election_id: str,
+    jurisdiction_ids: List[str],
+    contest_ids: List[str],  # pylint: disable=unused-argument
+    manifests,  # pylint: disable=unused-argument
+):
+    for contents, error in [
+        (
+            b"Batch Name,candidate 1,candidate 2\n1,10,5\n5,10,5\n",
+            "Invalid batch name: 5. Batch names must match the ballot manifest.",
+        ),
+        (
+            b"Batch Name,candidate 1,candidate 2\n1,10,5\n2,10,5\n4,10,5\n",
+            "Missing batch: 3. Every batch in the ballot manifest must have a row.",
+        ),
+        (b"Batch Name,candidate 1\n1,10\n", "Missing required column: candidate 2.",),
+        (
+            b"Batch Name,candidate 1,candidate 2\n1,10,five\n",
+            "Expected a number in column candidate 2, row 1. Got: five.",
+        ),
+    ]:
+        rv = upload_batch_tallies(client, election_id, jurisdiction_ids[0], contents)
+        assert_ok(rv)
+        bgcompute_update_batch_tallies_file()
+
+        rv = client.get(
+            f"/election/{election_id}/jurisdiction/{jurisdiction_ids[0]}/batch-tallies"
+        )
+        compare_json(
+            json.loads(rv.data),
+            {
+                "file": {"name": "batch-tallies.csv", "uploadedAt": assert_is_date},
+                "processing": {
+                    "status": ProcessingStatus.ERRORED,
+                    "startedAt": assert_is_date,
+                    "completedAt": assert_is_date,
+                    "error": error,
+                },
+            },
+        )
+        assert Jurisdiction.query.get(jurisdiction_ids[0]).batch_tallies is None
@@ -146,14 +146,17 @@ def test_contests_round_status(
 
     assert contests[0]["currentRoundStatus"] == {
         "isRiskLimitMet": None,
+        "currentPValue": 1.0,
         "numBallotsSampled": SAMPLE_SIZE_ROUND_1,
     }
     assert contests[1]["currentRoundStatus"] == {
         "isRiskLimitMet": None,
+        "currentPValue": 1.0,
         "numBallotsSampled": 0,
     }
     assert contests[2]["currentRoundStatus"] == {
         "isRiskLimitMet": None,
+        "currentPValue": 1.0,
         "numBallotsSampled": 81,
     }
 
@@ -174,14 +177,17 @@ def test_contests_round_status(
 
     assert contests[0]["currentRoundStatus"] == {
         "isRiskLimitMet": False,
+        "currentPValue": 1.0,
         "numBallotsSampled": SAMPLE_SIZE_ROUND_1,
     }
     assert contests[1]["currentRoundStatus"] == {
         "isRiskLimitMet": True,
+        "currentPValue": 1.0,
         "numBallotsSampled": 0,
     }
     assert contests[2]["currentRoundStatus"] == {
         "isRiskLimitMet": None,
+        "currentPValue": 1.0,
         "numBallotsSampled": 81,
     }
 
@@ -1,7 +1,7 @@
 import json
 from flask.testing import FlaskClient
 
-from arlo_server.models import Election, USState
+from arlo_server.models import AuditMathType, Election, USState
 
 from tests.helpers import assert_ok, put_json, compare_json, asserts_startswith
 
@@ -15,6 +15,8 @@ def test_get_empty(client: FlaskClient, election_id: str):
         "randomSeed": None,
         "riskLimit": None,
         "state": None,
+        "sequentialStopping": False,
+        "auditMathType": "BRAVO",
     }
 
 
@@ -29,6 +31,7 @@ def test_update_election(client: FlaskClient, election_id: str):
     election["randomSeed"] = "a new random seed"
     election["riskLimit"] = 15
     election["state"] = USState.Mississippi
+    election["sequentialStopping"] = True
 
     rv = put_json(client, f"/election/{election_id}/settings", election)
     assert_ok(rv)
@@ -39,6 +42,34 @@ def test_update_election(client: FlaskClient, election_id: str):
     assert election_record.random_seed == "a new random seed"
     assert election_record.risk_limit == 15
     assert election_record.state == USState.Mississippi
+    assert election_record.sequential_stopping is True
+
+
+def test_update_audit_math_type(client: FlaskClient, election_id: str):
+    rv = client.get(f"/election/{election_id}/settings")
+    election = json.loads(rv.data)
+    election["auditMathType"] = AuditMathType.MINERVA
+
+    rv = put_json(client, f"/election/{election_id}/settings", election)
+    assert_ok(rv)
+
+    election_record = Election.query.filter_by(id=election_id).one()
+    assert election_record.audit_math_type == AuditMathType.MINERVA
+    rv = client.get(f"/election/{election_id}/settings")
+    assert json.loads(rv.data)["auditMathType"] == "MINERVA"
+
+    # Minerva can't be used with sequential stopping
+    election["sequentialStopping"] = True
+    rv = put_json(client, f"/election/{election_id}/settings", election)
+    assert rv.status_code == 400, f"unexpected response: {rv.data}"
+    assert json.loads(rv.data) == {
+        "errors": [
+            {
+                "message": "Sequential stopping is not supported with Minerva",
+                "errorType": "Bad Request",
+            }
+        ]
+    }
 
 
 def test_invalid_state(client: FlaskClient, election_id: str):
@@ -106,3 +137,61 @@ def test_invalid_additional_property(client: FlaskClient, election_id: str):
             }
         ]
     }
+
+
+def test_update_keeps_audit_math_settings(client: FlaskClient, election_id: str):
+    rv = client.get(f"/election/{election_id}/settings")
+    election = json.loads(rv.data)
+    election["sequentialStopping"] = True
+    rv = put_json(client, f"/election/{election_id}/settings", election)
+    assert_ok(rv)
+
+    # Settings that leave out the audit math settings don't reset them
+    del election["sequentialStopping"]
+    del election["auditMathType"]
+    election["electionName"] = "An Updated Name"
+    rv = put_json(client, f"/election/{election_id}/settings", election)
+    assert_ok(rv)
+
+    election_record = Election.query.filter_by(id=election_id).one()
+    assert election_record.election_name == "An Updated Name"
+    assert election_record.sequential_stopping is True
+    assert election_record.audit_math_type == AuditMathType.BRAVO
+
+
+def test_update_audit_math_settings_after_audit_started(
+    client: FlaskClient,
+    election_id: str,
+    round_1_id: str,  # pylint: disable=unused-argument
+):
+    rv = client.get(f"/election/{election_id}/settings")
+    election = json.loads(rv.data)
+
+    # Other settings can still change
+    rv = put_json(
+        client,
+        f"/election/{election_id}/settings",
+        {**election, "electionName": "An Updated Name"},
+    )
+    assert_ok(rv)
+
+    for setting, value in [
+        ("sequentialStopping", True),
+        ("auditMathType", AuditMathType.MINERVA),
+    ]:
+        rv = put_json(
+            client, f"/election/{election_id}/settings", {**election, setting: value}
+        )
+        assert rv.status_code == 409, f"unexpected response: {rv.data}"
+        assert json.loads(rv.data) == {
+            "errors": [
+                {
+                    "message": "Cannot change the audit math type or sequential stopping after the audit has started",
+                    "errorType": "Conflict",
+                }
+            ]
+        }
+
+    election_record = Election.query.filter_by(id=election_id).one()
+    assert election_record.sequential_stopping is False
+    assert election_record.audit_math_type == AuditMathType.BRAVO
@@ -0,0 +1,105 @@
+import json
+from typing import List
+import pytest
+from flask.testing import FlaskClient
+
+from arlo_server.models import (
+    AuditMathType,
+    Contest,
+    Election,
+    RoundContest,
+    USState,
+)
+from arlo_server.sample_sizes import cumulative_contest_results
+from audit_math import minerva, sampler_contest
+from tests.helpers import assert_ok, put_json
+
+
+# Override the election settings fixture, so that the audits in this module
+# use Minerva.
+@pytest.fixture
+def election_settings(client: FlaskClient, election_id: str):
+    settings = {
+        "electionName": "Test Election",
+        "online": True,
+        "randomSeed": "1234567890",
+        "riskLimit": 10,
+        "state": USState.California,
+        "auditMathType": AuditMathType.MINERVA,
+    }
+    rv = put_json(client, f"/election/{election_id}/settings", settings)
+    assert_ok(rv)
+
+
+def test_minerva_sample_sizes_round_1(
+    client: FlaskClient,
+    election_id: str,
+    contest_ids: str,  # pylint: disable=unused-argument
+    election_settings,  # pylint: disable=unused-argument
+):
+    rv = client.get(f"/election/{election_id}/sample-sizes")
+    sample_sizes = json.loads(rv.data)
+    # Smaller than the BRAVO sample sizes (184, 244 and 351), see
+    # test_sample_sizes.py
+    assert sample_sizes == {
+        "sampleSizes": [
+            {"prob": 0.7, "size": 102, "type": None, "workload": None},
+            {"prob": 0.8, "size": 133, "type": None, "workload": None},
+            {"prob": 0.9, "size": 179, "type": None, "workload": None},
+        ]
+    }
+
+    rv = client.get(
+        f"/election/{election_id}/sample-sizes/curve?min=0.7&max=0.9&step=0.1"
+    )
+    assert json.loads(rv.data) == {
+        "sampleSizeCurve": [
+            {"prob": 0.7, "size": 102},
+            {"prob": 0.8, "size": 133},
+            {"prob": 0.9, "size": 179},
+        ]
+    }
+
+
+def test_minerva_round_2(
+    election_id: str, contest_ids: List[str], round_1_id: str, round_2_id: str,
+):
+    election = Election.query.get(election_id)
+    contest = Contest.query.get(contest_ids[0])
+    round_1_contest = RoundContest.query.filter_by(
+        round_id=round_1_id, contest_id=contest.id
+    ).one()
+    round_2_contest = RoundContest.query.filter_by(
+        round_id=round_2_id, contest_id=contest.id
+    ).one()
+    round_1_results = cumulative_contest_results(contest)
+
+    # Round 1 is measured on its own
+    risks, is_complete = minerva.compute_risk(
+        0.1, sampler_contest.from_db_contest(contest), round_1_results
+    )
+    assert round_1_contest.end_p_value == max(risks.values())
+    assert round_1_contest.is_complete == is_complete is False
+
+    # Round 2's sample size takes round 1's sample into account
+    assert (
+        round_2_contest.sample_size
+        == minerva.get_sample_size(
+            0.1, sampler_contest.from_db_contest(contest), round_1_results, []
+        )["0.9"]["size"]
+    )
+
+    # The risk so far in round 2 accounts for the audit not having stopped
+    # in round 1
+    audited_votes = round_2_contest.audited_votes
+    risks, _ = minerva.compute_risk(
+        0.1,
+        sampler_contest.from_db_contest(contest),
+        {
+            choice_id: votes + audited_votes[choice_id]
+            for choice_id, votes in round_1_results.items()
+        },
+        [round_1_results],
+    )
+    assert round_2_contest.current_p_value == pytest.approx(max(risks.values()))
+    assert election.audit_math_type == AuditMathType.MINERVA
@@ -1,6 +1,18 @@
 import json
+from datetime import datetime as dt, timedelta
+from typing import List
+from unittest.mock import patch
 from flask.testing import FlaskClient
 
+from arlo_server.models import db, SampleCacheEntry
+from arlo_server.sample_sizes import (
+    sample_cache,
+    evict_sample_cache,
+    DbSampleStore,
+    MAX_SAMPLE_CACHE_AGE,
+)
+from audit_math import sampler
+
 
 def test_sample_sizes_without_contests(client: FlaskClient, election_id: str):
     rv = client.get(f"/election/{election_id}/sample-sizes")
@@ -42,10 +54,10 @@ def test_sample_sizes_round_1(
     sample_sizes = json.loads(rv.data)
     assert sample_sizes == {
         "sampleSizes": [
-            {"prob": 0.52, "size": 119, "type": "ASN"},
-            {"prob": 0.7, "size": 184, "type": None},
-            {"prob": 0.8, "size": 244, "type": None},
-            {"prob": 0.9, "size": 351, "type": None},
+            {"prob": 0.52, "size": 119, "type": "ASN", "workload": None},
+            {"prob": 0.7, "size": 184, "type": None, "workload": None},
+            {"prob": 0.8, "size": 244, "type": None, "workload": None},
+            {"prob": 0.9, "size": 351, "type": None, "workload": None},
         ]
     }
 
@@ -53,16 +65,194 @@ def test_sample_sizes_round_1(
 def test_sample_sizes_round_2(
     client: FlaskClient,
     election_id: str,
+    jurisdiction_ids: List[str],
     round_2_id: str,  # pylint: disable=unused-argument
 ):
-    rv = client.get(f"/election/{election_id}/sample-sizes")
+    rv = client.get(f"/election/{election_id}/sample-sizes?workloads=true")
     sample_sizes = json.loads(rv.data)
-    # Should still return round 1 sample sizes
+
+    def workload(num_ballots_by_jurisdiction: List[int], num_draws: int):
+        num_ballots = sum(num_ballots_by_jurisdiction)
+        return {
+            "numDraws": num_draws,
+            "numBallots": num_ballots,
+            "numDuplicateDraws": num_draws - num_ballots,
+            "numBatches": 8,
+            "numBallotsByJurisdiction": dict(
+                zip(jurisdiction_ids, num_ballots_by_jurisdiction)
+            ),
+        }
+
+    # Should still return round 1 sample sizes, along with the ballots each
+    # sample size would have drawn in round 1
     assert sample_sizes == {
         "sampleSizes": [
-            {"prob": 0.52, "size": 119, "type": "ASN"},
-            {"prob": 0.7, "size": 184, "type": None},
-            {"prob": 0.8, "size": 244, "type": None},
-            {"prob": 0.9, "size": 351, "type": None},
+            {
+                "prob": 0.52,
+                "size": 119,
+                "type": "ASN",
+                "workload": workload([75, 35, 0], 119),
+            },
+            {
+                "prob": 0.7,
+                "size": 184,
+                "type": None,
+                "workload": workload([115, 49, 0], 184),
+            },
+            {
+                "prob": 0.8,
+                "size": 244,
+                "type": None,
+                "workload": workload([150, 63, 0], 244),
+            },
+            {
+                "prob": 0.9,
+                "size": 351,
+                "type": None,
+                "workload": workload([202, 92, 0], 351),
+            },
+        ]
+    }
+
+    # Workloads are only computed when asked for
+    rv = client.get(f"/election/{election_id}/sample-sizes")
+    assert json.loads(rv.data) == {
+        "sampleSizes": [
+            {**sample_size, "workload": None}
+            for sample_size in sample_sizes["sampleSizes"]
+        ]
+    }
+
+
+def test_sample_sizes_workloads_flag(
+    client: FlaskClient,
+    election_id: str,
+    contest_ids: str,  # pylint: disable=unused-argument
+    election_settings,  # pylint: disable=unused-argument
+    manifests,  # pylint: disable=unused-argument
+):
+    # Without ?workloads=true, the sample isn't drawn at all
+    with patch.object(sampler, "sample_workloads", side_effect=AssertionError):
+        for query in ["", "?workloads=false", "?workloads=1"]:
+            rv = client.get(f"/election/{election_id}/sample-sizes{query}")
+            assert rv.status_code == 200, f"unexpected response: {rv.data}"
+            sample_sizes = json.loads(rv.data)["sampleSizes"]
+            assert sample_sizes
+            assert all(sample_size["workload"] is None for sample_size in sample_sizes)
+
+    rv = client.get(f"/election/{election_id}/sample-sizes?workloads=true")
+    sample_sizes = json.loads(rv.data)["sampleSizes"]
+    for sample_size in sample_sizes:
+        assert sample_size["workload"]["numDraws"] == sample_size["size"]
+
+
+def test_sample_sizes_cached(
+    client: FlaskClient,
+    election_id: str,
+    round_2_id: str,  # pylint: disable=unused-argument
+):
+    sample_cache.entries.clear()
+    sample_cache.num_draws = 0
+
+    rv = client.get(f"/election/{election_id}/sample-sizes?workloads=true")
+    sample_sizes = json.loads(rv.data)
+
+    # The largest sample size option's sample is saved to the database, so a
+    # fresh cache (e.g. after a restart) doesn't need to draw it again
+    assert SampleCacheEntry.query.count() >= 1
+    sample_cache.entries.clear()
+    sample_cache.num_draws = 0
+    with patch.object(sampler, "draw_sample_resumably", side_effect=AssertionError):
+        rv = client.get(f"/election/{election_id}/sample-sizes?workloads=true")
+    assert json.loads(rv.data) == sample_sizes
+
+
+def test_sample_cache_db_eviction():
+    store = DbSampleStore()
+    SampleCacheEntry.query.delete()
+    db.session.commit()
+
+    def set_last_used(key: str, last_used: dt):
+        SampleCacheEntry.query.filter_by(id=key).update({"updated_at": last_used})
+        db.session.commit()
+
+    now = dt.utcnow()
+    with patch("arlo_server.sample_sizes.MAX_SAMPLE_CACHE_BYTES", 250):
+        for days_ago, key in [(0, "c"), (2, "b"), (4, "a")]:
+            store.put(key, bytes(100))
+            set_last_used(key, now - timedelta(days=days_ago))
+        # Writes don't evict anything
+        assert {entry.id for entry in SampleCacheEntry.query} == {"a", "b", "c"}
+
+        # Over the size limit, the least recently used entry is evicted
+        evict_sample_cache()
+        assert {entry.id for entry in SampleCacheEntry.query} == {"b", "c"}
+
+        # Reading an entry marks it as recently used, if it was last marked
+        # long enough ago
+        assert store.get("b") == bytes(100)
+        store.put("d", bytes(100))
+        evict_sample_cache()
+        assert {entry.id for entry in SampleCacheEntry.query} == {"b", "d"}
+
+    # Reading an entry that was marked recently doesn't write
+    last_used = SampleCacheEntry.query.get("d").updated_at
+    assert store.get("d") == bytes(100)
+    assert SampleCacheEntry.query.get("d").updated_at == last_used
+
+    # Entries that go unused for too long are evicted
+    set_last_used("b", now - MAX_SAMPLE_CACHE_AGE - timedelta(days=1))
+    store.put("e", bytes(100))
+    evict_sample_cache()
+    assert {entry.id for entry in SampleCacheEntry.query} == {"d", "e"}
+
+    SampleCacheEntry.query.delete()
+    db.session.commit()
+
+
+def test_sample_size_curve(
+    client: FlaskClient,
+    election_id: str,
+    contest_ids: str,  # pylint: disable=unused-argument
+    election_settings,  # pylint: disable=unused-argument
+):
+    rv = client.get(f"/election/{election_id}/sample-sizes/curve")
+    curve = json.loads(rv.data)["sampleSizeCurve"]
+    assert [point["prob"] for point in curve] == [
+        round(0.5 + 0.01 * i, 2) for i in range(50)
+    ]
+    sizes = [point["size"] for point in curve]
+    assert sizes == sorted(sizes)
+
+    rv = client.get(
+        f"/election/{election_id}/sample-sizes/curve?min=0.7&max=0.9&step=0.1"
+    )
+    # Should match the sample size options
+    assert json.loads(rv.data) == {
+        "sampleSizeCurve": [
+            {"prob": 0.7, "size": 184},
+            {"prob": 0.8, "size": 244},
+            {"prob": 0.9, "size": 351},
         ]
     }
+
+
+def test_sample_size_curve_invalid(
+    client: FlaskClient,
+    election_id: str,
+    contest_ids: str,  # pylint: disable=unused-argument
+    election_settings,  # pylint: disable=unused-argument
+):
+    for query, message in [
+        ("min=abc", "min, max and step must be numbers"),
+        ("min=0", "min and max must satisfy 0 < min <= max < 1"),
+        ("min=0.9&max=0.8", "min and max must satisfy 0 < min <= max < 1"),
+        ("max=1", "min and max must satisfy 0 < min <= max < 1"),
+        ("step=0", "step must be positive and give at most 1000 points"),
+        ("step=0.0001", "step must be positive and give at most 1000 points"),
+    ]:
+        rv = client.get(f"/election/{election_id}/sample-sizes/curve?{query}")
+        assert rv.status_code == 400, query
+        assert json.loads(rv.data) == {
+            "errors": [{"message": message, "errorType": "Bad Request"}]
+        }
@@ -0,0 +1,373 @@
+import csv, io, json
+from typing import Dict, List, Tuple
+import pytest
+from flask.testing import FlaskClient
+
+from arlo_server import db
+from arlo_server.auth import UserType
+from arlo_server.models import (
+    AuditBoard,
+    BallotStatus,
+    Batch,
+    Contest,
+    ContestChoice,
+    Round,
+    RoundContest,
+    SampledBallot,
+    SampledBallotDraw,
+    USState,
+)
+from audit_math import bravo, sampler_contest
+from tests.helpers import (
+    assert_ok,
+    post_json,
+    put_json,
+    run_audit_round,
+    set_logged_in_user,
+    DEFAULT_AA_EMAIL,
+    DEFAULT_JA_EMAIL,
+)
+
+
+# Override the election settings fixture, so that the audits in this module
+# use sequential stopping.
+@pytest.fixture
+def election_settings(client: FlaskClient, election_id: str):
+    settings = {
+        "electionName": "Test Election",
+        "online": True,
+        "randomSeed": "1234567890",
+        "riskLimit": 10,
+        "state": USState.California,
+        "sequentialStopping": True,
+    }
+    rv = put_json(client, f"/election/{election_id}/settings", settings)
+    assert_ok(rv)
+
+
+# Sets up an audit board for the second jurisdiction with sampled ballots
+# (the audit_board_round_1_ids fixture sets up the first's). Returns
+# (ballot id, audit board id, jurisdiction id) for each draw, in ticket number
+# order.
+def set_up_audit_boards(
+    client: FlaskClient, election_id: str, jurisdiction_ids: List[str], round_id: str,
+) -> List[Tuple[str, str, str]]:
+    set_logged_in_user(client, UserType.JURISDICTION_ADMIN, DEFAULT_JA_EMAIL)
+    rv = post_json(
+        client,
+        f"/election/{election_id}/jurisdiction/{jurisdiction_ids[1]}/round/{round_id}/audit-board",
+        [{"name": "Audit Board #1"}],
+    )
+    assert_ok(rv)
+
+    return list(
+        SampledBallotDraw.query.filter_by(round_id=round_id)
+        .join(SampledBallot)
+        .join(AuditBoard)
+        .order_by(SampledBallotDraw.ticket_number)
+        .values(SampledBallot.id, AuditBoard.id, AuditBoard.jurisdiction_id)
+    )
+
+
+def audit_vote(
+    client: FlaskClient,
+    election_id: str,
+    round_id: str,
+    contest_id: str,
+    draw: Tuple[str, str, str],
+    choice_id: str,
+):
+    ballot_id, audit_board_id, jurisdiction_id = draw
+    set_logged_in_user(client, UserType.AUDIT_BOARD, audit_board_id)
+    rv = put_json(
+        client,
+        f"/election/{election_id}/jurisdiction/{jurisdiction_id}/round/{round_id}/audit-board/{audit_board_id}/ballots/{ballot_id}",
+        {
+            "status": "AUDITED",
+            "interpretations": [
+                {
+                    "contestId": contest_id,
+                    "interpretation": "VOTE",
+                    "choiceId": choice_id,
+                    "comment": None,
+                }
+            ],
+        },
+    )
+    assert_ok(rv)
+
+
+def num_round_ballots(round_id: str, status: BallotStatus) -> int:
+    num_ballots: int = (
+        SampledBallot.query.filter_by(status=status)
+        .join(SampledBallotDraw)
+        .filter_by(round_id=round_id)
+        .distinct()
+        .count()
+    )
+    return num_ballots
+
+
+def bravo_risk(contest_id: str, votes: Dict[str, int]) -> Tuple[float, bool]:
+    risks, is_complete = bravo.compute_risk(
+        0.1, sampler_contest.from_db_contest(Contest.query.get(contest_id)), votes
+    )
+    return max(risks.values()), is_complete
+
+
+def test_sequential_stopping(
+    client: FlaskClient,
+    election_id: str,
+    jurisdiction_ids: List[str],
+    contest_ids: List[str],
+    round_1_id: str,
+    audit_board_round_1_ids: List[str],  # pylint: disable=unused-argument
+):
+    draws = set_up_audit_boards(client, election_id, jurisdiction_ids, round_1_id)
+    winner_id, loser_id = [
+        choice.id
+        for choice in ContestChoice.query.filter_by(contest_id=contest_ids[0])
+        .order_by(ContestChoice.name)
+        .all()
+    ]
+
+    def audit(draw, choice_id: str):
+        audit_vote(client, election_id, round_1_id, contest_ids[0], draw, choice_id)
+
+    def num_ballots(status: BallotStatus) -> int:
+        return num_round_ballots(round_1_id, status)
+
+    def is_complete(num_winner_votes: int) -> bool:
+        return bravo_risk(contest_ids[0], {winner_id: num_winner_votes, loser_id: 0})[1]
+
+    # Ballots audited out of ticket number order don't count yet
+    audit(draws[-1], winner_id)
+    assert num_ballots(BallotStatus.NOT_NEEDED) == 0
+
+    # Audit ballots in ticket number order until the risk limit is met
+    num_audited_draws = 0
+    while not is_complete(num_audited_draws):
+        assert num_ballots(BallotStatus.NOT_NEEDED) == 0
+        audit(draws[num_audited_draws], winner_id)
+        num_audited_draws += 1
+
+    audited_ballots = {ballot_id for ballot_id, _, _ in draws[:num_audited_draws]}
+    audited_ballots.add(draws[-1][0])
+    num_unaudited_ballots = len(
+        {ballot_id for ballot_id, _, _ in draws} - audited_ballots
+    )
+    assert num_unaudited_ballots > 0
+    assert num_ballots(BallotStatus.NOT_NEEDED) == num_unaudited_ballots
+    assert num_ballots(BallotStatus.NOT_AUDITED) == 0
+
+    # Ballots that aren't needed don't count towards the audit progress
+    set_logged_in_user(client, UserType.AUDIT_ADMIN, DEFAULT_AA_EMAIL)
+    rv = client.get(f"/election/{election_id}/jurisdiction")
+    for jurisdiction in json.loads(rv.data)["jurisdictions"][:2]:
+        assert jurisdiction["currentRoundStatus"]["numBallotsAudited"] == sum(
+            1
+            for ballot_id, _, jurisdiction_id in draws
+            if ballot_id in audited_ballots and jurisdiction_id == jurisdiction["id"]
+        )
+    for jurisdiction_id in jurisdiction_ids[:2]:
+        set_logged_in_user(client, UserType.JURISDICTION_ADMIN, DEFAULT_JA_EMAIL)
+        rv = client.get(
+            f"/election/{election_id}/jurisdiction/{jurisdiction_id}/round/{round_1_id}/audit-board"
+        )
+        for audit_board in json.loads(rv.data)["auditBoards"]:
+            assert audit_board["currentRoundStatus"]["numAuditedBallots"] == len(
+                {
+                    ballot_id
+                    for ballot_id, audit_board_id, _ in draws
+                    if ballot_id in audited_ballots
+                    and audit_board_id == audit_board["id"]
+                }
+            )
+
+    # Audit boards can't mark ballots as not needed themselves
+    ballot_id, audit_board_id, jurisdiction_id = draws[0]
+    set_logged_in_user(client, UserType.AUDIT_BOARD, audit_board_id)
+    rv = put_json(
+        client,
+        f"/election/{election_id}/jurisdiction/{jurisdiction_id}/round/{round_1_id}/audit-board/{audit_board_id}/ballots/{ballot_id}",
+        {"status": "NOT_NEEDED", "interpretations": []},
+    )
+    assert rv.status_code == 400
+
+    # If a change means the risk limit isn't met anymore, the ballots are
+    # needed again
+    audit(draws[0], loser_id)
+    assert num_ballots(BallotStatus.NOT_NEEDED) == 0
+    assert num_ballots(BallotStatus.NOT_AUDITED) == num_unaudited_ballots
+
+
+def test_sequential_stopping_out_of_order(
+    client: FlaskClient,
+    election_id: str,
+    jurisdiction_ids: List[str],
+    contest_ids: List[str],
+    round_1_id: str,
+    audit_board_round_1_ids: List[str],  # pylint: disable=unused-argument
+):
+    draws = set_up_audit_boards(client, election_id, jurisdiction_ids, round_1_id)
+    winner_id, loser_id = [
+        choice.id
+        for choice in ContestChoice.query.filter_by(contest_id=contest_ids[0])
+        .order_by(ContestChoice.name)
+        .all()
+    ]
+
+    def audit(draw, choice_id: str):
+        audit_vote(client, election_id, round_1_id, contest_ids[0], draw, choice_id)
+
+    def sign_off(audit_board_id: str):
+        audit_board = AuditBoard.query.get(audit_board_id)
+        set_logged_in_user(client, UserType.AUDIT_BOARD, audit_board_id)
+        rv = post_json(
+            client,
+            f"/election/{election_id}/jurisdiction/{audit_board.jurisdiction_id}/audit-board/{audit_board_id}",
+            {
+                "members": [
+                    {"name": "Member One", "affiliation": ""},
+                    {"name": "Member Two", "affiliation": ""},
+                ]
+            },
+        )
+        assert_ok(rv)
+        return post_json(
+            client,
+            f"/election/{election_id}/jurisdiction/{audit_board.jurisdiction_id}/round/{round_1_id}/audit-board/{audit_board_id}/sign-off",
+            {"memberName1": "Member One", "memberName2": "Member Two"},
+        )
+
+    # Audit the last few ballots, out of ticket number order, with votes for
+    # the loser
+    out_of_order_ballots = {ballot_id for ballot_id, _, _ in draws[-10:]}
+    for draw in draws[-10:]:
+        audit(draw, loser_id)
+    first_out_of_order = next(
+        i for i, draw in enumerate(draws) if draw[0] in out_of_order_ballots
+    )
+
+    # Audit ballots in ticket number order until the risk limit is met
+    num_audited_draws = 0
+    while not bravo_risk(contest_ids[0], {winner_id: num_audited_draws, loser_id: 0})[
+        1
+    ]:
+        audit(draws[num_audited_draws], winner_id)
+        num_audited_draws += 1
+    assert num_audited_draws < first_out_of_order
+    assert num_round_ballots(round_1_id, BallotStatus.NOT_NEEDED) > 0
+
+    # Counting the ballots audited out of order, the risk limit isn't met
+    num_loser_votes = sum(
+        1 for ballot_id, _, _ in draws if ballot_id in out_of_order_ballots
+    )
+    assert not bravo_risk(
+        contest_ids[0], {winner_id: num_audited_draws, loser_id: num_loser_votes}
+    )[1]
+
+    # If the risk limit stops being met after an audit board signs off, it
+    # has to audit its ballots that are needed again and sign off again
+    not_needed_ballot = SampledBallot.query.filter_by(
+        status=BallotStatus.NOT_NEEDED
+    ).first()
+    audit_board_id = not_needed_ballot.audit_board_id
+    assert_ok(sign_off(audit_board_id))
+    assert AuditBoard.query.get(audit_board_id).signed_off_at is not None
+
+    audit(draws[0], loser_id)
+    assert num_round_ballots(round_1_id, BallotStatus.NOT_NEEDED) == 0
+    assert AuditBoard.query.get(audit_board_id).signed_off_at is None
+    rv = sign_off(audit_board_id)
+    assert rv.status_code == 409
+
+    # Once the risk limit is met again, the round ends complete, measured on
+    # the same ballots as the decision to stop
+    audit(draws[0], winner_id)
+    assert num_round_ballots(round_1_id, BallotStatus.NOT_NEEDED) > 0
+    for audit_board_id in {audit_board_id for _, audit_board_id, _ in draws}:
+        assert_ok(sign_off(audit_board_id))
+
+    round_contest = RoundContest.query.filter_by(
+        round_id=round_1_id, contest_id=contest_ids[0]
+    ).one()
+    assert Round.query.get(round_1_id).ended_at is not None
+    assert round_contest.is_complete
+    assert round_contest.end_p_value == pytest.approx(
+        bravo_risk(contest_ids[0], {winner_id: num_audited_draws, loser_id: 0})[0]
+    )
+
+
+def test_sequential_stopping_not_needed_ballots_sampled_again(
+    client: FlaskClient,
+    election_id: str,
+    jurisdiction_ids: List[str],
+    contest_ids: List[str],
+    round_1_id: str,
+    audit_board_round_1_ids: List[str],  # pylint: disable=unused-argument
+):
+    run_audit_round(round_1_id, contest_ids[0], 0.5)
+
+    # Leave every other ballot of the first jurisdiction unaudited, as if the
+    # risk limit had been met before it was audited
+    round_1_ballots = (
+        SampledBallot.query.join(Batch)
+        .filter_by(jurisdiction_id=jurisdiction_ids[0])
+        .order_by(SampledBallot.id)
+        .all()
+    )
+    ballot_ids = {
+        (ballot.batch.name, str(ballot.ballot_position)): ballot.id
+        for ballot in round_1_ballots
+    }
+    not_needed_ballots = round_1_ballots[::2]
+    for ballot in not_needed_ballots:
+        ballot.status = BallotStatus.NOT_NEEDED
+        ballot.interpretations = []
+    db.session.commit()
+    not_needed_ballot_ids = {ballot.id for ballot in not_needed_ballots}
+
+    set_logged_in_user(client, UserType.AUDIT_ADMIN, DEFAULT_AA_EMAIL)
+    rv = post_json(client, f"/election/{election_id}/round", {"roundNum": 2})
+    assert_ok(rv)
+    rv = client.get(f"/election/{election_id}/round")
+    round_2_id = json.loads(rv.data)["rounds"][1]["id"]
+
+    # Ballots that weren't needed have to be audited if they're sampled again
+    round_2_ballot_ids = {
+        ballot_id
+        for (ballot_id,) in SampledBallotDraw.query.filter_by(
+            round_id=round_2_id
+        ).values(SampledBallotDraw.ballot_id)
+    }
+    assert not_needed_ballot_ids & round_2_ballot_ids
+    for ballot in SampledBallot.query.filter(
+        SampledBallot.id.in_(not_needed_ballot_ids)
+    ):
+        assert ballot.status == (
+            BallotStatus.NOT_AUDITED
+            if ballot.id in round_2_ballot_ids
+            else BallotStatus.NOT_NEEDED
+        )
+
+    # and they aren't listed as already audited
+    set_logged_in_user(client, UserType.JURISDICTION_ADMIN, DEFAULT_JA_EMAIL)
+    rv = post_json(
+        client,
+        f"/election/{election_id}/jurisdiction/{jurisdiction_ids[0]}/round/{round_2_id}/audit-board",
+        [{"name": "Audit Board #1"}],
+    )
+    assert_ok(rv)
+    rv = client.get(
+        f"/election/{election_id}/jurisdiction/{jurisdiction_ids[0]}/round/{round_2_id}/retrieval-list"
+    )
+    rows = list(csv.DictReader(io.StringIO(rv.data.decode("utf-8"))))
+    assert {row["Already Audited"] for row in rows} == {"Y", "N"}
+    for row in rows:
+        ballot_id = ballot_ids.get((row["Batch Name"], row["Ballot Number"]))
+        assert row["Already Audited"] == (
+            "Y"
+            if ballot_id is not None and ballot_id not in not_needed_ballot_ids
+            else "N"
+        )
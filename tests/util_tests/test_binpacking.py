@@ -1,3 +1,4 @@
+import random
 import pytest
 from util.binpacking import Bucket, BucketList, BalancedBucketList
 
@@ -284,3 +285,32 @@ class TestBalancedBucketList:
         assert (
             batches == new_batches
         ), "Balanced batches were not the same as original batches!"
+
+    def test_many_batches(self):
+        rand = random.Random(12345)
+        batches = {f"Batch {i}": rand.randint(1, 100) for i in range(10000)}
+        buckets = [Bucket(str(i)) for i in range(50)]
+        for batch_name, batch_size in batches.items():
+            buckets[0].add_batch(batch_name, batch_size)
+
+        bbl = BalancedBucketList(buckets)
+
+        assert {
+            batch: size
+            for bucket in bbl.buckets
+            for batch, size in bucket.batches.items()
+        } == batches
+
+        # Each batch, largest first, went to the least-full bucket, so no
+        # bucket is fuller than another by more than the largest batch
+        sizes = [bucket.size for bucket in bbl.buckets]
+        assert max(sizes) - min(sizes) <= max(batches.values())
+
+    def test_ties_go_to_earliest_bucket(self):
+        bucket = Bucket("1")
+        bucket.add_batch("1", 50)
+        bucket.add_batch("2", 50)
+        bucket.add_batch("3", 50)
+
+        bbl = BalancedBucketList([bucket, Bucket("2"), Bucket("3")])
+        assert [b.batches for b in bbl.buckets] == [{"1": 50}, {"2": 50}, {"3": 50}]
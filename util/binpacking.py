@@ -1,4 +1,5 @@
 from typing import Dict, Optional, Tuple, List, cast
+import heapq
 import operator
 import numpy
 
@@ -50,6 +51,30 @@ class Bucket:
         return self.name == other.name
 
 
+def assign_batches(buckets: List[Bucket], batches: List[Tuple[str, int]]) -> None:
+    """
+    Assigns each batch, largest first, to the bucket that will be least over
+    the average size afterwards, i.e. the least-full bucket (ties go to the
+    earliest bucket). This starts with the batches that are bigger than the
+    average size, minimizing the amount of size deviation from the average.
+
+    The buckets are kept in a heap keyed on (size, position), so finding the
+    least-full bucket takes O(log buckets) rather than a scan of every bucket
+    for every batch.
+    """
+    # Sort the list of batches
+    batches = sorted(batches, key=operator.itemgetter(1), reverse=True)
+
+    heap = [(bucket.size, i) for i, bucket in enumerate(buckets)]
+    heapq.heapify(heap)
+
+    for batch_name, batch_size in batches:
+        # Add to the least-bad bucket, then put it back with its new size
+        _, min_idx = heap[0]
+        buckets[min_idx].add_batch(batch_name, batch_size)
+        heapq.heapreplace(heap, (buckets[min_idx].size, min_idx))
+
+
 class BucketList:
     """
     A list of buckets that doesn't self-balance. For use in testing balancing
@@ -85,50 +110,7 @@ class BucketList:
             for batch_name in bucket.batches:
                 batches.append((batch_name, bucket.batches[batch_name]))
 
-        # Sort the list of batches
-        batches = sorted(batches, key=operator.itemgetter(1), reverse=True)
-        left_overs: List[Tuple[str, int]] = []
-
-        # Now assign batches
-        # Assign all the too-big batches first
-        for i, batch in enumerate(batches):
-
-            # Find the least-full bucket and assign this batch
-            if batch[1] > self.avg_size:
-                # Find the least-bad bucket
-                (min_idx, _min_del) = min(
-                    enumerate(
-                        [
-                            bucket.size + batch[1] - self.avg_size
-                            for bucket in new_buckets
-                        ]
-                    ),
-                    key=operator.itemgetter(1),
-                )
-
-                # Now add to the least-bad bucket
-                new_buckets[min_idx].add_batch(batch[0], batch[1])
-
-            else:
-                left_overs = batches[i:]
-                break
-
-        # Now iterate through remaining batches and add them to the bucket
-        # that will be _least_ over the average
-        for batch in left_overs:
-            # Find the least-bad bucket
-            (min_idx, _min_del) = min(
-                enumerate(
-                    map(
-                        lambda bucket: bucket.size + batch[1] - self.avg_size,
-                        new_buckets,
-                    )
-                ),
-                key=operator.itemgetter(1),
-            )
-
-            # Now add to the least-bad bucket
-            new_buckets[min_idx].add_batch(batch[0], batch[1])
+        assign_batches(new_buckets, batches)
 
         return BucketList(new_buckets)
 
@@ -170,50 +152,7 @@ class BalancedBucketList:
             for batch_name in bucket.batches:
                 batches.append((batch_name, bucket.batches[batch_name]))
 
-        # Sort the list of batches
-        batches = sorted(batches, key=operator.itemgetter(1), reverse=True)
-        left_overs: List[Tuple[str, int]] = []
-
-        # Now assign batches to buckets
-        # Assign all the too-big batches first
-        for i, batch in enumerate(batches):
-
-            # Find the least-full bucket and assign this batch
-            if batch[1] > self.avg_size:
-                # Find the least-bad bucket
-                (min_idx, _min_del) = min(
-                    enumerate(
-                        [
-                            bucket.size + batch[1] - self.avg_size
-                            for bucket in self.buckets
-                        ]
-                    ),
-                    key=operator.itemgetter(1),
-                )
-
-                # Now add to the least-bad bucket
-                self.buckets[min_idx].add_batch(batch[0], batch[1])
-
-            else:
-                left_overs = batches[i:]
-                break
-
-        # Now iterate through remaining batches and add them to the bucket
-        # that will be _least_ over the average
-        for batch in left_overs:
-            # Find the least-bad bucket
-            (min_idx, _min_del) = min(
-                enumerate(
-                    map(
-                        lambda bucket: bucket.size + batch[1] - self.avg_size,
-                        self.buckets,
-                    )
-                ),
-                key=operator.itemgetter(1),
-            )
-
-            # Now add to the least-bad bucket
-            self.buckets[min_idx].add_batch(batch[0], batch[1])
+        assign_batches(self.buckets, batches)
 
     def get_avg_size(self) -> float:
         return cast(float, numpy.mean([s.size for s in self.buckets]))